@@ -0,0 +1,141 @@
+"""Anti-spam cost under a simulated flood.
+
+Replays a flood of updates (a few spammers hammering the bot while many
+ordinary users send the occasional update) through two limiters:
+
+* the previous approach, ``Dispatcher.throttle`` buckets in ``MemoryStorage``
+  plus an ``asyncio.sleep`` task per throttled update;
+* :class:`bot.middlewares.antispam.SpamGuard`.
+
+Both run on the simulated clock of the flood.  Reported are the time per
+update, how many updates of ordinary users were dropped, the peak number of
+sleeping tasks the old middleware would have kept alive, the number of
+per-user entries kept and the peak traced memory.
+
+    python -m benchmarks.bench_antispam [--users 20000] [--spammers 50] [--updates 200000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+from unittest import mock
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher import dispatcher as dispatcher_module
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.utils.exceptions import Throttled
+
+from bot.middlewares.antispam import Decision, SpamGuard
+
+
+def _flood(users: int, spammers: int, updates: int, seconds: float) -> list[tuple[float, int, str]]:
+    """Return (offset, user_id, kind) events; spammers send 90% of the traffic."""
+
+    events = []
+    for _ in range(updates):
+        if random.random() < 0.9:
+            user_id = random.randint(1, spammers)
+        else:
+            user_id = random.randint(spammers + 1, spammers + users)
+        kind = "callback" if random.random() < 0.6 else "message"
+        events.append((random.uniform(0, seconds), user_id, kind))
+    events.sort()
+    return events
+
+
+def _peak_sleepers(drop_times: list[float], wait: float) -> int:
+    """Largest number of ``asyncio.sleep(wait)`` tasks alive at the same time."""
+
+    peak = start = 0
+    for end, now in enumerate(drop_times):
+        while drop_times[start] < now - wait:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+
+async def _legacy(events, rate: float, spammers: int) -> dict:
+    dp = Dispatcher(Bot("123:abc"), storage=MemoryStorage())
+    clock = SimpleNamespace(now=0.0)
+    drop_times = []
+    ordinary_dropped = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    with mock.patch.object(dispatcher_module, "time", SimpleNamespace(time=lambda: clock.now)):
+        for offset, user_id, kind in events:
+            clock.now = offset
+            try:
+                await dp.throttle(f"antispam:{kind}:{user_id}", rate=rate, user_id=user_id, chat_id=user_id)
+            except Throttled:
+                drop_times.append(offset)
+                ordinary_dropped += user_id > spammers
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "us_per_update": elapsed / len(events) * 1e6,
+        "dropped": len(drop_times),
+        "ordinary_dropped": ordinary_dropped,
+        "sleeping_tasks": _peak_sleepers(drop_times, rate * 1.5),
+        "entries": len(dp.storage.data),
+        "peak_kib": peak / 1024,
+    }
+
+
+def _guard(events, rate: float, spammers: int, max_users: int) -> dict:
+    guard = SpamGuard(message_rate=rate, callback_rate=rate, max_users=max_users)
+    ordinary_dropped = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    for offset, user_id, kind in events:
+        if guard.check(user_id, kind, offset) != Decision.ALLOW and user_id > spammers:
+            ordinary_dropped += 1
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = guard.stats()
+    return {
+        "us_per_update": elapsed / len(events) * 1e6,
+        "dropped": stats["dropped"] + stats["blocked"],
+        "ordinary_dropped": ordinary_dropped,
+        "sleeping_tasks": 0,
+        "entries": stats["users"],
+        "peak_kib": peak / 1024,
+        "blocks": stats["blocks"],
+        "evicted": stats["evicted"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--spammers", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=200_000)
+    parser.add_argument("--seconds", type=float, default=60.0, help="simulated duration of the flood")
+    parser.add_argument("--rate", type=float, default=0.7)
+    parser.add_argument("--max-users", type=int, default=10_000)
+    args = parser.parse_args()
+    random.seed(1)
+
+    events = _flood(args.users, args.spammers, args.updates, args.seconds)
+    legacy = asyncio.run(_legacy(events, args.rate, args.spammers))
+    guard = _guard(events, args.rate, args.spammers, args.max_users)
+
+    print(f"{args.updates} updates from {args.users + args.spammers} users "
+          f"({args.spammers} spammers) over {args.seconds:.0f}s simulated")
+    print(f"{'':>12} | {'µs/update':>9} | {'dropped':>8} | {'ordinary dropped':>16} | "
+          f"{'peak sleeping tasks':>19} | {'entries':>8} | {'peak KiB':>9}")
+    for name, result in (("dp.throttle", legacy), ("SpamGuard", guard)):
+        print(f"{name:>12} | {result['us_per_update']:>9.2f} | {result['dropped']:>8} | "
+              f"{result['ordinary_dropped']:>16} | {result['sleeping_tasks']:>19} | "
+              f"{result['entries']:>8} | {result['peak_kib']:>9.0f}")
+    print(f"SpamGuard: {guard['blocks']} temporary blocks, {guard['evicted']} users evicted from the LRU")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Callback dispatch cost versus number of registered handlers.
+
+Compares the old first-match chain of ``lambda c: c.data...`` filters with
+:class:`bot.utils.callback_router.CallbackRouter` for 10 to 10 000 handlers
+(half exact actions, half prefixes).  Each run resolves the worst case for the
+chain, the last registered prefix, plus a mix of random actions.
+
+    python -m benchmarks.bench_callback_router [--repeat 20000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from bot.utils.callback_router import CallbackRouter
+
+SIZES = (10, 100, 1_000, 10_000)
+
+
+async def _handler(query):
+    return None
+
+
+def _build(size: int):
+    chain = []
+    router = CallbackRouter()
+    samples = []
+    for index in range(size):
+        if index % 2:
+            action = f"action_{index}"
+            chain.append(lambda c, action=action: c.data == action)
+            router.exact(action, _handler)
+            samples.append(action)
+        else:
+            prefix = f"prefix_{index}_"
+            chain.append(lambda c, prefix=prefix: c.data.startswith(prefix))
+            router.prefix(prefix, _handler)
+            samples.append(f"{prefix}{random.randint(1, 10**6)}")
+    return chain, router, samples
+
+
+def _time(func, queries, repeat: int) -> float:
+    started = time.perf_counter()
+    for index in range(repeat):
+        func(queries[index % len(queries)])
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20_000)
+    args = parser.parse_args()
+    random.seed(1)
+
+    def chain_dispatch(chain):
+        def run(query):
+            for check in chain:
+                if check(query):
+                    return check
+            return None
+        return run
+
+    print(f"{'handlers':>9} | {'chain worst µs':>14} | {'chain mixed µs':>14} | "
+          f"{'router worst µs':>15} | {'router mixed µs':>15}")
+    for size in SIZES:
+        chain, router, samples = _build(size)
+        last = size - 1 if (size - 1) % 2 == 0 else size - 2
+        worst = [SimpleNamespace(data=f"prefix_{last}_42")]
+        mixed = [SimpleNamespace(data=random.choice(samples)) for _ in range(512)]
+        run_chain = chain_dispatch(chain)
+        chain_repeat = max(args.repeat // max(size // 100, 1), 200)
+        print(f"{size:>9} | {_time(run_chain, worst, chain_repeat):>14.2f} | "
+              f"{_time(run_chain, mixed, chain_repeat):>14.2f} | "
+              f"{_time(lambda q: router.resolve(q.data), worst, args.repeat):>15.2f} | "
+              f"{_time(lambda q: router.resolve(q.data), mixed, args.repeat):>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Scaling curves of the database read functions.
+
+Grows one SQLite database step by step (``--sizes``, 10 to 10k rows by
+default; add 100000 for the slow full run) and times the read paths the
+handlers and the admin statistics use at every size:
+
+* catalog (``n`` goods in ``n/10`` categories, one stock row each, every
+  tenth item also in one "Bulk" category): ``get_all_categories``,
+  ``get_all_items`` on the bulk category, ``check_value``;
+* history (``n`` purchases and top-ups by ``n/10`` users over ``n/100``
+  days, ``n`` promo codes): ``get_promocode``, ``select_bought_items``,
+  ``get_purchases_by_date`` and the statistics aggregates.
+
+Each cell is the median time per call.  The last column is the slope of
+log(time) against log(n) over the largest sizes: about 0 for indexed
+lookups, 1 for scans, 2 and above for quadratic behaviour.  With
+``--fail-above`` the run exits non-zero when a function scales worse than
+that exponent, so it can guard against regressions; ``--json`` writes the
+curves for plotting or comparison.
+
+    python -m benchmarks.bench_db_scaling [--sizes 10,100,1000,10000] [--fail-above 1.5] [--json out.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+BASE_DATE = datetime.datetime(2024, 1, 1, 12, 0, 0)
+PURCHASES_PER_DAY = 100
+
+
+def _grow(size: int, have: int) -> None:
+    """Insert catalog and history rows ``have``..``size``."""
+
+    from sqlalchemy import insert
+
+    from bot.database.models import (
+        BoughtGoods, Categories, Database, Goods, ItemValues, Operations, PromoCode, PromoCodeGeo,
+        PromoCodeProductFilter, User,
+    )
+
+    session = Database().session
+    if not have:
+        session.execute(insert(Categories), [{"id": 1, "name": "Bulk", "parent_id": None}])
+    session.execute(insert(Categories), [
+        {"id": c + 2, "name": f"Category {c}", "parent_id": None}
+        for c in range((have + 9) // 10, (size + 9) // 10)
+    ])
+    session.execute(insert(Goods), [
+        {"id": i + 1, "name": f"Item {i}", "price": 10, "description": "Benchmark item",
+         "category_id": 1 if i % 10 == 0 else i // 10 + 2}
+        for i in range(have, size)
+    ])
+    session.execute(insert(ItemValues), [
+        {"item_id": i + 1, "value": f"code-{i}", "is_infinity": i % 2 == 0} for i in range(have, size)
+    ])
+    registered = BASE_DATE.strftime("%Y-%m-%d %H:%M:%S")
+    session.execute(insert(User), [
+        {"telegram_id": u, "registration_date": registered, "balance": 100, "role_id": 1, "language": "en"}
+        for u in range(have // 10 + 1, size // 10 + 1)
+    ])
+    users = max(size // 10, 1)
+    history = []
+    operations = []
+    for i in range(have, size):
+        when = (BASE_DATE - datetime.timedelta(days=i // PURCHASES_PER_DAY)).strftime("%Y-%m-%d %H:%M:%S")
+        buyer = i % users + 1
+        history.append({"item_name": f"Item {i}", "value": f"code-{i}", "price": 10,
+                        "buyer_id": buyer, "bought_datetime": when, "unique_id": i + 1})
+        operations.append({"user_id": buyer, "operation_value": 10, "operation_time": when})
+    session.execute(insert(BoughtGoods), history)
+    session.execute(insert(Operations), operations)
+    session.execute(insert(PromoCode), [
+        {"code": f"PROMO{i}", "discount": 10, "expires_at": None, "active": True} for i in range(have, size)
+    ])
+    session.execute(insert(PromoCodeGeo), [
+        {"code": f"PROMO{i}", "city": "Vilnius", "district": None} for i in range(have, size)
+    ])
+    session.execute(insert(PromoCodeProductFilter), [
+        {"code": f"PROMO{i}", "target_type": "item", "target_name": f"Item {i}", "is_allowed": True}
+        for i in range(have, size)
+    ])
+    session.commit()
+
+
+def _functions(size: int) -> Dict[str, Callable[[], object]]:
+    from bot.database import methods
+
+    middle = size // 2
+    today = BASE_DATE.strftime("%Y-%m-%d")
+    return {
+        "get_all_categories": methods.get_all_categories,
+        "get_all_items(Bulk)": lambda: methods.get_all_items("Bulk"),
+        "check_value": lambda: methods.check_value(f"Item {middle}"),
+        "get_promocode": lambda: methods.get_promocode(f"PROMO{middle}"),
+        "select_bought_items": lambda: methods.select_bought_items(1),
+        "get_purchases_by_date": lambda: methods.get_purchases_by_date(today),
+        "select_today_orders": lambda: methods.select_today_orders(today),
+        "select_all_orders": methods.select_all_orders,
+        "select_today_operations": lambda: methods.select_today_operations(today),
+        "select_all_operations": methods.select_all_operations,
+        "select_today_users": lambda: methods.select_today_users(today),
+        "select_users_balance": methods.select_users_balance,
+        "select_count_bought_items": methods.select_count_bought_items,
+    }
+
+
+def _time_call(func: Callable[[], object], min_time: float, max_runs: int) -> float:
+    """Median seconds per call; runs until ``min_time`` is spent (at least once, after a warm-up)."""
+
+    func()
+    samples: List[float] = []
+    spent = 0.0
+    while len(samples) < max_runs and (spent < min_time or len(samples) < 3):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        samples.append(elapsed)
+        spent += elapsed
+        if elapsed > min_time:
+            break
+    return statistics.median(samples)
+
+
+def _exponent(sizes: List[int], seconds: List[float], points: int = 3) -> float:
+    """Least-squares slope of log(seconds) over log(size) for the last ``points`` sizes."""
+
+    xs = [math.log(size) for size in sizes[-points:]]
+    ys = [math.log(max(value, 1e-9)) for value in seconds[-points:]]
+    if len(xs) < 2:
+        return float("nan")
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    return (sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+            / sum((x - mean_x) ** 2 for x in xs))
+
+
+def _label(exponent: float) -> str:
+    if math.isnan(exponent):
+        return ""
+    if exponent < 0.3:
+        return "~O(1)"
+    if exponent < 1.4:
+        return "~O(n)"
+    return "superlinear"
+
+
+def _run(sizes: List[int], min_time: float, max_runs: int) -> Dict[str, List[float]]:
+    from bot.database.models import register_models
+
+    register_models()
+    curves: Dict[str, List[float]] = {}
+    have = 0
+    for size in sizes:
+        started = time.perf_counter()
+        _grow(size, have)
+        have = size
+        print(f"seeded {size} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        for name, func in _functions(size).items():
+            curves.setdefault(name, []).append(_time_call(func, min_time, max_runs))
+    return curves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="comma separated row counts")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent timing each cell")
+    parser.add_argument("--max-runs", type=int, default=200)
+    parser.add_argument("--fail-above", type=float, help="exit non-zero if any exponent exceeds this")
+    parser.add_argument("--json", help="write the curves to this file")
+    args = parser.parse_args()
+    sizes = sorted({int(size) for size in args.sizes.split(",")})
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    workdir = tempfile.mkdtemp(prefix="bench-db-")
+    os.chdir(workdir)  # the bot keeps database.db in the cwd
+    try:
+        curves = _run(sizes, args.min_time, args.max_runs)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    width = max(len(name) for name in curves)
+    print(f"{'ms per call':<{width}} | " + " | ".join(f"{size:>9}" for size in sizes) + " | exponent")
+    exponents = {}
+    for name, seconds in curves.items():
+        exponents[name] = _exponent(sizes, seconds)
+        cells = " | ".join(f"{value * 1000:>9.3f}" for value in seconds)
+        print(f"{name:<{width}} | {cells} | {exponents[name]:>5.2f} {_label(exponents[name])}")
+
+    if json_path:
+        with open(json_path, "w") as fh:
+            json.dump({"sizes": sizes, "seconds": curves, "exponents": exponents}, fh, indent=2)
+    if args.fail_above is not None:
+        worse = [name for name, exponent in exponents.items() if exponent > args.fail_above]
+        if worse:
+            sys.exit(f"FAIL: scaling exponent above {args.fail_above}: {', '.join(worse)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Import-time budget for the bot entry point.
+
+Runs ``python -X importtime -c "import bot.main"`` in a fresh interpreter,
+prints the most expensive modules by cumulative import time and fails when
+
+* importing ``bot.main`` takes longer than ``--budget-ms``, or
+* one of the lazily imported heavy packages (payment providers, QR/Pillow
+  renderers, Flask) is pulled in at import time.
+
+    python -m benchmarks.bench_startup [--budget-ms 1500] [--top 15] [--module bot.main]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Top-level packages that must only be imported when first used.
+LAZY_PACKAGES = ("yoomoney", "qrcode", "PIL", "requests", "flask")
+
+
+def _import_times(module: str) -> list[tuple[int, int, str]]:
+    """Return (self_us, cumulative_us, name) for every module imported by ``module``."""
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=ROOT,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="bot.main")
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = _import_times(args.module)
+    total_ms = next(cum for _, cum, name in rows if name == args.module) / 1000
+    print(f"import {args.module}: {total_ms:.0f}ms cumulative, {len(rows)} modules")
+    print(f"{'cumulative ms':>13} | {'self ms':>7} | module")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>13.1f} | {self_us / 1000:>7.1f} | {name}")
+
+    imported = {name for _, _, name in rows}
+    eager = [package for package in LAZY_PACKAGES if package in imported]
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print(f"OK: within {args.budget_ms:.0f}ms, none of {', '.join(LAZY_PACKAGES)} imported")
+
+
+if __name__ == "__main__":
+    main()
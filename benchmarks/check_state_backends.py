@@ -0,0 +1,141 @@
+"""Conformance check of the persistent state backends.
+
+Runs the same scenario against the SQLite backend (in a temporary database)
+and, when the ``redis`` package is installed and a server answers at
+``--redis-url``, against the Redis backend under a throw-away key prefix:
+
+* a session saved by one :class:`SessionStore` is loaded by a second one,
+* a change saved by the second store is picked up by the first on
+  ``refresh`` when the backend is shared, and no backend call is made on
+  ``refresh`` when it is not,
+* only one store gets a global key back from ``pop_global``,
+* Redis keys carry the session TTL.
+
+Exits non-zero when a check fails; an unreachable Redis is reported and
+skipped.
+
+    python -m benchmarks.check_state_backends [--redis-url redis://localhost:6379/15]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+from typing import List
+
+TTL = 3600
+
+
+class _CountingBackend:
+    """Wraps a backend and counts ``session_version`` calls."""
+
+    def __init__(self, backend) -> None:
+        self._backend = backend
+        self.version_checks = 0
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def session_version(self, user_id: int):
+        self.version_checks += 1
+        return self._backend.session_version(user_id)
+
+
+def _scenario(name: str, make_backend, failures: List[str]) -> None:
+    from bot.misc.session_store import SessionStore
+
+    def check(label: str, ok: bool, detail: object = "") -> None:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {label} {detail}".rstrip())
+        if not ok:
+            failures.append(f"{name}: {label}")
+
+    first, second = SessionStore(ttl=TTL), SessionStore(ttl=TTL)
+    backend = _CountingBackend(make_backend(shared=True))
+    first.attach(backend)
+    second.attach(backend)
+
+    first.session(1).set("step", "cart")
+    first.persist(1)
+    check("session shared", second.session(1).get("step") == "cart")
+
+    second.session(1).set("step", "paid")
+    second.persist(1)
+    first.refresh(1)
+    check("shared refresh picks up the other store's change", first.session(1).get("step") == "paid")
+    check("shared refresh asks the backend", backend.version_checks == 1, backend.version_checks)
+
+    local = SessionStore(ttl=TTL)
+    local_backend = _CountingBackend(make_backend(shared=False))
+    local.attach(local_backend)
+    local.session(2).set("step", "cart")
+    local.persist(2)
+    local.refresh(2)
+    check("local refresh skips the backend", local_backend.version_checks == 0, local_backend.version_checks)
+
+    first.set_global("purchase_invoice_42", {"amount": 10})
+    claims = [store.pop_global("purchase_invoice_42", None) for store in (first, second)]
+    check("global key claimed once", claims.count(None) == 1 and {"amount": 10} in claims, claims)
+
+
+def _sqlite(failures: List[str]) -> None:
+    from bot.database.models import register_models
+    from bot.utils.state_storage import SQLiteStateBackend
+
+    register_models()
+    _scenario("sqlite", lambda shared: SQLiteStateBackend(TTL, shared=shared), failures)
+
+
+def _redis(url: str, failures: List[str]) -> None:
+    try:
+        import redis
+    except ImportError:
+        print("skip redis: the 'redis' package is not installed")
+        return
+    try:
+        redis.Redis.from_url(url, socket_connect_timeout=1).ping()
+    except redis.RedisError as exc:
+        print(f"skip redis: no server at {url} ({exc})")
+        return
+
+    from bot.utils.state_storage import RedisStateBackend
+
+    prefix = f"shopbot-check-{os.getpid()}:"
+    backends = []
+
+    def make_backend(shared: bool) -> RedisStateBackend:
+        backend = RedisStateBackend(url, TTL, prefix=prefix, shared=shared)
+        backends.append(backend)
+        return backend
+
+    try:
+        _scenario("redis", make_backend, failures)
+        ttl = backends[0].client.ttl(f"{prefix}session:1")
+        ok = 0 < ttl <= TTL
+        print(f"{'ok  ' if ok else 'FAIL'} redis: session key expires {ttl}")
+        if not ok:
+            failures.append("redis: session key expires")
+    finally:
+        if backends:
+            client = backends[0].client
+            keys = list(client.scan_iter(f"{prefix}*"))
+            if keys:
+                client.delete(*keys)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/15"))
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="state-check-"))  # the bot keeps database.db in the cwd
+    failures: List[str] = []
+    _sqlite(failures)
+    _redis(args.redis_url, failures)
+    if failures:
+        sys.exit(f"FAIL: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
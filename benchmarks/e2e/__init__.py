@@ -0,0 +1,4 @@
+"""End-to-end load benchmark: fake Bot API and NOWPayments servers, seeder and virtual users.
+
+Run with ``python -m benchmarks.e2e``.
+"""
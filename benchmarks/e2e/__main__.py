@@ -0,0 +1,202 @@
+"""End-to-end load benchmark of the shop bot.
+
+Seeds a fresh database in a work directory, starts a fake Telegram Bot API
+and a fake NOWPayments API, launches the bot against them and lets
+``--users`` virtual users browse the shop, buy with their balance and top up
+with crypto (paid through a signed IPN callback) for ``--duration`` seconds.
+Reports throughput and p50/p95/p99 latency per handler, plus the average
+number of SQL queries per update from the bot's ``/metrics`` endpoint.
+
+    python -m benchmarks.e2e [--users 50] [--duration 30] [--think 0.5] [--topup-share 0.2]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.e2e.fake_nowpayments import FakeNowPayments
+from benchmarks.e2e.fake_telegram import FakeTelegram
+from benchmarks.e2e.seed import FIRST_USER_ID
+from benchmarks.e2e.virtual_user import Recorder, VirtualUser
+
+ROOT = Path(__file__).resolve().parents[2]
+TOKEN = "123456:bench-token"
+IPN_SECRET = "bench-ipn-secret"
+METRICS_TOKEN = "bench-metrics-token"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(int(round(q * len(ordered) + 0.5)) - 1, 0))]
+
+
+async def _serve(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def _bot_env(telegram_port: int, nowpayments_port: int, ipn_port: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+        "TOKEN": TOKEN,
+        "OWNER_ID": "",
+        "WEBHOOK_HOST": "",
+        "TELEGRAM_API_SERVER": f"http://127.0.0.1:{telegram_port}",
+        "NOWPAYMENTS_API_BASE": f"http://127.0.0.1:{nowpayments_port}",
+        "NOWPAYMENTS_API_KEY": "bench",
+        "NOWPAYMENTS_IPN_SECRET": IPN_SECRET,
+        "NOWPAYMENTS_IPN_URL": f"http://127.0.0.1:{ipn_port}/nowpayments-ipn",
+        "METRICS_TOKEN": METRICS_TOKEN,
+        # virtual users click faster than the anti-spam limits allow
+        "ANTISPAM_MESSAGE_RATE": "0",
+        "ANTISPAM_CALLBACK_RATE": "0",
+    })
+    return env
+
+
+async def _wait_ready(telegram: FakeTelegram, bot: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while telegram.calls.get("getUpdates", 0) < 2:
+        if bot.poll() is not None:
+            raise RuntimeError(f"bot exited with code {bot.returncode}")
+        if time.monotonic() > deadline:
+            raise RuntimeError("bot did not start polling in time")
+        await asyncio.sleep(0.1)
+
+
+async def _db_queries_per_update(ipn_port: int) -> Dict[str, float]:
+    """Average ``bot_update_db_queries`` per handler from the bot's metrics."""
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            headers = {"Authorization": f"Bearer {METRICS_TOKEN}"}
+            async with session.get(f"http://127.0.0.1:{ipn_port}/metrics", headers=headers) as response:
+                text = await response.text()
+    except aiohttp.ClientError:
+        return {}
+    sums: Dict[str, float] = {}
+    counts: Dict[str, float] = {}
+    for name, handler, value in re.findall(r'^bot_update_db_queries_(sum|count)\{handler="([^"]*)"\} (\S+)$',
+                                           text, re.MULTILINE):
+        (sums if name == "sum" else counts)[handler] = float(value)
+    return {handler: sums[handler] / counts[handler] for handler in sums if counts.get(handler)}
+
+
+def _report(recorder: Recorder, elapsed: float, queries: Dict[str, float], telegram: FakeTelegram) -> None:
+    total = sum(len(values) for values in recorder.latencies.values())
+    failed = sum(recorder.failures.values())
+    print(f"{total} steps in {elapsed:.1f}s: {total / elapsed:.1f} steps/s, {failed} failed")
+    print(f"{'handler':<36} | {'count':>6} | {'fail':>4} | {'p50 ms':>7} | {'p95 ms':>7} | "
+          f"{'p99 ms':>7} | {'max ms':>7} | {'SQL/update':>10}")
+    for step in sorted(set(recorder.latencies) | set(recorder.failures)):
+        values = recorder.latencies.get(step) or [float("nan")]
+        sql = queries.get(step)
+        print(f"{step:<36} | {len(recorder.latencies.get(step, [])):>6} | {recorder.failures.get(step, 0):>4} | "
+              f"{_percentile(values, 0.50) * 1000:>7.1f} | {_percentile(values, 0.95) * 1000:>7.1f} | "
+              f"{_percentile(values, 0.99) * 1000:>7.1f} | {max(values) * 1000:>7.1f} | "
+              f"{'' if sql is None else f'{sql:.1f}':>10}")
+    calls = ", ".join(f"{method} {count}" for method, count in sorted(telegram.calls.items(), key=lambda i: -i[1]))
+    print(f"Bot API calls: {calls}")
+
+
+async def run(args: argparse.Namespace, workdir: Path) -> None:
+    telegram_port, nowpayments_port, ipn_port = _free_port(), _free_port(), _free_port()
+    telegram = FakeTelegram()
+    nowpayments = FakeNowPayments(f"http://127.0.0.1:{ipn_port}/nowpayments-ipn", IPN_SECRET)
+    runners = [await _serve(telegram.app, telegram_port), await _serve(nowpayments.app, nowpayments_port)]
+
+    log = open(workdir / "bot.out", "wb")
+    bot = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.e2e.bot_process", "--ipn-port", str(ipn_port)],
+        cwd=workdir, env=_bot_env(telegram_port, nowpayments_port, ipn_port), stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        await _wait_ready(telegram, bot, args.startup_timeout)
+        recorder = Recorder()
+        users = [
+            VirtualUser(FIRST_USER_ID + i, telegram, nowpayments, recorder, args.think, args.timeout, args.topup_share)
+            for i in range(args.users)
+        ]
+        started = time.perf_counter()
+        until = started + args.duration
+        await asyncio.gather(*(user.run(until) for user in users))
+        elapsed = time.perf_counter() - started
+        queries = await _db_queries_per_update(ipn_port)
+        _report(recorder, elapsed, queries, telegram)
+    finally:
+        if bot.poll() is None:
+            bot.send_signal(signal.SIGINT)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, bot.wait, 15)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+        log.close()
+        await nowpayments.close()
+        for runner in runners:
+            await runner.cleanup()
+    if bot.returncode not in (0, -signal.SIGINT):
+        print(f"bot exited with code {bot.returncode}; see {workdir / 'bot.out'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--think", type=float, default=0.5, help="mean pause between steps of a user")
+    parser.add_argument("--timeout", type=float, default=15.0, help="seconds to wait for a reply")
+    parser.add_argument("--topup-share", type=float, default=0.2, help="share of sessions that top up via crypto")
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--subcategories", type=int, default=0)
+    parser.add_argument("--goods", type=int, default=8)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--workdir", help="directory for the database and logs (default: a temporary one)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary work directory")
+    args = parser.parse_args()
+    random.seed(1)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="shop-e2e-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.e2e.seed", "--users", str(args.users),
+         "--categories", str(args.categories), "--subcategories", str(args.subcategories),
+         "--goods", str(args.goods), "--stock", str(args.stock)],
+        cwd=workdir, env=env, check=True,
+    )
+    try:
+        asyncio.run(run(args, workdir))
+    finally:
+        if args.workdir or args.keep:
+            print(f"work directory: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Entry point of the bot process under test.
+
+Same as ``run.py`` minus the dependency check, with the IPN server on
+``--ipn-port``.  All IPN callbacks of the benchmark come from 127.0.0.1, so the
+per-IP limits of :class:`SecurityManager` are lifted; everything else runs
+with the production code paths and settings from the environment.
+
+    python -m benchmarks.e2e.bot_process --ipn-port 5055
+"""
+
+from __future__ import annotations
+
+import argparse
+from threading import Thread
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ipn-port", type=int, default=5055)
+    args = parser.parse_args()
+
+    from bot.ipn_server import app as ipn_app
+    from bot.main import start_bot
+    from bot.utils.security import SecurityManager
+
+    SecurityManager.ip_rate_limit = SecurityManager.ip_anomaly_threshold = 10 ** 9
+    Thread(
+        target=ipn_app.run, kwargs={"host": "127.0.0.1", "port": args.ipn_port, "threaded": True}, daemon=True
+    ).start()
+    start_bot()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Local stand-in for the NOWPayments API.
+
+The bot creates payments here through ``NOWPAYMENTS_API_BASE``.  A virtual
+user "pays" an invoice with :meth:`FakeNowPayments.pay`, which posts a signed
+IPN callback to the bot's IPN server the way NOWPayments would.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import string
+from typing import Dict
+
+import aiohttp
+from aiohttp import web
+
+__all__ = ["FakeNowPayments"]
+
+
+class FakeNowPayments:
+    """``POST /payment``, ``GET /payment/{id}`` and outgoing IPN callbacks."""
+
+    def __init__(self, ipn_url: str, ipn_secret: str) -> None:
+        self.ipn_url = ipn_url
+        self.ipn_secret = ipn_secret
+        self._ids = itertools.count(5_000_000)
+        self.payments: Dict[str, dict] = {}
+        self.app = web.Application()
+        self.app.router.add_post("/payment", self._create)
+        self.app.router.add_get("/payment/{payment_id}", self._status)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def _create(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        payment_id = str(next(self._ids))
+        address = "".join(random.choices(string.ascii_letters + string.digits, k=34))
+        payment = {
+            "payment_id": payment_id,
+            "payment_status": "waiting",
+            "pay_address": address,
+            "price_amount": body["price_amount"],
+            "price_currency": body.get("price_currency", "eur"),
+            "pay_currency": body["pay_currency"],
+            "pay_amount": round(float(body["price_amount"]) / 1000, 8),
+        }
+        self.payments[payment_id] = payment
+        return web.json_response(payment, status=201)
+
+    async def _status(self, request: web.Request) -> web.Response:
+        payment = self.payments.get(request.match_info["payment_id"])
+        if payment is None:
+            return web.json_response({"message": "not found"}, status=404)
+        return web.json_response(payment)
+
+    async def pay(self, payment_id: str, status: str = "finished") -> int:
+        """Mark ``payment_id`` paid and deliver the IPN; returns the HTTP status."""
+
+        payment = self.payments[payment_id]
+        payment["payment_status"] = status
+        body = json.dumps(payment, sort_keys=True).encode()
+        signature = hmac.new(self.ipn_secret.encode(), body, hashlib.sha512).hexdigest()
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        async with self._session.post(
+            self.ipn_url, data=body,
+            headers={"Content-Type": "application/json", "x-nowpayments-sig": signature},
+        ) as response:
+            return response.status
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,137 @@
+"""Local stand-in for the Telegram Bot API.
+
+The bot under test talks to this server through ``TELEGRAM_API_SERVER``.
+Updates queued with :meth:`FakeTelegram.push` are handed out by long-polling
+``getUpdates``; every message the bot sends, edits or deletes is recorded as a
+:class:`BotEvent` on the queue of the chat it targets, which is what the
+virtual users wait on.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+__all__ = ["BotEvent", "FakeTelegram"]
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Shop", "username": "shop_bench_bot"}
+
+# Methods that produce something a user would see; everything else is only counted.
+_VISIBLE = {"sendMessage", "sendPhoto", "sendDocument", "sendVideo", "sendAnimation",
+            "editMessageText", "editMessageCaption", "editMessageReplyMarkup", "editMessageMedia"}
+
+
+@dataclass(slots=True)
+class BotEvent:
+    method: str
+    chat_id: int
+    message_id: Optional[int]
+    text: str
+    markup: List[List[Dict[str, Any]]]
+    at: float = field(default_factory=time.perf_counter)
+
+    def callbacks(self) -> List[str]:
+        return [button["callback_data"] for row in self.markup for button in row if "callback_data" in button]
+
+    def callback(self, prefix: str) -> Optional[str]:
+        return next((data for data in self.callbacks() if data.startswith(prefix)), None)
+
+
+class FakeTelegram:
+    """aiohttp application implementing the Bot API methods the shop uses."""
+
+    def __init__(self) -> None:
+        self._updates: List[dict] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1000)
+        self._new_updates = asyncio.Event()
+        self._chats: Dict[int, asyncio.Queue] = {}
+        self.calls: Dict[str, int] = {}
+        self.app = web.Application(client_max_size=32 * 1024 ** 2)
+        self.app.router.add_post("/bot{token}/{method}", self._handle)
+        self.app.router.add_get("/bot{token}/{method}", self._handle)
+
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    def events(self, chat_id: int) -> asyncio.Queue:
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = asyncio.Queue()
+        return queue
+
+    def push(self, update: dict) -> None:
+        update["update_id"] = next(self._update_ids)
+        self._updates.append(update)
+        self._new_updates.set()
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        if offset:
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return self._updates[:limit]
+
+    def _record(self, method: str, params: dict) -> Any:
+        chat_id = int(params.get("chat_id") or 0)
+        markup = json.loads(params["reply_markup"]).get("inline_keyboard", []) if params.get("reply_markup") else []
+        text = params.get("text") or params.get("caption") or ""
+        if method.startswith("edit"):
+            message_id = int(params.get("message_id") or 0)
+        elif method.startswith("send"):
+            message_id = self.next_message_id()
+        else:
+            message_id = int(params.get("message_id") or 0) or None
+        self.events(chat_id).put_nowait(BotEvent(method, chat_id, message_id, text, markup))
+        if method == "deleteMessage":
+            return True
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if method == "sendPhoto":
+            message["photo"] = [{"file_id": f"photo-{message_id}", "file_unique_id": f"u{message_id}",
+                                 "width": 256, "height": 256}]
+            message["caption"] = text
+        else:
+            message["text"] = text
+        return message
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params: Dict[str, Any] = dict(request.query)
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        elif request.can_read_body:
+            for key, value in (await request.post()).items():
+                params[key] = value if isinstance(value, str) else "<file>"
+
+        if method == "getUpdates":
+            result: Any = await self._get_updates(params)
+        elif method == "getMe":
+            result = BOT_USER
+        elif method == "getWebhookInfo":
+            result = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        elif method == "getChat":
+            result = {"id": int(params.get("chat_id") or 0), "type": "private", "first_name": "Bench"}
+        elif method in _VISIBLE or method == "deleteMessage":
+            result = self._record(method, params)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
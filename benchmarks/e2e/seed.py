@@ -0,0 +1,96 @@
+"""Populate a fresh shop database for the end-to-end benchmark.
+
+Creates ``users`` verified users with a language and a balance (so they skip
+the CAPTCHA and the language prompt), ``categories`` top-level categories
+with ``subcategories`` each, ``goods`` items per leaf category and ``stock``
+stock rows per item.  Must run with the benchmark work directory as the
+current directory, since the bot keeps ``database.db`` there.
+
+    python -m benchmarks.e2e.seed [--users 200] [--categories 5] [--goods 8] [--stock 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import time
+from dataclasses import dataclass
+
+from bot.database.models import Categories, Database, Goods, ItemValues, User, VerifiedUser, register_models
+
+__all__ = ["SeedConfig", "seed"]
+
+FIRST_USER_ID = 10_000_000
+
+
+@dataclass(slots=True)
+class SeedConfig:
+    users: int = 200
+    categories: int = 5
+    subcategories: int = 0
+    goods: int = 8
+    stock: int = 50
+    balance: int = 1_000
+
+
+def seed(config: SeedConfig) -> dict:
+    """Create the rows described by ``config``; returns how many of each were written."""
+
+    register_models()
+    session = Database().session
+    registered = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    now = int(time.time())
+    session.add_all(
+        User(telegram_id=FIRST_USER_ID + i, registration_date=registered, balance=config.balance, language="en")
+        for i in range(config.users)
+    )
+    session.add_all(VerifiedUser(telegram_id=FIRST_USER_ID + i, verified_at=now) for i in range(config.users))
+
+    leaves = []
+    for c in range(config.categories):
+        category = Categories(name=f"Category {c + 1}")
+        session.add(category)
+        session.flush()
+        if not config.subcategories:
+            leaves.append(category)
+        for s in range(config.subcategories):
+            sub = Categories(name=f"Category {c + 1}.{s + 1}", parent_id=category.id)
+            session.add(sub)
+            leaves.append(sub)
+    session.flush()
+
+    goods = []
+    for leaf in leaves:
+        for g in range(config.goods):
+            item = Goods(name=f"{leaf.name} item {g + 1}", price=5 + g, description="Benchmark item",
+                         category_id=leaf.id)
+            session.add(item)
+            goods.append(item)
+    session.flush()
+
+    session.add_all(
+        ItemValues(item_id=item.id, value=f"code-{item.id}-{n}", is_infinity=False)
+        for item in goods for n in range(config.stock)
+    )
+    session.commit()
+    return {
+        "users": config.users,
+        "categories": len(leaves) + (config.categories if config.subcategories else 0),
+        "goods": len(goods),
+        "stock": len(goods) * config.stock,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--subcategories", type=int, default=0)
+    parser.add_argument("--goods", type=int, default=8)
+    parser.add_argument("--stock", type=int, default=50)
+    args = parser.parse_args()
+    print(seed(SeedConfig(args.users, args.categories, args.subcategories, args.goods, args.stock)))
+
+
+if __name__ == "__main__":
+    main()
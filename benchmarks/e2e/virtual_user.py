@@ -0,0 +1,173 @@
+"""Scripted shop customers.
+
+A :class:`VirtualUser` drives the bot the way a person would: it presses the
+buttons of the last message it received and waits for the bot's reply.  Each
+step is timed from pushing the update into the fake Bot API until the first
+visible reply reaches the user's chat, and recorded under the name of the
+handler that serves it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from benchmarks.e2e.fake_nowpayments import FakeNowPayments
+from benchmarks.e2e.fake_telegram import BOT_USER, BotEvent, FakeTelegram
+
+__all__ = ["Recorder", "StepFailed", "VirtualUser"]
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Recorder:
+    """Latencies per handler plus counts of failed steps."""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.failures: Dict[str, int] = defaultdict(int)
+
+    def record(self, step: str, seconds: float) -> None:
+        self.latencies[step].append(seconds)
+
+    def fail(self, step: str) -> None:
+        self.failures[step] += 1
+
+
+class VirtualUser:
+    """One customer: browse, open items, buy with balance, top up with crypto."""
+
+    def __init__(self, user_id: int, telegram: FakeTelegram, nowpayments: FakeNowPayments,
+                 recorder: Recorder, think: float, timeout: float, topup_share: float) -> None:
+        self.user_id = user_id
+        self.telegram = telegram
+        self.nowpayments = nowpayments
+        self.recorder = recorder
+        self.think = think
+        self.timeout = timeout
+        self.topup_share = topup_share
+        self.events = telegram.events(user_id)
+        self.screen: Optional[BotEvent] = None
+        self.callback_ids = 0
+
+    def _user(self) -> dict:
+        return {"id": self.user_id, "is_bot": False, "first_name": f"User{self.user_id}", "language_code": "en"}
+
+    def _chat(self) -> dict:
+        return {"id": self.user_id, "type": "private", "first_name": f"User{self.user_id}"}
+
+    def _drain(self) -> None:
+        while not self.events.empty():
+            self.events.get_nowait()
+
+    async def _reply(self, started: float) -> BotEvent:
+        deadline = started + self.timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            event = await asyncio.wait_for(self.events.get(), remaining)
+            if event.method != "deleteMessage":
+                return event
+
+    async def _step(self, step: str, update: dict, expect: Optional[str] = None) -> BotEvent:
+        """Send ``update``, wait for a reply (one offering ``expect`` if given) and time it."""
+
+        self._drain()
+        started = time.perf_counter()
+        self.telegram.push(update)
+        try:
+            while True:
+                event = await self._reply(started)
+                if expect is None or event.callback(expect) is not None:
+                    break
+        except asyncio.TimeoutError:
+            self.recorder.fail(step)
+            raise StepFailed(step) from None
+        self.recorder.record(step, event.at - started)
+        if event.markup:
+            self.screen = event
+        await asyncio.sleep(random.uniform(0, 2 * self.think))
+        return event
+
+    async def send_text(self, step: str, text: str, expect: Optional[str] = None) -> BotEvent:
+        message = {
+            "message_id": self.telegram.next_message_id(),
+            "date": int(time.time()),
+            "chat": self._chat(),
+            "from": self._user(),
+            "text": text,
+        }
+        if text.startswith("/"):
+            command = text.split()[0]
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return await self._step(step, {"message": message}, expect)
+
+    async def press(self, step: str, prefix: str, expect: Optional[str] = None) -> BotEvent:
+        """Press a button of the current screen whose callback data starts with ``prefix``."""
+
+        choices = [data for data in (self.screen.callbacks() if self.screen else []) if data.startswith(prefix)]
+        if not choices:
+            self.recorder.fail(step)
+            raise StepFailed(f"{step}: no {prefix!r} button")
+        self.callback_ids += 1
+        query = {
+            "id": f"{self.user_id}-{self.callback_ids}",
+            "from": self._user(),
+            "chat_instance": str(self.user_id),
+            "data": random.choice(choices),
+            "message": {
+                "message_id": self.screen.message_id,
+                "date": int(time.time()),
+                "chat": self._chat(),
+                "from": BOT_USER,
+                "text": self.screen.text,
+            },
+        }
+        return await self._step(step, {"callback_query": query}, expect)
+
+    async def browse_and_buy(self) -> None:
+        await self.send_text("start", "/start", expect="shop")
+        await self.press("shop_callback_handler", "shop", expect="category_")
+        event = await self.press("items_list_callback_handler", "category_")
+        while event.callback("category_") and not event.callback("item_"):
+            event = await self.press("items_list_callback_handler", "category_")
+        await self.press("item_info_callback_handler", "item_", expect="confirm_")
+        await self.press("confirm_buy_callback_handler", "confirm_")
+        if self.screen.callback("buy_"):
+            await self.press("buy_item_callback_handler", "buy_")
+
+    async def top_up(self) -> None:
+        await self.send_text("start", "/start", expect="replenish_balance")
+        await self.press("replenish_balance_callback_handler", "replenish_balance")
+        await self.send_text("process_replenish_balance", str(random.randint(5, 50)), expect="crypto_")
+        invoice = await self.press("crypto_payment", "crypto_", expect="cancel_")
+        payment_id = invoice.callback("cancel_")[len("cancel_"):]
+        self._drain()
+        started = time.perf_counter()
+        status = await self.nowpayments.pay(payment_id)
+        if status != 200:
+            self.recorder.fail("nowpayments_ipn")
+            raise StepFailed(f"IPN answered {status}")
+        try:
+            event = await self._reply(started)
+            while event.method != "sendMessage":
+                event = await self._reply(started)
+        except asyncio.TimeoutError:
+            self.recorder.fail("nowpayments_ipn")
+            raise StepFailed("nowpayments_ipn") from None
+        self.recorder.record("nowpayments_ipn", event.at - started)
+
+    async def run(self, until: float) -> None:
+        await asyncio.sleep(random.uniform(0, 2 * self.think))
+        while time.perf_counter() < until:
+            scenario = self.top_up if random.random() < self.topup_share else self.browse_and_buy
+            try:
+                await scenario()
+            except StepFailed:
+                self.screen = None
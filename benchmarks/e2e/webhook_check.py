@@ -0,0 +1,162 @@
+"""End-to-end check of the webhook transport against the fake Bot API.
+
+Serves :class:`~bot.webhook_server.ConcurrentWebhookRequestHandler` with a
+:class:`~bot.misc.bot.ShopBot` whose Bot API server is a local
+:class:`FakeTelegram`, posts updates the way Telegram does and checks that
+
+* the answer to a callback query comes back in the HTTP response body
+  instead of a separate ``answerCallbackQuery`` call,
+* other requests of the same handler still reach the Bot API and a second
+  answer falls back to a regular call,
+* plain message updates get an ``ok`` body,
+* requests with a wrong secret token, or from outside Telegram's networks
+  when IP checking is on, are rejected.
+
+Exits non-zero when any check fails.
+
+    python -m benchmarks.e2e.webhook_check
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.e2e.fake_telegram import FakeTelegram
+
+TOKEN = "123456:webhook-check"
+SECRET = "webhook-check-secret"
+PATH = "/telegram-webhook"
+CHAT_ID = 4242
+
+
+def _callback_update(data: str) -> dict:
+    user = {"id": CHAT_ID, "is_bot": False, "first_name": "Check"}
+    return {"callback_query": {
+        "id": f"cq-{data}",
+        "from": user,
+        "chat_instance": "1",
+        "data": data,
+        "message": {"message_id": 1, "date": int(time.time()), "chat": {"id": CHAT_ID, "type": "private"},
+                    "text": "menu"},
+    }}
+
+
+def _message_update(text: str) -> dict:
+    user = {"id": CHAT_ID, "is_bot": False, "first_name": "Check"}
+    return {"message": {"message_id": 2, "date": int(time.time()), "chat": {"id": CHAT_ID, "type": "private"},
+                        "from": user, "text": text}}
+
+
+async def _serve(app: web.Application) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+async def run() -> List[str]:
+    from aiogram import Dispatcher
+    from aiogram.bot.api import TelegramAPIServer
+    from aiogram.dispatcher.webhook import BOT_DISPATCHER_KEY
+
+    from bot.misc.bot import ShopBot
+    from bot.webhook_server import ConcurrentWebhookRequestHandler, build_webhook_app
+
+    telegram = FakeTelegram()
+    telegram_runner, telegram_url = await _serve(telegram.app)
+    bot = ShopBot(token=TOKEN, parse_mode="HTML", server=TelegramAPIServer.from_base(telegram_url))
+    dp = Dispatcher(bot)
+
+    async def answer_only(call):
+        await call.answer("pong")
+
+    async def send_and_answer_twice(call):
+        await bot.send_message(call.from_user.id, "sent through the API")
+        await call.answer("first")
+        await call.answer("second")
+
+    async def echo(message):
+        await bot.send_message(message.chat.id, message.text)
+
+    dp.register_callback_query_handler(answer_only, text="ping")
+    dp.register_callback_query_handler(send_and_answer_twice, text="both")
+    dp.register_message_handler(echo)
+
+    def webhook_app(check_ip: bool) -> web.Application:
+        app = build_webhook_app(max_concurrency=4, secret=SECRET)
+        app[BOT_DISPATCHER_KEY] = dp
+        app["_check_ip"] = check_ip
+        app.router.add_route("*", PATH, ConcurrentWebhookRequestHandler)
+        return app
+
+    webhook_runner, webhook_url = await _serve(webhook_app(check_ip=False))
+    guarded_runner, guarded_url = await _serve(webhook_app(check_ip=True))
+    update_ids = itertools.count(1)
+
+    failures: List[str] = []
+
+    def check(name: str, ok: bool, detail: object) -> None:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    async def post(session: aiohttp.ClientSession, update: dict, secret: str = SECRET, url: str = webhook_url):
+        update = dict(update, update_id=next(update_ids))
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+        async with session.post(url + PATH, json=update, headers=headers) as response:
+            body = await response.text()
+            return response.status, body
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            status, body = await post(session, _callback_update("ping"))
+            check("inline answer", status == 200 and '"answerCallbackQuery"' in body and "pong" in body,
+                  f"{status} {body}")
+            check("no API answer", telegram.calls.get("answerCallbackQuery", 0) == 0, telegram.calls)
+
+            status, body = await post(session, _callback_update("both"))
+            check("first answer inline", status == 200 and "first" in body, f"{status} {body}")
+            await asyncio.sleep(0.2)
+            check("second answer and message through the API",
+                  telegram.calls.get("answerCallbackQuery", 0) == 1 and telegram.calls.get("sendMessage", 0) == 1,
+                  telegram.calls)
+
+            status, body = await post(session, _message_update("hello"))
+            check("message update", status == 200 and body == "ok", f"{status} {body}")
+
+            status, _ = await post(session, _callback_update("ping"), secret="wrong")
+            check("wrong secret rejected", status == 401, status)
+
+            status, _ = await post(session, _callback_update("ping"), url=guarded_url)
+            check("non-Telegram IP rejected", status == 401, status)
+    finally:
+        await guarded_runner.cleanup()
+        await webhook_runner.cleanup()
+        await telegram_runner.cleanup()
+        await (await bot.get_session()).close()
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    os.chdir(tempfile.mkdtemp(prefix="shop-webhook-"))  # the bot modules keep their files in the cwd
+    failures = asyncio.run(run())
+    if failures:
+        sys.exit(f"FAIL: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from bot.misc import SingletonMeta
+from bot.utils.metrics import instrument_engine
+from bot.utils.sql_profiler import SQLProfiler
 
 
 class Database(metaclass=SingletonMeta):
@@ -11,6 +13,8 @@ class Database(metaclass=SingletonMeta):
 
     def __init__(self):
         self.__engine = create_engine(f'sqlite:///database.db')
+        instrument_engine(self.__engine)
+        SQLProfiler.install(self.__engine)
         session = sessionmaker(bind=self.__engine)
         self.__session = session()
 
@@ -1,4 +1,5 @@
 import datetime
+import json
 import random
 from decimal import Decimal, ROUND_HALF_UP
 
@@ -12,6 +13,10 @@ from bot.database.models import (
     BoughtGoods,
     Operations,
     UnfinishedOperations,
+    ProcessedPaymentEvent,
+    BroadcastJob,
+    MediaCache,
+    OutboxMessage,
     PromoCode,
     UsedPromoCode,
     PromoCodeGeo,
@@ -19,8 +24,10 @@ from bot.database.models import (
     ProductChangeLog,
     WheelPrize,
     WheelUser,
+    VerifiedUser,
 )
 from bot.database import Database
+from bot.utils.metrics import OPEN_INVOICES
 
 
 def _quantize_price(value: Decimal | float | int | str) -> Decimal:
@@ -53,27 +60,28 @@ def create_user(telegram_id: int, registration_date, referral_id, role: int = 1,
 def create_item(item_name: str, item_description: str, item_price, category_name: str,
                 delivery_description: str | None = None) -> None:
     session = Database().session
+    category_id = session.query(Categories.id).filter(Categories.name == category_name).scalar()
     session.add(
         Goods(name=item_name, description=item_description, price=_quantize_price(item_price),
-              category_name=category_name, delivery_description=delivery_description))
+              category_id=category_id, delivery_description=delivery_description))
     session.commit()
 
 
 def add_values_to_item(item_name: str, value: str, is_infinity: bool) -> None:
     session = Database().session
-    if is_infinity is False:
-        session.add(
-            ItemValues(name=item_name, value=value, is_infinity=False))
-    else:
-        session.add(
-            ItemValues(name=item_name, value=value, is_infinity=True))
+    item_id = session.query(Goods.id).filter(Goods.name == item_name).scalar()
+    session.add(
+        ItemValues(item_id=item_id, value=value, is_infinity=bool(is_infinity)))
     session.commit()
 
 
 def create_category(category_name: str, parent: str | None = None) -> None:
     session = Database().session
+    parent_id = None
+    if parent is not None:
+        parent_id = session.query(Categories.id).filter(Categories.name == parent).scalar()
     session.add(
-        Categories(name=category_name, parent_name=parent))
+        Categories(name=category_name, parent_id=parent_id))
     session.commit()
 
 
@@ -84,13 +92,73 @@ def create_operation(user_id: int, value: int, operation_time: str) -> None:
     session.commit()
 
 
-def start_operation(user_id: int, value: int, operation_id: str, message_id: int | None = None) -> None:
+def start_operation(user_id: int, value: int, operation_id: str, message_id: int | None = None,
+                    provider: str | None = None) -> None:
     session = Database().session
     session.add(
-        UnfinishedOperations(user_id=user_id, operation_value=value, operation_id=operation_id, message_id=message_id))
+        UnfinishedOperations(user_id=user_id, operation_value=value, operation_id=operation_id,
+                             message_id=message_id, provider=provider))
+    session.commit()
+    OPEN_INVOICES.inc()
+
+
+def create_broadcast_job(sender_id: int, source_chat_id: int, source_message_id: int, total: int,
+                         progress_message_id: int | None = None) -> int:
+    session = Database().session
+    job = BroadcastJob(sender_id=sender_id, source_chat_id=source_chat_id, source_message_id=source_message_id,
+                       total=total, progress_message_id=progress_message_id)
+    session.add(job)
+    session.commit()
+    return job.id
+
+
+def save_media_file_id(path: str, mtime_ns: int, size: int, kind: str, file_id: str) -> None:
+    """Remember the Telegram file_id of an uploaded file, replacing older versions of it."""
+    session = Database().session
+    session.query(MediaCache).filter(MediaCache.path == path, MediaCache.kind == kind).delete()
+    session.add(MediaCache(path=path, mtime_ns=mtime_ns, size=size, kind=kind, file_id=file_id))
+    try:
+        session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        session.rollback()
+
+
+def add_outbox_messages(session, messages: list[dict] | None) -> None:
+    """Stage outbox rows on ``session``; they are committed with the caller's state change."""
+    for message in messages or ():
+        session.add(OutboxMessage(chat_id=message['chat_id'], payload=json.dumps(message)))
+
+
+def enqueue_outbox(messages: list[dict]) -> None:
+    session = Database().session
+    add_outbox_messages(session, messages)
     session.commit()
 
 
+def add_verified_user(telegram_id: int, verified_at: int) -> None:
+    """Remember that the user passed the CAPTCHA; repeated calls are ignored."""
+    session = Database().session
+    if session.get(VerifiedUser, telegram_id) is not None:
+        return
+    session.add(VerifiedUser(telegram_id=telegram_id, verified_at=verified_at))
+    try:
+        session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        session.rollback()
+
+
+def record_payment_event(payment_id: str, status: str) -> bool:
+    """Insert a ledger row for (payment_id, status); return False if it already exists."""
+    session = Database().session
+    session.add(ProcessedPaymentEvent(payment_id=payment_id, status=status))
+    try:
+        session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        session.rollback()
+        return False
+    return True
+
+
 def add_bought_item(item_name: str, value: str, price: int, buyer_id: int,
                     bought_time: str) -> int:
     session = Database().session
@@ -7,19 +7,30 @@ from bot.database.models import (
     ItemValues,
     Categories,
     UnfinishedOperations,
+    MediaCache,
+    StoredSession,
+    StoredStateKey,
     PromoCode,
     PromoCodeGeo,
     PromoCodeProductFilter,
 )
+from bot.utils.metrics import OPEN_INVOICES
+
+
+def _item_id(item_name: str) -> int | None:
+    return Database().session.query(Goods.id).filter(Goods.name == item_name).scalar()
 
 
 def delete_item(item_name: str) -> None:
-    values = Database().session.query(ItemValues.value).filter(ItemValues.item_name == item_name).all()
+    item_id = _item_id(item_name)
+    if item_id is None:
+        return
+    values = Database().session.query(ItemValues.value).filter(ItemValues.item_id == item_id).all()
     for val in values:
         if os.path.isfile(val[0]):
             os.remove(val[0])
-    Database().session.query(Goods).filter(Goods.name == item_name).delete()
-    Database().session.query(ItemValues).filter(ItemValues.item_name == item_name).delete()
+    Database().session.query(ItemValues).filter(ItemValues.item_id == item_id).delete()
+    Database().session.query(Goods).filter(Goods.id == item_id).delete()
     Database().session.commit()
     folder = os.path.join('assets', 'uploads', sanitize_name(item_name))
     if os.path.isdir(folder) and not os.listdir(folder):
@@ -27,39 +38,48 @@ def delete_item(item_name: str) -> None:
 
 
 def delete_only_items(item_name: str) -> None:
-    values = Database().session.query(ItemValues.value).filter(ItemValues.item_name == item_name).all()
+    item_id = _item_id(item_name)
+    if item_id is None:
+        return
+    values = Database().session.query(ItemValues.value).filter(ItemValues.item_id == item_id).all()
     for val in values:
         if os.path.isfile(val[0]):
             os.remove(val[0])
-    Database().session.query(ItemValues).filter(ItemValues.item_name == item_name).delete()
+    Database().session.query(ItemValues).filter(ItemValues.item_id == item_id).delete()
     folder = os.path.join('assets', 'uploads', sanitize_name(item_name))
     if os.path.isdir(folder) and not os.listdir(folder):
         os.rmdir(folder)
 
 
 def delete_category(category_name: str) -> None:
+    category_id = Database().session.query(Categories.id).filter(Categories.name == category_name).scalar()
+    if category_id is None:
+        return
     # delete subcategories recursively
-    subs = Database().session.query(Categories.name).filter(Categories.parent_name == category_name).all()
+    subs = Database().session.query(Categories.name).filter(Categories.parent_id == category_id).all()
     for sub in subs:
         delete_category(sub.name)
-    goods = Database().session.query(Goods.name).filter(Goods.category_name == category_name).all()
+    goods = Database().session.query(Goods.id, Goods.name).filter(Goods.category_id == category_id).all()
     for item in goods:
-        values = Database().session.query(ItemValues.value).filter(ItemValues.item_name == item.name).all()
+        values = Database().session.query(ItemValues.value).filter(ItemValues.item_id == item.id).all()
         for val in values:
             if os.path.isfile(val[0]):
                 os.remove(val[0])
-        Database().session.query(ItemValues).filter(ItemValues.item_name == item.name).delete()
+        Database().session.query(ItemValues).filter(ItemValues.item_id == item.id).delete()
         folder = os.path.join('assets', 'uploads', sanitize_name(item.name))
         if os.path.isdir(folder) and not os.listdir(folder):
             os.rmdir(folder)
-    Database().session.query(Goods).filter(Goods.category_name == category_name).delete()
-    Database().session.query(Categories).filter(Categories.name == category_name).delete()
+    Database().session.query(Goods).filter(Goods.category_id == category_id).delete()
+    Database().session.query(Categories).filter(Categories.id == category_id).delete()
     Database().session.commit()
 
 
 def finish_operation(operation_id: str) -> None:
-    Database().session.query(UnfinishedOperations).filter(UnfinishedOperations.operation_id == operation_id).delete()
+    deleted = Database().session.query(UnfinishedOperations).filter(
+        UnfinishedOperations.operation_id == operation_id).delete()
     Database().session.commit()
+    if deleted:
+        OPEN_INVOICES.dec(deleted)
 
 
 def buy_item(item_id: str, infinity: bool = False) -> None:
@@ -79,3 +99,21 @@ def delete_promocode(code: str) -> None:
     session.query(PromoCodeGeo).filter(PromoCodeGeo.code == code).delete()
     session.query(PromoCode).filter(PromoCode.code == code).delete()
     session.commit()
+
+
+def delete_media_file_id(file_id: str) -> None:
+    Database().session.query(MediaCache).filter(MediaCache.file_id == file_id).delete()
+    Database().session.commit()
+
+
+def delete_stored_state_key(key: str) -> bool:
+    """Remove a persisted state key; False if it was already gone."""
+    deleted = Database().session.query(StoredStateKey).filter(StoredStateKey.key == key).delete()
+    Database().session.commit()
+    return bool(deleted)
+
+
+def purge_stored_state(updated_before: int) -> None:
+    Database().session.query(StoredSession).filter(StoredSession.updated_at < updated_before).delete()
+    Database().session.query(StoredStateKey).filter(StoredStateKey.updated_at < updated_before).delete()
+    Database().session.commit()
@@ -2,6 +2,7 @@ import datetime
 
 import sqlalchemy
 from sqlalchemy import exc, func, exists
+from sqlalchemy.orm import aliased
 
 from bot.database.models import (
     Database,
@@ -13,6 +14,12 @@ from bot.database.models import (
     BoughtGoods,
     Operations,
     UnfinishedOperations,
+    ProcessedPaymentEvent,
+    BroadcastJob,
+    MediaCache,
+    StoredSession,
+    StoredStateKey,
+    OutboxMessage,
     PromoCode,
     UsedPromoCode,
     PromoCodeGeo,
@@ -20,9 +27,15 @@ from bot.database.models import (
     ProductChangeLog,
     WheelPrize,
     WheelUser,
+    VerifiedUser,
 )
 
 
+def is_verified_user(telegram_id: int) -> bool:
+    return Database().session.query(
+        exists().where(VerifiedUser.telegram_id == telegram_id)).scalar()
+
+
 def check_user(telegram_id: int) -> User | None:
     try:
         return Database().session.query(User).filter(User.telegram_id == telegram_id).one()
@@ -86,6 +99,82 @@ def get_all_users() -> list[tuple[int]]:
     return Database().session.query(User.telegram_id).all()
 
 
+def select_broadcast_recipients(after_id: int, limit: int) -> list[int]:
+    """Return the next ``limit`` reachable user ids above ``after_id`` (keyset pagination)."""
+    rows = (
+        Database().session.query(User.telegram_id)
+        .filter(User.telegram_id > after_id, User.bot_blocked.is_(False))
+        .order_by(User.telegram_id)
+        .limit(limit)
+        .all()
+    )
+    return [row[0] for row in rows]
+
+
+def count_broadcast_recipients(after_id: int = 0) -> int:
+    return Database().session.query(func.count(User.telegram_id)).filter(
+        User.telegram_id > after_id, User.bot_blocked.is_(False)).scalar() or 0
+
+
+def get_media_file_id(path: str, mtime_ns: int, size: int, kind: str) -> str | None:
+    return Database().session.query(MediaCache.file_id).filter(
+        MediaCache.path == path, MediaCache.mtime_ns == mtime_ns,
+        MediaCache.size == size, MediaCache.kind == kind).limit(1).scalar()
+
+
+def select_due_outbox(now: int, limit: int = 20) -> list[tuple[int, str, int]]:
+    """Return (id, payload, attempts) of pending outbox rows that are due."""
+    rows = (
+        Database().session.query(OutboxMessage.id, OutboxMessage.payload, OutboxMessage.attempts)
+        .filter(OutboxMessage.status == 'pending', OutboxMessage.available_at <= now)
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+        .all()
+    )
+    return [(row.id, row.payload, row.attempts) for row in rows]
+
+
+def get_stored_session(user_id: int, updated_after: int) -> tuple[int, bytes] | None:
+    """Return (version, payload) of a persisted user session saved at or after ``updated_after``."""
+    row = Database().session.query(StoredSession.version, StoredSession.payload).filter(
+        StoredSession.user_id == user_id, StoredSession.updated_at >= updated_after).first()
+    return (row.version, row.payload) if row else None
+
+
+def get_stored_session_version(user_id: int) -> int | None:
+    return Database().session.query(StoredSession.version).filter(
+        StoredSession.user_id == user_id).scalar()
+
+
+def get_stored_state_key(key: str, updated_after: int) -> bytes | None:
+    return Database().session.query(StoredStateKey.payload).filter(
+        StoredStateKey.key == key, StoredStateKey.updated_at >= updated_after).scalar()
+
+
+def get_broadcast_job(job_id: int) -> dict | None:
+    job = Database().session.query(BroadcastJob).filter(BroadcastJob.id == job_id).first()
+    if not job:
+        return None
+    return {
+        'id': job.id,
+        'sender_id': job.sender_id,
+        'source_chat_id': job.source_chat_id,
+        'source_message_id': job.source_message_id,
+        'progress_message_id': job.progress_message_id,
+        'status': job.status,
+        'last_user_id': job.last_user_id,
+        'total': job.total,
+        'sent': job.sent,
+        'failed': job.failed,
+        'blocked': job.blocked,
+    }
+
+
+def get_unfinished_broadcast_jobs() -> list[int]:
+    rows = Database().session.query(BroadcastJob.id).filter(BroadcastJob.status == 'running').all()
+    return [row[0] for row in rows]
+
+
 def item_in_stock(item_name: str) -> bool:
     """Return True if item has unlimited quantity or remaining stock."""
     if check_value(item_name):
@@ -93,10 +182,53 @@ def item_in_stock(item_name: str) -> bool:
     return select_item_values_amount(item_name) > 0
 
 
+def get_item_id(item_name: str) -> int | None:
+    result = Database().session.query(Goods.id).filter(Goods.name == item_name).first()
+    return result[0] if result else None
+
+
+def get_item_name(item_id: int | str) -> str | None:
+    """Resolve an item id (as found in callback data) to the item's name."""
+    try:
+        item_id = int(item_id)
+    except (TypeError, ValueError):
+        return None
+    result = Database().session.query(Goods.name).filter(Goods.id == item_id).first()
+    return result[0] if result else None
+
+
+def get_item_ids(item_names: list[str]) -> dict[str, int]:
+    if not item_names:
+        return {}
+    return dict(Database().session.query(Goods.name, Goods.id).filter(Goods.name.in_(item_names)).all())
+
+
+def get_category_id(category_name: str) -> int | None:
+    result = Database().session.query(Categories.id).filter(Categories.name == category_name).first()
+    return result[0] if result else None
+
+
+def get_category_name(category_id: int | str) -> str | None:
+    """Resolve a category id (as found in callback data) to the category's name."""
+    try:
+        category_id = int(category_id)
+    except (TypeError, ValueError):
+        return None
+    result = Database().session.query(Categories.name).filter(Categories.id == category_id).first()
+    return result[0] if result else None
+
+
+def get_category_ids(category_names: list[str]) -> dict[str, int]:
+    if not category_names:
+        return {}
+    return dict(Database().session.query(Categories.name, Categories.id)
+                .filter(Categories.name.in_(category_names)).all())
+
+
 def get_all_categories() -> list[str]:
     """Return categories that contain at least one item in stock."""
     categories = [c[0] for c in Database().session.query(Categories.name)
-                  .filter(Categories.parent_name.is_(None)).all()]
+                  .filter(Categories.parent_id.is_(None)).all()]
     result = []
     for name in categories:
         if get_all_items(name) or get_subcategories(name):
@@ -107,18 +239,23 @@ def get_all_categories() -> list[str]:
 def get_all_category_names() -> list[str]:
     """Return all top-level categories regardless of contents."""
     return [c[0] for c in Database().session.query(Categories.name)
-            .filter(Categories.parent_name.is_(None)).all()]
+            .filter(Categories.parent_id.is_(None)).all()]
+
+
+def _subcategory_names(parent_name: str) -> list[str]:
+    parent = aliased(Categories)
+    return [c[0] for c in Database().session.query(Categories.name)
+            .join(parent, Categories.parent_id == parent.id)
+            .filter(parent.name == parent_name).all()]
 
 
 def get_all_subcategories(parent_name: str) -> list[str]:
     """Return all subcategories of a given category."""
-    return [c[0] for c in Database().session.query(Categories.name)
-            .filter(Categories.parent_name == parent_name).all()]
+    return _subcategory_names(parent_name)
 
 
 def get_subcategories(parent_name: str) -> list[str]:
-    subs = [c[0] for c in Database().session.query(Categories.name)
-            .filter(Categories.parent_name == parent_name).all()]
+    subs = _subcategory_names(parent_name)
     result = []
     for sub in subs:
         if get_all_items(sub):
@@ -127,23 +264,23 @@ def get_subcategories(parent_name: str) -> list[str]:
 
 
 def get_category_parent(category_name: str) -> str | None:
-    result = (Database().session.query(Categories.parent_name)
+    parent = aliased(Categories)
+    result = (Database().session.query(parent.name)
+              .join(Categories, Categories.parent_id == parent.id)
               .filter(Categories.name == category_name).first())
     return result[0] if result else None
 
 
 def get_all_items(category_name: str) -> list[str]:
-    items = [item[0] for item in
-             Database().session.query(Goods.name)
-             .filter(Goods.category_name == category_name).all()]
+    items = get_all_item_names(category_name)
     return [name for name in items if item_in_stock(name)]
 
 
 def get_all_item_names(category_name: str) -> list[str]:
     """Return all items for a category regardless of stock."""
     return [item[0] for item in
-            Database().session.query(Goods.name)
-            .filter(Goods.category_name == category_name).all()]
+            Database().session.query(Goods.name).join(Goods.category)
+            .filter(Categories.name == category_name).all()]
 
 
 def get_bought_item_info(item_id: str) -> dict | None:
@@ -151,9 +288,27 @@ def get_bought_item_info(item_id: str) -> dict | None:
     return result.__dict__ if result else None
 
 
+def _item_row(criterion) -> dict | None:
+    """Item columns plus the ``category_name`` handlers show and navigate by."""
+    result = (Database().session.query(Goods, Categories.name).join(Goods.category)
+              .filter(criterion).first())
+    if not result:
+        return None
+    item, category_name = result
+    return {**item.__dict__, 'category_name': category_name}
+
+
 def get_item_info(item_name: str) -> dict | None:
-    result = Database().session.query(Goods).filter(Goods.name == item_name).first()
-    return result.__dict__ if result else None
+    return _item_row(Goods.name == item_name)
+
+
+def get_item_info_by_id(item_id: int | str) -> dict | None:
+    """``get_item_info`` for an item id (as found in callback data)."""
+    try:
+        item_id = int(item_id)
+    except (TypeError, ValueError):
+        return None
+    return _item_row(Goods.id == item_id)
 
 
 def get_user_balance(telegram_id: int) -> float | None:
@@ -171,22 +326,51 @@ def get_all_admins() -> list[int]:
 
 
 def check_item(item_name: str) -> dict | None:
-    result = Database().session.query(Goods).filter(Goods.name == item_name).first()
-    return result.__dict__ if result else None
+    return _item_row(Goods.name == item_name)
 
 
 def check_category(category_name: str) -> dict | None:
-    result = Database().session.query(Categories).filter(Categories.name == category_name).first()
-    return result.__dict__ if result else None
+    parent = aliased(Categories)
+    result = (Database().session.query(Categories, parent.name)
+              .outerjoin(parent, Categories.parent_id == parent.id)
+              .filter(Categories.name == category_name).first())
+    if not result:
+        return None
+    category, parent_name = result
+    return {**category.__dict__, 'parent_name': parent_name}
 
 
 def get_item_value(item_name: str) -> dict | None:
-    result = Database().session.query(ItemValues).filter(ItemValues.item_name == item_name).first()
-    return result.__dict__ if result else None
+    result = (Database().session.query(ItemValues).join(ItemValues.item)
+              .filter(Goods.name == item_name).first())
+    return {**result.__dict__, 'item_name': item_name} if result else None
+
+
+def get_item_value_by_item_id(item_id: int) -> dict | None:
+    """``get_item_value`` for an item id."""
+    result = (Database().session.query(ItemValues, Goods.name).join(ItemValues.item)
+              .filter(ItemValues.item_id == item_id).first())
+    if not result:
+        return None
+    value, item_name = result
+    return {**value.__dict__, 'item_name': item_name}
+
+
+def select_values_pending_upload(extensions: tuple[str, ...], limit: int = 50,
+                                 exclude: set[int] | None = None) -> list[tuple[int, str]]:
+    """Return (id, path) of media stock values that have no Telegram file_id yet."""
+    query = Database().session.query(ItemValues.id, ItemValues.value).filter(
+        ItemValues.file_id.is_(None),
+        sqlalchemy.or_(*(ItemValues.value.like(f'%{ext}') for ext in extensions)),
+    )
+    if exclude:
+        query = query.filter(ItemValues.id.notin_(exclude))
+    return [(row.id, row.value) for row in query.order_by(ItemValues.id).limit(limit).all()]
 
 
 def get_item_values(item_name: str):
-    return Database().session.query(ItemValues).filter(ItemValues.item_name == item_name).all()
+    return (Database().session.query(ItemValues).join(ItemValues.item)
+            .filter(Goods.name == item_name).all())
 
 
 def get_active_wheel_prizes() -> list[WheelPrize]:
@@ -217,25 +401,35 @@ def get_wheel_users(include_banned: bool = False) -> list[WheelUser]:
 
 
 def get_item_value_by_id(value_id: int) -> dict | None:
-    result = Database().session.query(ItemValues).filter(ItemValues.id == value_id).first()
-    return result.__dict__ if result else None
+    result = (Database().session.query(ItemValues, Goods.name).join(ItemValues.item)
+              .filter(ItemValues.id == value_id).first())
+    if not result:
+        return None
+    value, item_name = result
+    return {**value.__dict__, 'item_name': item_name}
 
 
 def select_item_values_amount(item_name: str) -> int:
-    return Database().session.query(func.count()).filter(ItemValues.item_name == item_name).scalar()
+    return (Database().session.query(func.count(ItemValues.id)).join(ItemValues.item)
+            .filter(Goods.name == item_name).scalar())
+
+
+def get_stock_counts(item_ids: list[int]) -> dict[int, tuple[bool, int]]:
+    """(unlimited, stock rows) per item id in one query; items without stock are absent."""
+    if not item_ids:
+        return {}
+    rows = (Database().session.query(ItemValues.item_id, func.max(ItemValues.is_infinity), func.count(ItemValues.id))
+            .filter(ItemValues.item_id.in_(item_ids)).group_by(ItemValues.item_id).all())
+    return {item_id: (bool(infinite), count) for item_id, infinite, count in rows}
 
 
 def check_value(item_name: str) -> bool | None:
     try:
-        result = False
-        values = select_item_values_amount(item_name)
-        for i in range(values):
-            is_inf = Database().session.query(ItemValues).filter(ItemValues.item_name == item_name).first()
-            if is_inf and is_inf.is_infinity:
-                result = True
+        result = (Database().session.query(ItemValues.is_infinity).join(ItemValues.item)
+                  .filter(Goods.name == item_name).first())
     except exc.NoResultFound:
         return False
-    return result
+    return bool(result and result[0])
 
 
 def select_user_items(buyer_id: int) -> int:
@@ -351,6 +545,10 @@ def select_unfinished_operations(operation_id: str) -> list[int] | None:
         return None
 
 
+def count_unfinished_operations() -> int:
+    return Database().session.query(func.count(UnfinishedOperations.id)).scalar() or 0
+
+
 def get_unfinished_operation(operation_id: str) -> tuple[int, int, int | None] | None:
     """Return (user_id, operation_value, message_id) for unfinished operation."""
     result = (
@@ -366,6 +564,26 @@ def get_unfinished_operation(operation_id: str) -> tuple[int, int, int | None] |
     return (result.user_id, result.operation_value, result.message_id) if result else None
 
 
+def get_operation_provider(operation_id: str) -> str | None:
+    """Return the payment provider recorded for an unfinished operation."""
+    return (
+        Database()
+        .session.query(UnfinishedOperations.provider)
+        .filter(UnfinishedOperations.operation_id == operation_id)
+        .limit(1)
+        .scalar()
+    )
+
+
+def is_payment_event_processed(payment_id: str, status: str) -> bool:
+    session = Database().session
+    subq = session.query(ProcessedPaymentEvent.id).filter(
+        ProcessedPaymentEvent.payment_id == payment_id,
+        ProcessedPaymentEvent.status == status,
+    )
+    return session.query(subq.exists()).scalar()
+
+
 def check_user_referrals(user_id: int) -> list[int]:
     return Database().session.query(User).filter(User.referral_id == user_id).count()
 
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
 import datetime
+import random
 from decimal import Decimal, ROUND_HALF_UP
 
+import sqlalchemy.exc
+
 from bot.database.models import (
     User,
     ItemValues,
     Goods,
     Categories,
+    BoughtGoods,
+    Operations,
+    UnfinishedOperations,
+    ProcessedPaymentEvent,
+    BroadcastJob,
+    MediaCache,
+    StoredSession,
+    StoredStateKey,
+    OutboxMessage,
     PromoCode,
     PromoCodeGeo,
     PromoCodeProductFilter,
@@ -15,7 +27,8 @@ from bot.database.models import (
     WheelUser,
 )
 from bot.database import Database
-from bot.database.methods.create import log_product_change
+from bot.database.methods.create import add_outbox_messages, log_product_change
+from bot.utils.metrics import OPEN_INVOICES
 
 
 def _quantize_price(value) -> Decimal:
@@ -40,6 +53,203 @@ def update_balance(telegram_id: int | str, summ: int) -> None:
     Database().session.commit()
 
 
+def credit_topup(
+    operation_id: str,
+    operation_time: str,
+    referral_percent: int = 0,
+    ledger_status: str = 'credited',
+    outbox: list[dict] | None = None,
+) -> dict | None:
+    """Credit a pending top-up and its referral bonus in a single transaction.
+
+    The unfinished operation is removed, the operation history row and the
+    ledger entry are inserted and both balances are incremented in SQL, so a
+    crash can never leave the payment half credited.  ``outbox`` messages are
+    committed together with the credit.  Returns ``None`` when another caller
+    already credited the operation.
+    """
+    session = Database().session
+    record = (
+        session.query(
+            UnfinishedOperations.user_id,
+            UnfinishedOperations.operation_value,
+            UnfinishedOperations.message_id,
+        )
+        .filter(UnfinishedOperations.operation_id == operation_id)
+        .first()
+    )
+    if record is None:
+        return None
+    user_id, value, message_id = record.user_id, record.operation_value, record.message_id
+    try:
+        deleted = session.query(UnfinishedOperations).filter(
+            UnfinishedOperations.operation_id == operation_id
+        ).delete(synchronize_session=False)
+        if not deleted:
+            session.rollback()
+            return None
+        session.add(ProcessedPaymentEvent(payment_id=operation_id, status=ledger_status))
+        session.add(Operations(user_id=user_id, operation_value=value, operation_time=operation_time))
+        session.query(User).filter(User.telegram_id == user_id).update(
+            values={User.balance: User.balance + value}, synchronize_session=False)
+        referral_id = session.query(User.referral_id).filter(User.telegram_id == user_id).scalar()
+        referral_bonus = 0
+        if referral_id and referral_percent:
+            referral_bonus = round((referral_percent / 100) * value)
+            session.query(User).filter(User.telegram_id == referral_id).update(
+                values={User.balance: User.balance + referral_bonus}, synchronize_session=False)
+        add_outbox_messages(session, outbox)
+        session.commit()
+        OPEN_INVOICES.dec()
+    except sqlalchemy.exc.IntegrityError:
+        session.rollback()
+        return None
+    except Exception:
+        session.rollback()
+        raise
+    return {
+        'user_id': user_id,
+        'value': value,
+        'message_id': message_id,
+        'referral_id': referral_id,
+        'referral_bonus': referral_bonus,
+    }
+
+
+def purchase_item(
+    value_id: int,
+    is_infinity: bool,
+    buyer_id: int,
+    item_name: str,
+    value: str,
+    price,
+    charge,
+    bought_time: str,
+    outbox: list[dict] | None = None,
+) -> int | None:
+    """Sell one stock value in a single transaction.
+
+    The stock row is removed, ``charge`` is taken from the buyer's balance,
+    the purchase is recorded and the delivery ``outbox`` messages are staged,
+    all in one commit.  Returns the purchase id, or ``None`` if the value was
+    already sold or the balance no longer covers the charge.
+    """
+    session = Database().session
+    unique_id = random.randint(1000000000, 9999999999)
+    try:
+        if not is_infinity:
+            deleted = session.query(ItemValues).filter(ItemValues.id == value_id).delete(
+                synchronize_session=False)
+            if not deleted:
+                session.rollback()
+                return None
+        if charge:
+            charged = session.query(User).filter(
+                User.telegram_id == buyer_id, User.balance >= charge
+            ).update(values={User.balance: User.balance - charge}, synchronize_session=False)
+            if not charged:
+                session.rollback()
+                return None
+        session.add(BoughtGoods(name=item_name, value=value, price=price, buyer_id=buyer_id,
+                                bought_datetime=bought_time, unique_id=str(unique_id)))
+        add_outbox_messages(session, outbox)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return unique_id
+
+
+def mark_outbox_sent(message_id: int) -> None:
+    Database().session.query(OutboxMessage).filter(OutboxMessage.id == message_id).update(
+        values={OutboxMessage.status: 'sent', OutboxMessage.last_error: None})
+    Database().session.commit()
+
+
+def reschedule_outbox(message_id: int, attempts: int, available_at: int, error: str, failed: bool = False) -> None:
+    Database().session.query(OutboxMessage).filter(OutboxMessage.id == message_id).update(
+        values={OutboxMessage.attempts: attempts, OutboxMessage.available_at: available_at,
+                OutboxMessage.last_error: error[:1000],
+                OutboxMessage.status: 'failed' if failed else 'pending'})
+    Database().session.commit()
+
+
+def save_stored_session(user_id: int, payload: bytes, updated_at: int) -> int:
+    """Upsert a persisted user session and return its new version."""
+    session = Database().session
+    for _ in range(2):
+        updated = session.query(StoredSession).filter(StoredSession.user_id == user_id).update(
+            values={StoredSession.payload: payload, StoredSession.updated_at: updated_at,
+                    StoredSession.version: StoredSession.version + 1},
+            synchronize_session=False)
+        if not updated:
+            session.add(StoredSession(user_id, payload, updated_at))
+        try:
+            session.commit()
+        except sqlalchemy.exc.IntegrityError:
+            # another process inserted the row first; update it instead
+            session.rollback()
+            continue
+        return session.query(StoredSession.version).filter(StoredSession.user_id == user_id).scalar()
+    raise RuntimeError(f'could not store session of {user_id}')
+
+
+def save_stored_state_key(key: str, payload: bytes, updated_at: int) -> None:
+    session = Database().session
+    session.merge(StoredStateKey(key, payload, updated_at))
+    session.commit()
+
+
+def set_users_bot_blocked(telegram_ids: list[int], blocked: bool = True) -> None:
+    if not telegram_ids:
+        return
+    Database().session.query(User).filter(User.telegram_id.in_(telegram_ids)).update(
+        values={User.bot_blocked: blocked}, synchronize_session=False)
+    Database().session.commit()
+
+
+def set_item_value_file_id(value_id: int, file_id: str | None) -> None:
+    Database().session.query(ItemValues).filter(ItemValues.id == value_id).update(
+        values={ItemValues.file_id: file_id})
+    Database().session.commit()
+
+
+def move_media_file_id(old_path: str, new_path: str) -> None:
+    Database().session.query(MediaCache).filter(MediaCache.path == new_path).delete()
+    Database().session.query(MediaCache).filter(MediaCache.path == old_path).update(
+        values={MediaCache.path: new_path}, synchronize_session=False)
+    Database().session.commit()
+
+
+def update_broadcast_progress(job_id: int, last_user_id: int, sent: int, failed: int, blocked: int) -> None:
+    Database().session.query(BroadcastJob).filter(BroadcastJob.id == job_id).update(
+        values={BroadcastJob.last_user_id: last_user_id, BroadcastJob.sent: sent,
+                BroadcastJob.failed: failed, BroadcastJob.blocked: blocked})
+    Database().session.commit()
+
+
+def finish_broadcast_job(job_id: int) -> None:
+    Database().session.query(BroadcastJob).filter(BroadcastJob.id == job_id).update(
+        values={BroadcastJob.status: 'finished',
+                BroadcastJob.finished_at: datetime.datetime.utcnow().isoformat(timespec='seconds')})
+    Database().session.commit()
+
+
+def rollback_session() -> None:
+    """Discard the transaction an error left open on the shared session."""
+    Database().session.rollback()
+
+
+def fail_broadcast_job(job_id: int) -> None:
+    """Mark a job failed, discarding the transaction left open by the error that stopped it."""
+    session = Database().session
+    session.rollback()
+    session.query(BroadcastJob).filter(BroadcastJob.id == job_id).update(
+        values={BroadcastJob.status: 'failed',
+                BroadcastJob.finished_at: datetime.datetime.utcnow().isoformat(timespec='seconds')})
+    session.commit()
+
+
 def update_user_language(telegram_id: int, language: str) -> None:
     Database().session.query(User).filter(User.telegram_id == telegram_id).update(
         values={User.language: language})
@@ -72,17 +282,15 @@ def update_item(
     original_name = item.name
     original_description = item.description
     original_price = item.price
+    category_id = session.query(Categories.id).filter(Categories.name == new_category_name).scalar()
     updates = {
         Goods.name: new_name,
         Goods.description: new_description,
         Goods.price: _quantize_price(new_price),
-        Goods.category_name: new_category_name,
+        Goods.category_id: category_id if category_id is not None else item.category_id,
         Goods.delivery_description: new_delivery_description,
     }
-    session.query(ItemValues).filter(ItemValues.item_name == item_name).update(
-        values={ItemValues.item_name: new_name}
-    )
-    session.query(Goods).filter(Goods.name == item_name).update(values=updates)
+    session.query(Goods).filter(Goods.id == item.id).update(values=updates)
     session.commit()
     if changed_by is not None:
         if original_name != new_name:
@@ -100,8 +308,6 @@ def update_item(
 
 
 def update_category(category_name: str, new_name: str) -> None:
-    Database().session.query(Goods).filter(Goods.category_name == category_name).update(
-        values={Goods.category_name: new_name})
     Database().session.query(Categories).filter(Categories.name == category_name).update(
         values={Categories.name: new_name})
     Database().session.commit()
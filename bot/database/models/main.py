@@ -10,6 +10,7 @@ from sqlalchemy import (
     VARCHAR,
     UniqueConstraint,
     DateTime,
+    LargeBinary,
 )
 from sqlalchemy.orm import relationship
 from bot.database.main import Database
@@ -94,6 +95,7 @@ class User(Database.BASE):
     language = Column(String(5), nullable=True)
     referral_id = Column(BigInteger, nullable=True)
     registration_date = Column(VARCHAR, nullable=False)
+    bot_blocked = Column(Boolean, nullable=False, default=False)
     user_operations = relationship("Operations", back_populates="user_telegram_id")
     user_unfinished_operations = relationship("UnfinishedOperations", back_populates="user_telegram_id")
     user_goods = relationship("BoughtGoods", back_populates="user_telegram_id")
@@ -112,44 +114,47 @@ class User(Database.BASE):
 
 class Categories(Database.BASE):
     __tablename__ = 'categories'
-    name = Column(String(100), primary_key=True, unique=True, nullable=False)
-    parent_name = Column(String(100), nullable=True)
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    parent_id = Column(Integer, ForeignKey('categories.id'), nullable=True, index=True)
     item = relationship("Goods", back_populates="category")
 
-    def __init__(self, name: str, parent_name: str | None = None):
+    def __init__(self, name: str, parent_id: int | None = None):
         self.name = name
-        self.parent_name = parent_name
+        self.parent_id = parent_id
 
 
 class Goods(Database.BASE):
     __tablename__ = 'goods'
-    name = Column(String(100), nullable=False, unique=True, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
     price = Column(Numeric(10, 2), nullable=False)
     description = Column(Text, nullable=False)
     delivery_description = Column(Text, nullable=True)
-    category_name = Column(String(100), ForeignKey('categories.name'), nullable=False)
+    category_id = Column(Integer, ForeignKey('categories.id'), nullable=False, index=True)
     category = relationship("Categories", back_populates="item")
     values = relationship("ItemValues", back_populates="item")
 
-    def __init__(self, name: str, price: int, description: str, category_name: str,
+    def __init__(self, name: str, price: int, description: str, category_id: int,
                  delivery_description: str | None = None):
         self.name = name
         self.price = price
         self.description = description
         self.delivery_description = delivery_description
-        self.category_name = category_name
+        self.category_id = category_id
 
 
 class ItemValues(Database.BASE):
     __tablename__ = 'item_values'
     id = Column(Integer, nullable=False, primary_key=True)
-    item_name = Column(String(100), ForeignKey('goods.name'), nullable=False)
+    item_id = Column(Integer, ForeignKey('goods.id'), nullable=False, index=True)
     value = Column(Text, nullable=True)
     is_infinity = Column(Boolean, nullable=False)
+    file_id = Column(String(255), nullable=True)
     item = relationship("Goods", back_populates="values")
 
-    def __init__(self, name: str, value: str, is_infinity: bool):
-        self.item_name = name
+    def __init__(self, item_id: int, value: str, is_infinity: bool):
+        self.item_id = item_id
         self.value = value
         self.is_infinity = is_infinity
 
@@ -196,13 +201,139 @@ class UnfinishedOperations(Database.BASE):
     operation_value = Column(BigInteger, nullable=False)
     operation_id = Column(String(500), nullable=False)
     message_id = Column(BigInteger, nullable=True)
+    provider = Column(String(32), nullable=True)
     user_telegram_id = relationship("User", back_populates="user_unfinished_operations")
 
-    def __init__(self, user_id: int, operation_value: int, operation_id: str, message_id: int | None = None):
+    def __init__(self, user_id: int, operation_value: int, operation_id: str, message_id: int | None = None,
+                 provider: str | None = None):
         self.user_id = user_id
         self.operation_value = operation_value
         self.operation_id = operation_id
         self.message_id = message_id
+        self.provider = provider
+
+
+class BroadcastJob(Database.BASE):
+    __tablename__ = 'broadcast_jobs'
+    id = Column(Integer, primary_key=True)
+    sender_id = Column(BigInteger, nullable=False)
+    source_chat_id = Column(BigInteger, nullable=False)
+    source_message_id = Column(BigInteger, nullable=False)
+    progress_message_id = Column(BigInteger, nullable=True)
+    status = Column(String(16), nullable=False, default='running', index=True)
+    last_user_id = Column(BigInteger, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)
+    created_at = Column(VARCHAR, nullable=False)
+    finished_at = Column(VARCHAR, nullable=True)
+
+    def __init__(self, sender_id: int, source_chat_id: int, source_message_id: int, total: int,
+                 progress_message_id: int | None = None, created_at: str | None = None):
+        self.sender_id = sender_id
+        self.source_chat_id = source_chat_id
+        self.source_message_id = source_message_id
+        self.progress_message_id = progress_message_id
+        self.total = total
+        self.status = 'running'
+        self.last_user_id = 0
+        self.sent = self.failed = self.blocked = 0
+        self.created_at = created_at or datetime.datetime.utcnow().isoformat(timespec='seconds')
+
+
+class MediaCache(Database.BASE):
+    __tablename__ = 'media_cache'
+    id = Column(Integer, primary_key=True)
+    path = Column(String(500), nullable=False, index=True)
+    mtime_ns = Column(BigInteger, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    kind = Column(String(16), nullable=False)
+    file_id = Column(String(255), nullable=False)
+    created_at = Column(VARCHAR, nullable=False)
+    __table_args__ = (
+        UniqueConstraint('path', 'mtime_ns', 'size', 'kind', name='_media_cache_key_uc'),
+    )
+
+    def __init__(self, path: str, mtime_ns: int, size: int, kind: str, file_id: str):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.kind = kind
+        self.file_id = file_id
+        self.created_at = datetime.datetime.utcnow().isoformat(timespec='seconds')
+
+
+class OutboxMessage(Database.BASE):
+    __tablename__ = 'outbox_messages'
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String(16), nullable=False, default='pending', index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(BigInteger, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(VARCHAR, nullable=False)
+
+    def __init__(self, chat_id: int, payload: str):
+        self.chat_id = chat_id
+        self.payload = payload
+        self.status = 'pending'
+        self.attempts = 0
+        self.available_at = 0
+        self.created_at = datetime.datetime.utcnow().isoformat(timespec='seconds')
+
+
+class StoredSession(Database.BASE):
+    __tablename__ = 'stored_sessions'
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=1)
+    payload = Column(LargeBinary, nullable=False)
+    updated_at = Column(BigInteger, nullable=False, index=True)
+
+    def __init__(self, user_id: int, payload: bytes, updated_at: int):
+        self.user_id = user_id
+        self.version = 1
+        self.payload = payload
+        self.updated_at = updated_at
+
+
+class StoredStateKey(Database.BASE):
+    __tablename__ = 'stored_state_keys'
+    key = Column(String(255), primary_key=True)
+    payload = Column(LargeBinary, nullable=False)
+    updated_at = Column(BigInteger, nullable=False, index=True)
+
+    def __init__(self, key: str, payload: bytes, updated_at: int):
+        self.key = key
+        self.payload = payload
+        self.updated_at = updated_at
+
+
+class VerifiedUser(Database.BASE):
+    __tablename__ = 'verified_users'
+    telegram_id = Column(BigInteger, primary_key=True)
+    verified_at = Column(BigInteger, nullable=False)
+
+    def __init__(self, telegram_id: int, verified_at: int):
+        self.telegram_id = telegram_id
+        self.verified_at = verified_at
+
+
+class ProcessedPaymentEvent(Database.BASE):
+    __tablename__ = 'processed_payment_events'
+    id = Column(Integer, primary_key=True)
+    payment_id = Column(String(500), nullable=False)
+    status = Column(String(32), nullable=False)
+    processed_at = Column(VARCHAR, nullable=False)
+    __table_args__ = (
+        UniqueConstraint('payment_id', 'status', name='_payment_status_uc'),
+    )
+
+    def __init__(self, payment_id: str, status: str, processed_at: str | None = None):
+        self.payment_id = payment_id
+        self.status = status
+        self.processed_at = processed_at or datetime.datetime.utcnow().isoformat(timespec='seconds')
 
 
 class PromoCode(Database.BASE):
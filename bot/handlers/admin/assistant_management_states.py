@@ -6,6 +6,7 @@ from bot.database.models import Permission
 from bot.keyboards import back
 from bot.misc import TgConfig
 from bot.handlers.other import get_bot_user_ids
+from bot.utils.callback_router import callback_router
 
 ASSISTANT_ROLE_ID = 4
 
@@ -62,12 +63,10 @@ async def process_assistant_username(message: Message):
 
 
 def register_assistant_management(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(assistant_management_callback,
-                                       lambda c: c.data == 'assistant_management')
-    dp.register_callback_query_handler(assistant_add_callback,
-                                       lambda c: c.data == 'assistant_add')
-    dp.register_callback_query_handler(assistant_remove_callback,
-                                       lambda c: c.data == 'assistant_remove')
+    router = callback_router(dp)
+    router.exact('assistant_management', assistant_management_callback)
+    router.exact('assistant_add', assistant_add_callback)
+    router.exact('assistant_remove', assistant_remove_callback)
     dp.register_message_handler(process_assistant_username,
                                 lambda m: TgConfig.STATE.get(m.from_user.id) in {
                                     'assistant_add_username', 'assistant_remove_username'
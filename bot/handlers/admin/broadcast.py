@@ -1,14 +1,13 @@
-import asyncio
 from aiogram import Dispatcher
 from aiogram.types import Message, CallbackQuery
-from aiogram.utils.exceptions import BotBlocked, TelegramAPIError
 
-from bot.keyboards import back, close
-from bot.database.methods import check_role, get_all_users
+from bot.keyboards import back
+from bot.database.methods import check_role
 from bot.database.models import Permission
 from bot.misc import TgConfig
 from bot.logger_mesh import logger
-from bot.utils.safe_sender import safe_send_copy
+from bot.utils.broadcast import BroadcastEngine
+from bot.utils.callback_router import callback_router
 from bot.handlers.other import get_bot_user_ids
 
 
@@ -31,46 +30,24 @@ async def send_message_callback_handler(call: CallbackQuery):
 async def broadcast_messages(message: Message):
     bot, sender_id = await get_bot_user_ids(message)
     user_info = await bot.get_chat(sender_id)
-    original_message = message
-    message_id = TgConfig.STATE.get(f'{sender_id}_message_id')
+    message_id = TgConfig.STATE.pop(f'{sender_id}_message_id', None)
     TgConfig.STATE[sender_id] = None
-    await bot.delete_message(
-        chat_id=message.chat.id,
-        message_id=message.message_id,
-    )
-    users = get_all_users()
-    max_users = 0
-    for user_row in users:
-        max_users += 1
-        target_id = int(user_row[0])
-        await asyncio.sleep(0.3)
-        try:
-            await safe_send_copy(
-                original_message,
-                target_id,
-                reply_markup=close(),
-            )
-        except BotBlocked:
-            logger.info("Broadcast skipped for %s: bot blocked", target_id)
-        except TelegramAPIError as exc:
-            logger.warning("Failed to deliver broadcast to %s: %s", target_id, exc)
-    TgConfig.STATE.pop(f'{sender_id}_message_id', None)
-    await bot.edit_message_text(
-        chat_id=message.chat.id,
-        message_id=message_id,
-        text='Broadcast finished',
-        reply_markup=back("console"),
+    # The source message is copied to every recipient and removed once the job finishes.
+    job_id = BroadcastEngine.start(
+        bot,
+        sender_id=sender_id,
+        source_chat_id=message.chat.id,
+        source_message_id=message.message_id,
+        progress_message_id=message_id,
     )
     logger.info(
-        f"User {user_info.id} ({user_info.first_name}) performed a broadcast. "
-        f"Message was sent to {max_users} users."
+        f"User {user_info.id} ({user_info.first_name}) started broadcast job {job_id}."
     )
 
 
 def register_mailing(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(
-        send_message_callback_handler, lambda c: c.data == 'send_message'
-    )
+    router = callback_router(dp)
+    router.exact('send_message', send_message_callback_handler)
 
     dp.register_message_handler(
         broadcast_messages,
@@ -16,6 +16,7 @@ from bot.handlers.admin.stock_overview import register_stock_overview
 from bot.handlers.admin.purchases import register_purchases
 from bot.handlers.admin.wheel import register_wheel_management
 from bot.handlers.other import get_bot_user_ids
+from bot.utils.callback_router import callback_router
 
 
 async def console_callback_handler(call: CallbackQuery):
@@ -46,12 +47,9 @@ async def admin_help_callback_handler(call: CallbackQuery):
 
 
 def register_admin_handlers(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(console_callback_handler,
-                                       lambda c: c.data == 'console',
-                                       state='*')
-    dp.register_callback_query_handler(admin_help_callback_handler,
-                                       lambda c: c.data == 'admin_help',
-                                       state='*')
+    router = callback_router(dp)
+    router.exact('console', console_callback_handler)
+    router.exact('admin_help', admin_help_callback_handler)
 
     register_mailing(dp)
     register_shop_management(dp)
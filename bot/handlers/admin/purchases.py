@@ -17,6 +17,8 @@ from bot.keyboards import (
     purchase_info_menu,
 )
 from bot.misc import TgConfig
+from bot.utils.callback_router import callback_router
+from bot.utils.media_cache import MediaCache
 
 
 async def pirkimai_callback_handler(call: CallbackQuery):
@@ -98,18 +100,15 @@ async def view_purchase_handler(call: CallbackQuery):
         with open(desc_file) as f:
             desc = f.read()
     if os.path.isfile(path):
-        with open(path, 'rb') as media:
-            if path.endswith('.mp4'):
-                await bot.send_video(user_id, media, caption=desc or None)
-            else:
-                await bot.send_photo(user_id, media, caption=desc or None)
+        await MediaCache.send(bot, user_id, path, caption=desc or None)
     else:
         await bot.send_message(user_id, purchase['value'])
     await call.answer()
 
 
 def register_purchases(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(pirkimai_callback_handler, lambda c: c.data == 'pirkimai', state='*')
-    dp.register_callback_query_handler(purchases_date_callback_handler, lambda c: c.data.startswith('purchases_date_'), state='*')
-    dp.register_callback_query_handler(purchase_info_callback_handler, lambda c: c.data.startswith('purchase_'), state='*')
-    dp.register_callback_query_handler(view_purchase_handler, lambda c: c.data.startswith('view_purchase_'), state='*')
+    router = callback_router(dp)
+    router.exact('pirkimai', pirkimai_callback_handler)
+    router.prefix('purchases_date_', purchases_date_callback_handler)
+    router.prefix('purchase_', purchase_info_callback_handler)
+    router.prefix('view_purchase_', view_purchase_handler)
@@ -1,11 +1,13 @@
+import asyncio
 import datetime
+import html
 import os
 import re
 import shutil
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 from aiogram import Dispatcher
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, InputFile
 from aiogram.utils.exceptions import ChatNotFound
 
 
@@ -25,8 +27,13 @@ from bot.database.methods import (
     get_all_item_names,
     get_all_items,
     get_all_subcategories,
+    get_category_id,
+    get_category_ids,
+    get_category_name,
     get_category_parent,
+    get_item_ids,
     get_item_info,
+    get_item_name,
     get_user_count,
     select_admins,
     select_all_operations,
@@ -53,13 +60,16 @@ from bot.utils import generate_internal_name, display_name
 
 
 from bot.utils.files import get_next_file_path
+from bot.utils.log_search import compress_lines, recent_lines
+from bot.utils.stock_uploader import StockUploader
 from bot.database.models import Permission
 from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import (shop_management, goods_management, categories_management, back, item_management,
                            question_buttons, promo_codes_management, promo_expiry_keyboard, promo_codes_list,
-                           promo_manage_actions, reset_all_stock_caches)
+                           promo_manage_actions)
 from bot.logger_mesh import logger
 from bot.misc import TgConfig, EnvKeys
+from bot.utils.callback_router import callback_router
 
 
 def format_geo_targets(targets: list[dict | tuple]) -> str:
@@ -636,23 +646,52 @@ async def shop_callback_handler(call: CallbackQuery):
     await call.answer('Insufficient rights')
 
 
+LOG_EXCERPT_LINES = 1000
+LOG_EXCERPT_MAX_LINES = 20000
+
+
+async def _send_log_excerpt(bot, chat_id: int, limit: int, pattern: str | None = None) -> bool:
+    lines = await asyncio.to_thread(recent_lines, limit, pattern)
+    if not lines:
+        return False
+    data = await asyncio.to_thread(compress_lines, lines)
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    caption = f'{len(lines)} lines' + (f' matching <code>{html.escape(pattern)}</code>' if pattern else '')
+    await bot.send_document(chat_id=chat_id,
+                            document=InputFile(data, filename=f'bot-log-{stamp}.log.gz'),
+                            caption=caption,
+                            parse_mode='HTML')
+    return True
+
+
 async def logs_callback_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
     TgConfig.STATE[user_id] = None
     role = check_role(user_id)
-    file_path = 'bot.log'
     if role & Permission.SHOP_MANAGE:
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            with open(file_path, 'rb') as document:
-                await bot.send_document(chat_id=call.message.chat.id,
-                                        document=document)
-                return
-        else:
+        if not await _send_log_excerpt(bot, call.message.chat.id, LOG_EXCERPT_LINES):
             await call.answer(text="❗️ Kolkas nėra logų")
             return
+        await call.answer()
+        return
     await call.answer('Insufficient rights')
 
 
+async def logs_command_handler(message: Message):
+    """``/logs [lines] [pattern]``: the last lines of the log, or the last ones matching ``pattern``."""
+    bot, user_id = await get_bot_user_ids(message)
+    role = check_role(user_id)
+    if not role & Permission.SHOP_MANAGE:
+        return
+    args = message.get_args().split(maxsplit=1)
+    limit = LOG_EXCERPT_LINES
+    if args and args[0].isdigit():
+        limit = max(1, min(int(args.pop(0)), LOG_EXCERPT_MAX_LINES))
+    pattern = args[0] if args else None
+    if not await _send_log_excerpt(bot, message.chat.id, limit, pattern):
+        await message.reply('❗️ Nothing found' if pattern else "❗️ Kolkas nėra logų")
+
+
 async def goods_management_callback_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
     TgConfig.STATE[user_id] = None
@@ -1487,8 +1526,9 @@ async def assign_photos_callback_handler(call: CallbackQuery):
     TgConfig.STATE[user_id] = None
     categories = get_all_category_names()
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(categories)
     for cat in categories:
-        markup.add(InlineKeyboardButton(cat, callback_data=f'assign_photo_cat_{cat}'))
+        markup.add(InlineKeyboardButton(cat, callback_data=f'assign_photo_cat_{category_ids[cat]}'))
     markup.add(InlineKeyboardButton('🔙 Back', callback_data='goods_management'))
     await bot.edit_message_text('Choose category:',
                                 chat_id=call.message.chat.id,
@@ -1502,14 +1542,16 @@ async def assign_photo_category_handler(call: CallbackQuery):
     if not (role & Permission.SHOP_MANAGE or role & Permission.ASSIGN_PHOTOS):
         await call.answer('Insufficient rights')
         return
-    category = call.data[len('assign_photo_cat_'):]
+    category = get_category_name(call.data[len('assign_photo_cat_'):])
     subcats = get_all_subcategories(category)
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(subcats)
     for sub in subcats:
-        markup.add(InlineKeyboardButton(sub, callback_data=f'assign_photo_sub_{sub}'))
+        markup.add(InlineKeyboardButton(sub, callback_data=f'assign_photo_sub_{category_ids[sub]}'))
     items = get_all_item_names(category)
+    item_ids = get_item_ids(items)
     for item in items:
-        markup.add(InlineKeyboardButton(display_name(item), callback_data=f'assign_photo_item_{item}'))
+        markup.add(InlineKeyboardButton(display_name(item), callback_data=f'assign_photo_item_{item_ids[item]}'))
     markup.add(InlineKeyboardButton('🔙 Back', callback_data='assign_photos'))
     await bot.edit_message_text('Choose subcategory or item:',
                                 chat_id=call.message.chat.id,
@@ -1523,11 +1565,12 @@ async def assign_photo_subcategory_handler(call: CallbackQuery):
     if not (role & Permission.SHOP_MANAGE or role & Permission.ASSIGN_PHOTOS):
         await call.answer('Insufficient rights')
         return
-    sub = call.data[len('assign_photo_sub_'):]
+    sub = get_category_name(call.data[len('assign_photo_sub_'):])
     items = get_all_item_names(sub)
     markup = InlineKeyboardMarkup()
+    item_ids = get_item_ids(items)
     for item in items:
-        markup.add(InlineKeyboardButton(display_name(item), callback_data=f'assign_photo_item_{item}'))
+        markup.add(InlineKeyboardButton(display_name(item), callback_data=f'assign_photo_item_{item_ids[item]}'))
     markup.add(InlineKeyboardButton('🔙 Back', callback_data='assign_photos'))
     await bot.edit_message_text('Choose item:',
                                 chat_id=call.message.chat.id,
@@ -1541,7 +1584,7 @@ async def assign_photo_item_handler(call: CallbackQuery):
     if not (role & Permission.SHOP_MANAGE or role & Permission.ASSIGN_PHOTOS):
         await call.answer('Insufficient rights')
         return
-    item = call.data[len('assign_photo_item_'):]
+    item = get_item_name(call.data[len('assign_photo_item_'):])
     TgConfig.STATE[user_id] = 'assign_photo_wait_media'
     TgConfig.STATE[f'{user_id}_item'] = item
     TgConfig.STATE[f'{user_id}_message_id'] = call.message.message_id
@@ -1600,6 +1643,7 @@ async def assign_photo_receive_desc(message: Message):
     with open(f'{stock_path}.txt', 'w') as f:
         f.write(message.text)
     add_values_to_item(item, stock_path, False)
+    StockUploader.notify()
     TgConfig.STATE[user_id] = None
     TgConfig.STATE.pop(f'{user_id}_stock_path', None)
     TgConfig.STATE.pop(f'{user_id}_item', None)
@@ -1692,8 +1736,9 @@ async def add_subcategory_callback_handler(call: CallbackQuery):
     if role & Permission.SHOP_MANAGE:
         categories = get_all_category_names()
         markup = InlineKeyboardMarkup()
+        category_ids = get_category_ids(categories)
         for cat in categories:
-            markup.add(InlineKeyboardButton(cat, callback_data=f'choose_sub_parent_{cat}'))
+            markup.add(InlineKeyboardButton(cat, callback_data=f'choose_sub_parent_{category_ids[cat]}'))
         markup.add(InlineKeyboardButton('🔙 Back', callback_data='categories_management'))
         await bot.edit_message_text('Select parent category:',
                                     chat_id=call.message.chat.id,
@@ -1705,7 +1750,7 @@ async def add_subcategory_callback_handler(call: CallbackQuery):
 
 async def choose_subcategory_parent(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
-    parent = call.data[len('choose_sub_parent_'):]
+    parent = get_category_name(call.data[len('choose_sub_parent_'):])
     TgConfig.STATE[user_id] = 'add_subcategory_name'
     TgConfig.STATE[f'{user_id}_parent'] = parent
     message_id = TgConfig.STATE.get(f'{user_id}_message_id')
@@ -1811,8 +1856,9 @@ async def delete_category_callback_handler(call: CallbackQuery):
         return
     categories = get_all_category_names()
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(categories)
     for cat in categories:
-        markup.add(InlineKeyboardButton(cat, callback_data=f'delete_cat_{cat}'))
+        markup.add(InlineKeyboardButton(cat, callback_data=f'delete_cat_{category_ids[cat]}'))
     markup.add(InlineKeyboardButton('🔙 Back', callback_data='categories_management'))
     await bot.edit_message_text('Select category to delete:',
                                 chat_id=call.message.chat.id,
@@ -1822,14 +1868,15 @@ async def delete_category_callback_handler(call: CallbackQuery):
 
 async def delete_category_choose_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
-    category = call.data[len('delete_cat_'):]
+    category = get_category_name(call.data[len('delete_cat_'):])
     subcats = get_all_subcategories(category)
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(subcats)
     for sub in subcats:
-        markup.add(InlineKeyboardButton(sub, callback_data=f'delete_cat_{sub}'))
-    markup.add(InlineKeyboardButton(f'🗑️ Delete {category}', callback_data=f'delete_cat_confirm_{category}'))
+        markup.add(InlineKeyboardButton(sub, callback_data=f'delete_cat_{category_ids[sub]}'))
+    markup.add(InlineKeyboardButton(f'🗑️ Delete {category}', callback_data=f'delete_cat_confirm_{get_category_id(category)}'))
     back_parent = get_category_parent(category)
-    back_data = 'delete_category' if back_parent is None else f'delete_cat_{back_parent}'
+    back_data = 'delete_category' if back_parent is None else f'delete_cat_{get_category_id(back_parent)}'
     markup.add(InlineKeyboardButton('🔙 Back', callback_data=back_data))
     await bot.edit_message_text('Choose subcategory or delete:',
                                 chat_id=call.message.chat.id,
@@ -1839,7 +1886,7 @@ async def delete_category_choose_handler(call: CallbackQuery):
 
 async def delete_category_confirm_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
-    category = call.data[len('delete_cat_confirm_'):]
+    category = get_category_name(call.data[len('delete_cat_confirm_'):])
     delete_category(category)
     await bot.edit_message_text('✅ Category deleted',
                                 chat_id=call.message.chat.id,
@@ -2003,8 +2050,9 @@ async def add_item_price(message: Message):
     TgConfig.STATE[f'{user_id}_price'] = int(price)
     categories = get_all_category_names()
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(categories)
     for cat in categories:
-        markup.add(InlineKeyboardButton(cat, callback_data=f'add_item_cat_{cat}'))
+        markup.add(InlineKeyboardButton(cat, callback_data=f'add_item_cat_{category_ids[cat]}'))
     markup.add(InlineKeyboardButton('🔙 Back', callback_data='item-management'))
     await bot.edit_message_text(chat_id=message.chat.id,
                                 message_id=message_id,
@@ -2016,8 +2064,9 @@ async def add_item_choose_category(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
     categories = get_all_category_names()
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(categories)
     for cat in categories:
-        markup.add(InlineKeyboardButton(cat, callback_data=f'add_item_cat_{cat}'))
+        markup.add(InlineKeyboardButton(cat, callback_data=f'add_item_cat_{category_ids[cat]}'))
     markup.add(InlineKeyboardButton('🔙 Back', callback_data='item-management'))
     await bot.edit_message_text('Select category:',
                                 chat_id=call.message.chat.id,
@@ -2027,12 +2076,13 @@ async def add_item_choose_category(call: CallbackQuery):
 
 async def add_item_category_selected(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
-    category = call.data[len('add_item_cat_'):]
+    category = get_category_name(call.data[len('add_item_cat_'):])
     subs = get_all_subcategories(category)
     if subs:
         markup = InlineKeyboardMarkup()
+        category_ids = get_category_ids(subs)
         for sub in subs:
-            markup.add(InlineKeyboardButton(sub, callback_data=f'add_item_sub_{sub}'))
+            markup.add(InlineKeyboardButton(sub, callback_data=f'add_item_sub_{category_ids[sub]}'))
         markup.add(InlineKeyboardButton('🔙 Back', callback_data='add_item_choose_cat'))
         await bot.edit_message_text('Select subcategory:',
                                     chat_id=call.message.chat.id,
@@ -2058,7 +2108,7 @@ async def add_item_category_selected(call: CallbackQuery):
 
 async def add_item_subcategory_selected(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
-    sub = call.data[len('add_item_sub_'):]
+    sub = get_category_name(call.data[len('add_item_sub_'):])
     item_name = TgConfig.STATE.get(f'{user_id}_name')
     item_description = TgConfig.STATE.get(f'{user_id}_description')
     item_price = TgConfig.STATE.get(f'{user_id}_price')
@@ -2154,6 +2204,7 @@ async def updating_item_amount(message: Message):
                              message_id=message.message_id)
     for i in values_list:
         add_values_to_item(item_name, i, False)
+    StockUploader.notify()
     group_id = TgConfig.GROUP_ID if TgConfig.GROUP_ID != -988765433 else None
     if group_id:
         try:
@@ -2293,7 +2344,6 @@ async def update_item_process(call: CallbackQuery):
             delivery_desc,
             changed_by=user_id,
         )
-        reset_all_stock_caches()
         await bot.edit_message_text(chat_id=call.message.chat.id,
                                     message_id=message_id,
                                     text='✅ Item updated',
@@ -2347,6 +2397,7 @@ async def update_item_infinity(message: Message):
             values_list = msg.split(';')
         for i in values_list:
             add_values_to_item(item_old_name, i, False)
+    StockUploader.notify()
     TgConfig.STATE[user_id] = None
     delivery_desc = check_item(item_old_name).get('delivery_description')
     normalized_price = Decimal(str(price).replace(',', '.'))
@@ -2359,7 +2410,6 @@ async def update_item_infinity(message: Message):
         delivery_desc,
         changed_by=user_id,
     )
-    reset_all_stock_caches()
     await bot.edit_message_text(chat_id=message.chat.id,
                                 message_id=message_id,
                                 text='✅ Item updated',
@@ -2378,8 +2428,9 @@ async def delete_item_callback_handler(call: CallbackQuery):
         return
     categories = get_all_category_names()
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(categories)
     for cat in categories:
-        markup.add(InlineKeyboardButton(cat, callback_data=f'delete_item_cat_{cat}'))
+        markup.add(InlineKeyboardButton(cat, callback_data=f'delete_item_cat_{category_ids[cat]}'))
     markup.add(InlineKeyboardButton('🔙 Back', callback_data='goods_management'))
     await bot.edit_message_text('Choose category:',
                                 chat_id=call.message.chat.id,
@@ -2389,16 +2440,18 @@ async def delete_item_callback_handler(call: CallbackQuery):
 
 async def delete_item_category_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
-    category = call.data[len('delete_item_cat_'):]
+    category = get_category_name(call.data[len('delete_item_cat_'):])
     subcats = get_all_subcategories(category)
     items = get_all_item_names(category)
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(subcats)
     for sub in subcats:
-        markup.add(InlineKeyboardButton(sub, callback_data=f'delete_item_cat_{sub}'))
+        markup.add(InlineKeyboardButton(sub, callback_data=f'delete_item_cat_{category_ids[sub]}'))
+    item_ids = get_item_ids(items)
     for item in items:
-        markup.add(InlineKeyboardButton(display_name(item), callback_data=f'delete_item_item_{item}'))
+        markup.add(InlineKeyboardButton(display_name(item), callback_data=f'delete_item_item_{item_ids[item]}'))
     back_parent = get_category_parent(category)
-    back_data = 'delete_item' if back_parent is None else f'delete_item_cat_{back_parent}'
+    back_data = 'delete_item' if back_parent is None else f'delete_item_cat_{get_category_id(back_parent)}'
     markup.add(InlineKeyboardButton('🔙 Back', callback_data=back_data))
     await bot.edit_message_text('Choose subcategory or item to delete:',
                                 chat_id=call.message.chat.id,
@@ -2408,7 +2461,7 @@ async def delete_item_category_handler(call: CallbackQuery):
 
 async def delete_item_item_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
-    item_name = call.data[len('delete_item_item_'):]
+    item_name = get_item_name(call.data[len('delete_item_item_'):])
     delete_item(item_name)
     await bot.edit_message_text('✅ Item deleted',
                                 chat_id=call.message.chat.id,
@@ -2464,137 +2517,74 @@ async def process_item_show(message: Message):
 
 
 def register_shop_management(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(statistics_callback_handler,
-                                       lambda c: c.data == 'statistics')
-    dp.register_callback_query_handler(goods_settings_menu_callback_handler,
-                                       lambda c: c.data == 'item-management')
-    dp.register_callback_query_handler(add_item_callback_handler,
-                                       lambda c: c.data == 'add_item')
-    dp.register_callback_query_handler(update_item_amount_callback_handler,
-                                       lambda c: c.data == 'update_item_amount')
-    dp.register_callback_query_handler(update_item_callback_handler,
-                                       lambda c: c.data == 'update_item')
-    dp.register_callback_query_handler(delete_item_callback_handler,
-                                       lambda c: c.data == 'delete_item')
-    dp.register_callback_query_handler(delete_item_category_handler,
-                                       lambda c: c.data.startswith('delete_item_cat_'))
-    dp.register_callback_query_handler(delete_item_item_handler,
-                                       lambda c: c.data.startswith('delete_item_item_'))
-    dp.register_callback_query_handler(show_bought_item_callback_handler,
-                                       lambda c: c.data == 'show_bought_item')
-    dp.register_callback_query_handler(assign_photos_callback_handler,
-                                       lambda c: c.data == 'assign_photos')
-    dp.register_callback_query_handler(assign_photo_category_handler,
-                                       lambda c: c.data.startswith('assign_photo_cat_'))
-    dp.register_callback_query_handler(assign_photo_subcategory_handler,
-                                       lambda c: c.data.startswith('assign_photo_sub_'))
-    dp.register_callback_query_handler(assign_photo_item_handler,
-                                       lambda c: c.data.startswith('assign_photo_item_'))
-    dp.register_callback_query_handler(photo_info_callback_handler,
-                                       lambda c: c.data.startswith('photo_info_'))
-    dp.register_callback_query_handler(shop_callback_handler,
-                                       lambda c: c.data == 'shop_management')
-    dp.register_callback_query_handler(logs_callback_handler,
-                                       lambda c: c.data == 'show_logs')
-    dp.register_callback_query_handler(goods_management_callback_handler,
-                                       lambda c: c.data == 'goods_management')
-    dp.register_callback_query_handler(promo_management_callback_handler,
-                                       lambda c: c.data == 'promo_management')
-    dp.register_callback_query_handler(categories_callback_handler,
-                                       lambda c: c.data == 'categories_management')
-    dp.register_callback_query_handler(add_category_callback_handler,
-                                       lambda c: c.data == 'add_category')
-    dp.register_callback_query_handler(add_subcategory_callback_handler,
-                                       lambda c: c.data == 'add_subcategory')
-    dp.register_callback_query_handler(choose_subcategory_parent,
-                                       lambda c: c.data.startswith('choose_sub_parent_'))
-    dp.register_callback_query_handler(add_item_category_selected,
-                                       lambda c: c.data.startswith('add_item_cat_'))
-    dp.register_callback_query_handler(add_item_subcategory_selected,
-                                       lambda c: c.data.startswith('add_item_sub_'))
-    dp.register_callback_query_handler(add_item_desc_yes,
-                                       lambda c: c.data == 'add_item_desc_yes')
-    dp.register_callback_query_handler(add_item_desc_no,
-                                       lambda c: c.data == 'add_item_desc_no')
-    dp.register_callback_query_handler(add_item_more_yes,
-                                       lambda c: c.data == 'add_item_more_yes')
-    dp.register_callback_query_handler(add_item_more_no,
-                                       lambda c: c.data == 'add_item_more_no')
-    dp.register_callback_query_handler(add_item_choose_category,
-                                       lambda c: c.data == 'add_item_choose_cat')
-    dp.register_callback_query_handler(delete_category_callback_handler,
-                                       lambda c: c.data == 'delete_category')
-    dp.register_callback_query_handler(delete_category_confirm_handler,
-                                       lambda c: c.data.startswith('delete_cat_confirm_'))
-    dp.register_callback_query_handler(delete_category_choose_handler,
-                                       lambda c: c.data.startswith('delete_cat_') and not c.data.startswith('delete_cat_confirm_'))
-    dp.register_callback_query_handler(update_category_callback_handler,
-                                       lambda c: c.data == 'update_category')
-    dp.register_callback_query_handler(create_promo_callback_handler,
-                                       lambda c: c.data == 'create_promo')
-    dp.register_callback_query_handler(delete_promo_callback_handler,
-                                       lambda c: c.data == 'delete_promo')
-    dp.register_callback_query_handler(manage_promo_callback_handler,
-                                       lambda c: c.data == 'manage_promo')
-    dp.register_callback_query_handler(promo_code_delete_callback_handler,
-                                       lambda c: c.data.startswith('delete_promo_code_'))
-    dp.register_callback_query_handler(promo_manage_select_handler,
-                                       lambda c: c.data.startswith('manage_promo_code_'))
-    dp.register_callback_query_handler(promo_manage_discount_handler,
-                                       lambda c: c.data.startswith('promo_manage_discount_'))
-    dp.register_callback_query_handler(promo_manage_expiry_handler,
-                                       lambda c: c.data.startswith('promo_manage_expiry_'))
-    dp.register_callback_query_handler(promo_manage_geo_handler,
-                                       lambda c: c.data.startswith('promo_manage_geo_'))
-    dp.register_callback_query_handler(promo_target_main_handler,
-                                       lambda c: c.data == 'promo_target_main' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_cities_handler,
-                                       lambda c: c.data == 'promo_target_cities' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_city_toggle_handler,
-                                       lambda c: c.data.startswith('promo_target_city_toggle_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_city_clear_handler,
-                                       lambda c: c.data == 'promo_target_city_clear' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_districts_handler,
-                                       lambda c: c.data == 'promo_target_districts' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_district_open_handler,
-                                       lambda c: c.data.startswith('promo_target_district_open_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_district_toggle_handler,
-                                       lambda c: c.data.startswith('promo_target_district_toggle_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_district_clear_handler,
-                                       lambda c: c.data == 'promo_target_district_clear' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_products_handler,
-                                       lambda c: c.data == 'promo_target_products' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_switch_handler,
-                                       lambda c: c.data == 'promo_target_product_switch' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_toggle_cat_handler,
-                                       lambda c: c.data.startswith('promo_target_product_toggle_cat_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_open_subcategories_handler,
-                                       lambda c: c.data.startswith('promo_target_product_open_sub_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_open_handler,
-                                       lambda c: c.data.startswith('promo_target_product_open_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_toggle_sub_handler,
-                                       lambda c: c.data.startswith('promo_target_product_toggle_sub_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_open_subitem_handler,
-                                       lambda c: c.data.startswith('promo_target_product_open_subitem_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_toggle_item_handler,
-                                       lambda c: c.data.startswith('promo_target_product_toggle_item_') and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_clear_handler,
-                                       lambda c: c.data == 'promo_target_product_clear' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_clear_subcategories_handler,
-                                       lambda c: c.data == 'promo_target_product_clear_sub' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_product_clear_items_handler,
-                                       lambda c: c.data == 'promo_target_product_clear_items' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_target_save_handler,
-                                       lambda c: c.data == 'promo_target_save' and _promo_target_state(c.from_user.id))
-    dp.register_callback_query_handler(promo_manage_stats_handler,
-                                       lambda c: c.data.startswith('promo_manage_stats_'))
-    dp.register_callback_query_handler(promo_manage_delete_handler,
-                                       lambda c: c.data.startswith('promo_manage_delete_'))
-    dp.register_callback_query_handler(promo_create_expiry_type_handler,
-                                       lambda c: c.data.startswith('promo_expiry_') and TgConfig.STATE.get(c.from_user.id) == 'promo_create_expiry_type')
-    dp.register_callback_query_handler(promo_manage_expiry_type_handler,
-                                       lambda c: c.data.startswith('promo_expiry_') and TgConfig.STATE.get(c.from_user.id) == 'promo_manage_expiry_type')
-
+    router = callback_router(dp)
+    router.exact('statistics', statistics_callback_handler)
+    router.exact('item-management', goods_settings_menu_callback_handler)
+    router.exact('add_item', add_item_callback_handler)
+    router.exact('update_item_amount', update_item_amount_callback_handler)
+    router.exact('update_item', update_item_callback_handler)
+    router.exact('delete_item', delete_item_callback_handler)
+    router.prefix('delete_item_cat_', delete_item_category_handler)
+    router.prefix('delete_item_item_', delete_item_item_handler)
+    router.exact('show_bought_item', show_bought_item_callback_handler)
+    router.exact('assign_photos', assign_photos_callback_handler)
+    router.prefix('assign_photo_cat_', assign_photo_category_handler)
+    router.prefix('assign_photo_sub_', assign_photo_subcategory_handler)
+    router.prefix('assign_photo_item_', assign_photo_item_handler)
+    router.prefix('photo_info_', photo_info_callback_handler)
+    router.exact('shop_management', shop_callback_handler)
+    router.exact('show_logs', logs_callback_handler)
+    router.exact('goods_management', goods_management_callback_handler)
+    router.exact('promo_management', promo_management_callback_handler)
+    router.exact('categories_management', categories_callback_handler)
+    router.exact('add_category', add_category_callback_handler)
+    router.exact('add_subcategory', add_subcategory_callback_handler)
+    router.prefix('choose_sub_parent_', choose_subcategory_parent)
+    router.prefix('add_item_cat_', add_item_category_selected)
+    router.prefix('add_item_sub_', add_item_subcategory_selected)
+    router.exact('add_item_desc_yes', add_item_desc_yes)
+    router.exact('add_item_desc_no', add_item_desc_no)
+    router.exact('add_item_more_yes', add_item_more_yes)
+    router.exact('add_item_more_no', add_item_more_no)
+    router.exact('add_item_choose_cat', add_item_choose_category)
+    router.exact('delete_category', delete_category_callback_handler)
+    router.prefix('delete_cat_confirm_', delete_category_confirm_handler)
+    router.prefix('delete_cat_', delete_category_choose_handler)
+    router.exact('update_category', update_category_callback_handler)
+    router.exact('create_promo', create_promo_callback_handler)
+    router.exact('delete_promo', delete_promo_callback_handler)
+    router.exact('manage_promo', manage_promo_callback_handler)
+    router.prefix('delete_promo_code_', promo_code_delete_callback_handler)
+    router.prefix('manage_promo_code_', promo_manage_select_handler)
+    router.prefix('promo_manage_discount_', promo_manage_discount_handler)
+    router.prefix('promo_manage_expiry_', promo_manage_expiry_handler)
+    router.prefix('promo_manage_geo_', promo_manage_geo_handler)
+    router.exact('promo_target_main', promo_target_main_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_cities', promo_target_cities_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_city_toggle_', promo_target_city_toggle_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_city_clear', promo_target_city_clear_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_districts', promo_target_districts_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_district_open_', promo_target_district_open_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_district_toggle_', promo_target_district_toggle_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_district_clear', promo_target_district_clear_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_products', promo_target_products_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_product_switch', promo_target_product_switch_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_product_toggle_cat_', promo_target_product_toggle_cat_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_product_open_sub_', promo_target_product_open_subcategories_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_product_open_', promo_target_product_open_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_product_toggle_sub_', promo_target_product_toggle_sub_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_product_open_subitem_', promo_target_product_open_subitem_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_target_product_toggle_item_', promo_target_product_toggle_item_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_product_clear', promo_target_product_clear_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_product_clear_sub', promo_target_product_clear_subcategories_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_product_clear_items', promo_target_product_clear_items_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.exact('promo_target_save', promo_target_save_handler, guard=lambda c: _promo_target_state(c.from_user.id))
+    router.prefix('promo_manage_stats_', promo_manage_stats_handler)
+    router.prefix('promo_manage_delete_', promo_manage_delete_handler)
+    router.prefix('promo_expiry_', promo_create_expiry_type_handler, guard=lambda c: TgConfig.STATE.get(c.from_user.id) == 'promo_create_expiry_type')
+    router.prefix('promo_expiry_', promo_manage_expiry_type_handler, guard=lambda c: TgConfig.STATE.get(c.from_user.id) == 'promo_manage_expiry_type')
+
+    dp.register_message_handler(logs_command_handler, commands=['logs'])
     dp.register_message_handler(check_item_name_for_amount_upd,
                                 lambda c: TgConfig.STATE.get(c.from_user.id) == 'update_amount_of_item')
     dp.register_message_handler(updating_item_amount,
@@ -2652,5 +2642,4 @@ def register_shop_management(dp: Dispatcher) -> None:
     dp.register_message_handler(promo_manage_receive_geo,
                                 lambda c: TgConfig.STATE.get(c.from_user.id) == 'promo_manage_geo')
 
-    dp.register_callback_query_handler(update_item_process,
-                                       lambda c: c.data.startswith('change_'))
+    router.prefix('change_', update_item_process)
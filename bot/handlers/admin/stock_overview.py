@@ -18,6 +18,7 @@ from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import back
 from bot.logger_mesh import logger
 from bot.utils import display_name
+from bot.utils.callback_router import callback_router
 from bot.utils.safe_sender import safe_send_message
 
 
@@ -119,8 +120,5 @@ async def stock_overview_callback_handler(call: CallbackQuery) -> None:
 
 
 def register_stock_overview(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(
-        stock_overview_callback_handler,
-        lambda c: c.data == "view_stock_overview",
-        state="*",
-    )
+    router = callback_router(dp)
+    router.exact('view_stock_overview', stock_overview_callback_handler)
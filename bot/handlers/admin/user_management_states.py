@@ -12,6 +12,7 @@ from bot.misc import TgConfig
 from bot.database.models import Permission
 from bot.handlers.other import get_bot_user_ids
 from bot.logger_mesh import logger
+from bot.utils.callback_router import callback_router
 
 async def user_callback_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
@@ -227,21 +228,16 @@ async def process_replenish_user_balance(message: Message):
 
 
 def register_user_management(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(user_callback_handler,
-                                       lambda c: c.data == 'user_management')
+    router = callback_router(dp)
+    router.exact('user_management', user_callback_handler)
 
     dp.register_message_handler(process_replenish_user_balance,
                                 lambda c: TgConfig.STATE.get(c.from_user.id) == 'process_replenish_user_balance')
     dp.register_message_handler(check_user_data,
                                 lambda c: TgConfig.STATE.get(c.from_user.id) == 'user_username_for_check')
 
-    dp.register_callback_query_handler(process_admin_for_remove,
-                                       lambda c: c.data.startswith('remove-admin_'))
-    dp.register_callback_query_handler(process_admin_for_purpose,
-                                       lambda c: c.data.startswith('set-admin_'))
-    dp.register_callback_query_handler(replenish_user_balance_callback_handler,
-                                       lambda c: c.data.startswith('fill-user-balance_'))
-    dp.register_callback_query_handler(user_profile_view,
-                                       lambda c: c.data.startswith('check-user_'))
-    dp.register_callback_query_handler(user_items_callback_handler,
-                                       lambda c: c.data.startswith('user-items_'))
+    router.prefix('remove-admin_', process_admin_for_remove)
+    router.prefix('set-admin_', process_admin_for_purpose)
+    router.prefix('fill-user-balance_', replenish_user_balance_callback_handler)
+    router.prefix('check-user_', user_profile_view)
+    router.prefix('user-items_', user_items_callback_handler)
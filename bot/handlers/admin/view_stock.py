@@ -24,7 +24,6 @@ from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import (
     resolve_stock_category,
     resolve_stock_item,
-    reset_stock_cache,
     stock_categories_list,
     stock_goods_list,
     stock_item_actions,
@@ -32,10 +31,10 @@ from bot.keyboards import (
     stock_price_prompt,
     stock_values_list,
     stock_value_actions,
-    reset_all_stock_caches,
 )
 from bot.misc import TgConfig
 from bot.utils import display_name
+from bot.utils.callback_router import callback_router
 
 
 TITLE_MAX_LENGTH = 100
@@ -47,7 +46,6 @@ async def view_stock_callback_handler(call: CallbackQuery):
     TgConfig.STATE[user_id] = None
     role = check_role(user_id)
     if role & Permission.OWN:
-        reset_stock_cache(user_id)
         categories = get_all_category_names()
         await bot.edit_message_text(
             '📦 Choose category',
@@ -317,7 +315,6 @@ async def stock_title_input_handler(message: Message):
         info.get('delivery_description'),
         changed_by=user_id,
     )
-    reset_all_stock_caches()
     _clear_stock_state(user_id)
     confirmation = (
         f'✅ Title updated for {display_name(new_internal_name)}.\n\n'
@@ -401,7 +398,6 @@ async def stock_description_input_handler(message: Message):
         info.get('delivery_description'),
         changed_by=user_id,
     )
-    reset_all_stock_caches()
     _clear_stock_state(user_id)
     await _render_item_overview(
         bot,
@@ -535,7 +531,6 @@ async def stock_price_input_handler(message: Message):
         info.get('delivery_description'),
         changed_by=user_id,
     )
-    reset_all_stock_caches()
     _clear_stock_state(user_id)
     await _render_item_overview(
         bot,
@@ -549,49 +544,16 @@ async def stock_price_input_handler(message: Message):
 
 
 def register_view_stock(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(
-        view_stock_callback_handler, lambda c: c.data == 'manage_stock'
-    )
-    dp.register_callback_query_handler(
-        view_stock_category_handler,
-        lambda c: c.data.startswith('stock_cat:'),
-        state='*',
-    )
-    dp.register_callback_query_handler(
-        view_stock_item_handler,
-        lambda c: c.data.startswith('stock_item:'),
-        state='*',
-    )
-    dp.register_callback_query_handler(
-        view_stock_item_values_handler,
-        lambda c: c.data.startswith('stock_vals:'),
-        state='*',
-    )
-    dp.register_callback_query_handler(
-        view_stock_value_handler,
-        lambda c: c.data.startswith('stock_val:'),
-        state='*',
-    )
-    dp.register_callback_query_handler(
-        view_stock_delete_handler,
-        lambda c: c.data.startswith('stock_del:'),
-        state='*',
-    )
-    dp.register_callback_query_handler(
-        view_stock_title_prompt_handler,
-        lambda c: c.data.startswith('stock_title:'),
-        state='*',
-    )
-    dp.register_callback_query_handler(
-        view_stock_description_prompt_handler,
-        lambda c: c.data.startswith('stock_desc:'),
-        state='*',
-    )
-    dp.register_callback_query_handler(
-        view_stock_price_prompt_handler,
-        lambda c: c.data.startswith('stock_price:'),
-        state='*',
-    )
+    router = callback_router(dp)
+    router.exact('manage_stock', view_stock_callback_handler)
+    router.prefix('stock_cat:', view_stock_category_handler)
+    router.prefix('stock_item:', view_stock_item_handler)
+    router.prefix('stock_vals:', view_stock_item_values_handler)
+    router.prefix('stock_val:', view_stock_value_handler)
+    router.prefix('stock_del:', view_stock_delete_handler)
+    router.prefix('stock_title:', view_stock_title_prompt_handler)
+    router.prefix('stock_desc:', view_stock_description_prompt_handler)
+    router.prefix('stock_price:', view_stock_price_prompt_handler)
     dp.register_message_handler(
         stock_price_input_handler,
         lambda m: TgConfig.STATE.get(m.from_user.id) == 'stock_price_edit',
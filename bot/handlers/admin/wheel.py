@@ -22,6 +22,7 @@ from bot.keyboards import (
 )
 from bot.localization import t
 from bot.misc import TgConfig
+from bot.utils.callback_router import callback_router
 
 
 def _wheel_state_key(user_id: int, suffix: str) -> str:
@@ -384,14 +385,15 @@ async def wheel_remove_more_handler(call: CallbackQuery):
 
 
 def register_wheel_management(dp: Dispatcher) -> None:
-    dp.register_callback_query_handler(wheel_menu_handler, lambda c: c.data == 'wheel_menu', state='*')
-    dp.register_callback_query_handler(wheel_assign_prize_handler, lambda c: c.data == 'wheel_assign_prizes', state='*')
-    dp.register_callback_query_handler(wheel_assign_spins_handler, lambda c: c.data == 'wheel_assign_spins', state='*')
-    dp.register_callback_query_handler(wheel_assign_more_handler, lambda c: c.data == 'wheel_assign_more', state='*')
-    dp.register_callback_query_handler(wheel_assign_spins_more_handler, lambda c: c.data == 'wheel_assign_spins_more', state='*')
-    dp.register_callback_query_handler(wheel_see_users_handler, lambda c: c.data == 'wheel_see_users', state='*')
-    dp.register_callback_query_handler(wheel_remove_users_handler, lambda c: c.data == 'wheel_remove_users', state='*')
-    dp.register_callback_query_handler(wheel_remove_more_handler, lambda c: c.data == 'wheel_remove_more', state='*')
+    router = callback_router(dp)
+    router.exact('wheel_menu', wheel_menu_handler)
+    router.exact('wheel_assign_prizes', wheel_assign_prize_handler)
+    router.exact('wheel_assign_spins', wheel_assign_spins_handler)
+    router.exact('wheel_assign_more', wheel_assign_more_handler)
+    router.exact('wheel_assign_spins_more', wheel_assign_spins_more_handler)
+    router.exact('wheel_see_users', wheel_see_users_handler)
+    router.exact('wheel_remove_users', wheel_remove_users_handler)
+    router.exact('wheel_remove_more', wheel_remove_more_handler)
 
     dp.register_message_handler(_handle_assign_name, lambda m: TgConfig.STATE.get(m.from_user.id) == 'wheel_assign_name', state='*')
     dp.register_message_handler(_handle_assign_location, lambda m: TgConfig.STATE.get(m.from_user.id) == 'wheel_assign_location', state='*')
@@ -3,6 +3,7 @@ from aiogram import Dispatcher
 from bot.handlers.admin import register_admin_handlers
 from bot.handlers.other import register_other_handlers
 from bot.handlers.user import register_user_handlers
+from bot.utils.callback_router import callback_router
 
 
 def register_all_handlers(dp: Dispatcher) -> None:
@@ -13,3 +14,4 @@ def register_all_handlers(dp: Dispatcher) -> None:
     )
     for handler in handlers:
         handler(dp)
+    callback_router(dp).check()
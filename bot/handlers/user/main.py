@@ -5,12 +5,9 @@ import os
 import random
 import shutil
 from collections.abc import Sequence
-from io import BytesIO
 from urllib.parse import urlparse
 import html
 
-import qrcode
-
 import contextlib
 
 
@@ -27,13 +24,14 @@ from aiogram.utils.exceptions import MessageNotModified
 
 from bot.database.methods import (
     select_max_role_id, get_role_id_by_name, create_user, check_role, check_user, get_all_categories, get_all_items,
-    select_bought_items, get_bought_item_info, get_item_info, select_item_values_amount,
-    get_user_balance, get_item_value, buy_item, add_bought_item, buy_item_for_balance,
+    get_item_id, get_item_ids, get_item_name, get_category_name,
+    select_bought_items, get_bought_item_info, get_item_info, get_item_info_by_id, select_item_values_amount,
+    get_user_balance, get_item_value, get_item_value_by_item_id, purchase_item, buy_item_for_balance,
     select_user_operations, select_user_items, start_operation, select_unfinished_operations,
-    get_user_referral, finish_operation, update_balance, create_operation, bought_items_list,
+    finish_operation, update_balance, bought_items_list,
     check_value, get_subcategories, get_category_parent, get_user_language, update_user_language,
     get_unfinished_operation, get_promocode, mark_promocode_used, is_promocode_used, update_promocode,
-    set_role,
+    set_role, set_users_bot_blocked,
 )
 from bot.handlers.other import get_bot_user_ids, get_bot_info
 from bot.keyboards import (
@@ -191,11 +189,7 @@ async def _send_welcome_media(bot, user_id: int) -> bool:
     if not _has_welcome_media():
         return False
     try:
-        with open(TgConfig.START_PHOTO_PATH, 'rb') as media:
-            if str(TgConfig.START_PHOTO_PATH).lower().endswith('.mp4'):
-                await bot.send_video(user_id, media)
-            else:
-                await bot.send_photo(user_id, media)
+        await MediaCache.send(bot, user_id, str(TgConfig.START_PHOTO_PATH))
         return True
     except Exception:
         return False
@@ -357,7 +351,7 @@ async def _edit_promo_message(
         balance = get_user_balance(user_id)
         promo_available = _promo_application_available(user_id)
         reply_markup = confirm_purchase_menu(
-            item_name,
+            get_item_id(item_name),
             lang,
             user_id,
             current_price,
@@ -419,16 +413,23 @@ async def _apply_promo_discount(
 
 from bot.logger_mesh import logger
 from bot.misc import TgConfig, EnvKeys
-from bot.misc.payment import quick_pay, check_payment_status
+from bot.misc.payment import quick_pay, check_invoice_status, PROVIDER_NOWPAYMENTS, PROVIDER_YOOMONEY
 from bot.misc.nowpayments import create_payment, check_payment
 from bot.utils import display_name
+from bot.utils.callback_router import callback_router
 from bot.utils.notifications import (
+    notify_owner_of_feedback,
     notify_owner_of_purchase,
     notify_owner_of_prize_win,
     notify_owner_of_topup,
 )
 from bot.utils.level import get_level_info
 from bot.utils.files import cleanup_item_file
+from bot.utils.media_cache import MediaCache
+from bot.utils.outbox import OutboxWorker, outbox_media, outbox_text
+from bot.utils.payment_ledger import PaymentLedger
+from bot.utils.rate_limiter import Priority, set_outbound_priority
+from bot.utils.renderer import Renderer
 from bot.utils.security import SecurityManager
 
 PURCHASE_SUCCESS_STATUSES = {'finished', 'confirmed', 'sending', 'paid', 'success'}
@@ -551,6 +552,8 @@ async def _complete_start_flow(message: Message, referral_override: str | None =
         role=user_role,
         username=message.from_user.username,
     )
+    # A returning user has unblocked the bot; include them in broadcasts again.
+    set_users_bot_blocked([user_id], False)
 
     role_data = check_role(user_id)
     user_db = check_user(user_id)
@@ -628,13 +631,17 @@ async def start(message: Message):
         return
 
     referral_id = _extract_referral_payload(message, user_id)
-    challenge = SecurityManager.refresh_captcha(user_id)
+    if SecurityManager.is_verified(user_id):
+        await _complete_start_flow(message, referral_override=referral_id)
+        return
+
+    question, answer, captcha_image = await Renderer.captcha()
+    challenge = SecurityManager.assign_captcha(user_id, question, answer)
     if referral_id:
         challenge.referral = referral_id
 
     TgConfig.STATE[user_id] = 'security_captcha'
 
-    captcha_image = SecurityManager.build_captcha_image(user_id, challenge)
     await bot.send_photo(
         user_id,
         captcha_image,
@@ -705,13 +712,17 @@ async def start(message: Message):
         return
 
     referral_id = _extract_referral_payload(message, user_id)
-    challenge = SecurityManager.refresh_captcha(user_id)
+    if SecurityManager.is_verified(user_id):
+        await _complete_start_flow(message, referral_override=referral_id)
+        return
+
+    question, answer, captcha_image = await Renderer.captcha()
+    challenge = SecurityManager.assign_captcha(user_id, question, answer)
     if referral_id:
         challenge.referral = referral_id
 
     TgConfig.STATE[user_id] = 'security_captcha'
 
-    captcha_image = SecurityManager.build_captcha_image(user_id, challenge)
     await bot.send_photo(
         user_id,
         captcha_image,
@@ -732,8 +743,9 @@ async def pavogti(message: Message):
         await bot.send_message(user_id, 'No stock available')
         return
     markup = InlineKeyboardMarkup()
+    item_ids = get_item_ids(items)
     for itm in items:
-        markup.add(InlineKeyboardButton(display_name(itm), callback_data=f'pavogti_item_{itm}'))
+        markup.add(InlineKeyboardButton(display_name(itm), callback_data=f'pavogti_item_{item_ids[itm]}'))
     await bot.send_message(user_id, 'Select item:', reply_markup=markup)
 
 
@@ -741,7 +753,7 @@ async def pavogti_item_callback(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
     if str(user_id) != '5640990416':
         return
-    item_name = call.data[len('pavogti_item_'):]
+    item_name = get_item_name(call.data[len('pavogti_item_'):])
     info = get_item_info(item_name)
     if not info:
         await call.answer('❌ Item not found', show_alert=True)
@@ -758,15 +770,10 @@ async def pavogti_item_callback(call: CallbackQuery):
                 with open(desc_path) as f:
                     media_caption = f.read()
     if media_path:
-        with open(media_path, 'rb') as mf:
-            if media_path.endswith('.mp4'):
-                await bot.send_video(user_id, mf, caption=media_caption)
-            else:
-                await bot.send_photo(user_id, mf, caption=media_caption)
+        await MediaCache.send(bot, user_id, media_path, caption=media_caption)
     value = get_item_value(item_name)
     if value and os.path.isfile(value['value']):
-        with open(value['value'], 'rb') as photo:
-            await bot.send_photo(user_id, photo, caption=info['description'])
+        await MediaCache.send(bot, user_id, value['value'], kind='photo', caption=info['description'])
     else:
         await bot.send_message(user_id, info['description'])
 
@@ -959,10 +966,7 @@ async def feedback_product_handler(call: CallbackQuery):
                                chat_id=call.message.chat.id,
                                message_id=call.message.message_id)
     username = f'@{call.from_user.username}' if call.from_user.username else call.from_user.full_name
-    await bot.send_message(
-        EnvKeys.OWNER_ID,
-        f'User {username} feedback: service {service_rating}, product {rating}'
-    )
+    await notify_owner_of_feedback(bot, username, service_rating, rating)
 
 
 async def start_blackjack_game(call: CallbackQuery, bet: int):
@@ -1115,8 +1119,11 @@ async def dummy_button(call: CallbackQuery):
 
 
 async def items_list_callback_handler(call: CallbackQuery):
-    category_name = call.data[9:]
+    category_name = get_category_name(call.data[9:])
     bot, user_id = await get_bot_user_ids(call)
+    if category_name is None:
+        await call.answer('❌ Category not found', show_alert=True)
+        return
     TgConfig.STATE[user_id] = None
     subcategories = get_subcategories(category_name)
     if subcategories:
@@ -1145,16 +1152,18 @@ async def items_list_callback_handler(call: CallbackQuery):
 
 
 async def item_info_callback_handler(call: CallbackQuery):
-    item_name = call.data[5:]
     bot, user_id = await get_bot_user_ids(call)
+    item_info_list = get_item_info_by_id(call.data[5:])
+    if not item_info_list:
+        await call.answer('❌ Item not found', show_alert=True)
+        return
+    item_name = item_info_list['name']
     TgConfig.STATE[user_id] = None
-    item_info_list = get_item_info(item_name)
-    category = item_info_list['category_name']
     lang = get_user_language(user_id) or 'en'
     purchases = select_user_items(user_id)
     _, discount, _, _ = get_level_info(purchases)
     price = _calculate_discounted_price(item_info_list.get("price"), discount)
-    markup = item_info(item_name, category, lang)
+    markup = item_info(item_info_list['id'], item_info_list['category_id'], lang)
     await bot.edit_message_text(
         f'🏪 Item {display_name(item_name)}\n'
         f'Description: {item_info_list["description"]}\n'
@@ -1174,12 +1183,12 @@ def home_markup(lang: str = 'en'):
 
 async def confirm_buy_callback_handler(call: CallbackQuery):
     """Show confirmation menu before purchasing an item."""
-    item_name = call.data[len('confirm_'):]
     bot, user_id = await get_bot_user_ids(call)
-    info = get_item_info(item_name)
+    info = get_item_info_by_id(call.data[len('confirm_'):])
     if not info:
         await call.answer('❌ Item not found', show_alert=True)
         return
+    item_name = info['name']
     purchases = select_user_items(user_id)
     _, discount, _, _ = get_level_info(purchases)
     price = _calculate_discounted_price(info.get('price'), discount)
@@ -1198,7 +1207,7 @@ async def confirm_buy_callback_handler(call: CallbackQuery):
         message_id=call.message.message_id,
         text=text,
         reply_markup=confirm_purchase_menu(
-            item_name,
+            info['id'],
             lang,
             user_id,
             price,
@@ -1208,7 +1217,7 @@ async def confirm_buy_callback_handler(call: CallbackQuery):
     )
 
 async def apply_promo_callback_handler(call: CallbackQuery):
-    item_name = call.data[len('applypromo_'):]
+    item_id = call.data[len('applypromo_'):]
     bot, user_id = await get_bot_user_ids(call)
     lang = get_user_language(user_id) or 'en'
     _clear_promo_flow(user_id)
@@ -1218,7 +1227,7 @@ async def apply_promo_callback_handler(call: CallbackQuery):
         chat_id=call.message.chat.id,
         message_id=call.message.message_id,
         text=t(lang, 'promo_prompt'),
-        reply_markup=back(f'confirm_{item_name}')
+        reply_markup=back(f'confirm_{item_id}')
     )
 
 async def process_promo_code(message: Message):
@@ -1234,7 +1243,7 @@ async def process_promo_code(message: Message):
     lang = get_user_language(user_id) or 'en'
     await _safe_delete_message(bot, message)
     chat_id = message.chat.id
-    back_markup = back(f'confirm_{item_name}')
+    back_markup = back(f'confirm_{get_item_id(item_name)}')
 
     if state == 'wait_promo_code':
         _reset_promo_details(user_id)
@@ -1431,12 +1440,13 @@ async def process_promo_code(message: Message):
         )
 
 
-async def prepare_crypto_invoice(call: CallbackQuery, item_name: str, use_balance: float | None) -> None:
+async def prepare_crypto_invoice(call: CallbackQuery, item_id: str, use_balance: float | None) -> None:
     bot, user_id = await get_bot_user_ids(call)
-    info = get_item_info(item_name)
+    info = get_item_info_by_id(item_id)
     if not info:
         await call.answer('❌ Item not found', show_alert=True)
         return
+    item_name = info['name']
     lang = get_user_language(user_id) or 'en'
     purchases_before = select_user_items(user_id)
     price = TgConfig.STATE.get(f'{user_id}_price')
@@ -1454,7 +1464,7 @@ async def prepare_crypto_invoice(call: CallbackQuery, item_name: str, use_balanc
     TgConfig.STATE[f'{user_id}_pending_item'] = item_name
     if amount_due <= 0:
         original_data = call.data
-        call.data = f'buy_{item_name}'
+        call.data = f'buy_{info["id"]}'
         try:
             await buy_item_callback_handler(call)
         finally:
@@ -1462,6 +1472,7 @@ async def prepare_crypto_invoice(call: CallbackQuery, item_name: str, use_balanc
         return
     context = {
         'item_name': item_name,
+        'item_id': info['id'],
         'price': price,
         'use_balance': round(min(credits, price), 2),
         'lang': lang,
@@ -1481,7 +1492,7 @@ async def prepare_crypto_invoice(call: CallbackQuery, item_name: str, use_balanc
         item=display_name(item_name),
     )
     await call.answer()
-    markup = crypto_choice(back_callback=f'confirm_{item_name}')
+    markup = crypto_choice(back_callback=f'confirm_{info["id"]}')
     await bot.edit_message_text(
         chat_id=call.message.chat.id,
         message_id=call.message.message_id,
@@ -1491,35 +1502,103 @@ async def prepare_crypto_invoice(call: CallbackQuery, item_name: str, use_balanc
 
 
 async def pay_with_crypto_handler(call: CallbackQuery):
-    item_name = call.data[len('cryptobuy_'):]
-    await prepare_crypto_invoice(call, item_name, 0)
+    await prepare_crypto_invoice(call, call.data[len('cryptobuy_'):], 0)
 
 
 async def pay_with_credit_and_crypto_handler(call: CallbackQuery):
-    item_name = call.data[len('creditpay_'):]
-    await prepare_crypto_invoice(call, item_name, None)
+    await prepare_crypto_invoice(call, call.data[len('creditpay_'):], None)
+
+def _move_to_sold(value_path: str, sold_path: str) -> None:
+    """Move a sold stock file and its description into ``Sold/``.
+
+    Runs right after the purchase commits and before the outbox worker is
+    woken, so the delivery never uploads a file that is moved under it.  If
+    the move fails the delivery still finds the file at its old path.
+    """
+
+    try:
+        os.makedirs(os.path.dirname(sold_path), exist_ok=True)
+        shutil.move(value_path, sold_path)
+        MediaCache.move(value_path, sold_path)
+        desc_file = f"{value_path}.txt"
+        if os.path.isfile(desc_file):
+            shutil.move(desc_file, os.path.join(os.path.dirname(sold_path), os.path.basename(desc_file)))
+    except OSError:
+        logger.exception("Failed to move sold file %s", value_path)
+
 
 async def buy_item_callback_handler(call: CallbackQuery):
-    item_name = call.data[4:]
+    set_outbound_priority(Priority.DELIVERY)
+    item_id = call.data[4:]
     bot, user_id = await get_bot_user_ids(call)
     msg = call.message.message_id
-    item_info_list = get_item_info(item_name)
+    item_info_list = get_item_info_by_id(item_id)
+    if not item_info_list:
+        await call.answer('❌ Item not found', show_alert=True)
+        return
+    item_name = item_info_list['name']
     item_price = TgConfig.STATE.get(f'{user_id}_price', item_info_list["price"])
     user_balance = get_user_balance(user_id)
     purchases_before = select_user_items(user_id)
 
     if user_balance >= item_price:
-        value_data = get_item_value(item_name)
+        value_data = get_item_value_by_item_id(item_info_list['id'])
 
+        purchase_id = None
         if value_data:
-            # remove from stock immediately
-            buy_item(value_data['id'], value_data['is_infinity'])
-
             current_time = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
             formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
-            new_balance = buy_item_for_balance(user_id, item_price)
-            purchase_id = add_bought_item(value_data['item_name'], value_data['value'], item_price, user_id, formatted_time)
+            new_balance = user_balance - item_price
             purchases = purchases_before + 1
+
+            photo_desc = ''
+            file_path = None
+            is_media = os.path.isfile(value_data['value'])
+            desc_file = f"{value_data['value']}.txt"
+            if is_media:
+                if os.path.isfile(desc_file):
+                    with open(desc_file) as f:
+                        photo_desc = f.read()
+                caption = (
+                    f'✅ Item purchased. <b>Balance</b>: <i>{new_balance}</i>€\n'
+                    f'📦 Purchases: {purchases}'
+                )
+                if photo_desc:
+                    caption += f'\n\n{photo_desc}'
+                sold_folder = os.path.join(os.path.dirname(value_data['value']), 'Sold')
+                file_path = os.path.join(sold_folder, os.path.basename(value_data['value']))
+                delivery = outbox_media(
+                    call.message.chat.id,
+                    file_path,
+                    caption=caption,
+                    parse_mode='HTML',
+                    file_id=value_data.get('file_id'),
+                    fallback_path=value_data['value'],
+                )
+            else:
+                text = (
+                    f'✅ Item purchased. <b>Balance</b>: <i>{new_balance}</i>€\n'
+                    f'📦 Purchases: {purchases}\n\n{value_data["value"]}'
+                )
+                delivery = outbox_text(
+                    call.message.chat.id,
+                    text,
+                    reply_markup=home_markup(get_user_language(user_id) or 'en'),
+                    parse_mode='HTML',
+                    edit_message_id=msg,
+                )
+                photo_desc = value_data['value']
+
+            # Stock, balance, purchase record and the delivery are committed together.
+            purchase_id = purchase_item(
+                value_data['id'], value_data['is_infinity'], user_id, value_data['item_name'],
+                value_data['value'], item_price, item_price, formatted_time, outbox=[delivery],
+            )
+
+        if purchase_id is not None:
+            if is_media:
+                _move_to_sold(value_data['value'], file_path)
+            OutboxWorker.notify()
             level_before, _, _, _ = get_level_info(purchases_before)
             level_after, discount, _, _ = get_level_info(purchases)
             await _ensure_wheel_spin_awarded(bot, user_id, purchases)
@@ -1538,40 +1617,7 @@ async def buy_item_callback_handler(call: CallbackQuery):
             )
             parent_cat = get_category_parent(item_info_list['category_name'])
 
-            photo_desc = ''
-            file_path = None
-            if os.path.isfile(value_data['value']):
-                desc_file = f"{value_data['value']}.txt"
-                if os.path.isfile(desc_file):
-                    with open(desc_file) as f:
-                        photo_desc = f.read()
-                with open(value_data['value'], 'rb') as media:
-                    caption = (
-                        f'✅ Item purchased. <b>Balance</b>: <i>{new_balance}</i>€\n'
-                        f'📦 Purchases: {purchases}'
-                    )
-                    if photo_desc:
-                        caption += f'\n\n{photo_desc}'
-                    if value_data['value'].endswith('.mp4'):
-                        await bot.send_video(
-                            chat_id=call.message.chat.id,
-                            video=media,
-                            caption=caption,
-                            parse_mode='HTML'
-                        )
-                    else:
-                        await bot.send_photo(
-                            chat_id=call.message.chat.id,
-                            photo=media,
-                            caption=caption,
-                            parse_mode='HTML'
-                        )
-                sold_folder = os.path.join(os.path.dirname(value_data['value']), 'Sold')
-                os.makedirs(sold_folder, exist_ok=True)
-                file_path = os.path.join(sold_folder, os.path.basename(value_data['value']))
-                shutil.move(value_data['value'], file_path)
-                if os.path.isfile(desc_file):
-                    shutil.move(desc_file, os.path.join(sold_folder, os.path.basename(desc_file)))
+            if is_media:
                 log_path = os.path.join('assets', 'purchases.txt')
                 os.makedirs(os.path.dirname(log_path), exist_ok=True)
                 with open(log_path, 'a', encoding='utf-8') as log_file:
@@ -1583,25 +1629,12 @@ async def buy_item_callback_handler(call: CallbackQuery):
                     chat_id=call.message.chat.id,
                     message_id=msg,
                     text=f'✅ Item purchased. 📦 Total Purchases: {purchases}',
-                    reply_markup=back(f'item_{item_name}')
+                    reply_markup=back(f'item_{item_id}')
                 )
 
                 cleanup_item_file(value_data['value'])
                 if os.path.isfile(desc_file):
                     cleanup_item_file(desc_file)
-            else:
-                text = (
-                    f'✅ Item purchased. <b>Balance</b>: <i>{new_balance}</i>€\n'
-                    f'📦 Purchases: {purchases}\n\n{value_data["value"]}'
-                )
-                await bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=msg,
-                    text=text,
-                    parse_mode='HTML',
-                    reply_markup=home_markup(get_user_language(user_id) or 'en')
-                )
-                photo_desc = value_data['value']
 
             await notify_owner_of_purchase(
                 bot,
@@ -1630,7 +1663,7 @@ async def buy_item_callback_handler(call: CallbackQuery):
         await bot.edit_message_text(chat_id=call.message.chat.id,
                                     message_id=msg,
                                     text='❌ Item out of stock',
-                                    reply_markup=back(f'item_{item_name}'))
+                                    reply_markup=back(f'item_{item_id}'))
         _discard_active_promo(user_id)
         TgConfig.STATE.pop(f'{user_id}_pending_item', None)
         TgConfig.STATE.pop(f'{user_id}_price', None)
@@ -1639,7 +1672,7 @@ async def buy_item_callback_handler(call: CallbackQuery):
     await bot.edit_message_text(chat_id=call.message.chat.id,
                                 message_id=msg,
                                 text='❌ Insufficient funds',
-                                reply_markup=back(f'item_{item_name}'))
+                                reply_markup=back(f'item_{item_id}'))
     _discard_active_promo(user_id)
     TgConfig.STATE.pop(f'{user_id}_pending_item', None)
     TgConfig.STATE.pop(f'{user_id}_price', None)
@@ -1653,7 +1686,7 @@ async def handle_purchase_crypto_payment(call: CallbackQuery, currency: str, con
     amount_due = round(max(price - use_balance, 0), 2)
     if amount_due <= 0:
         original_data = call.data
-        call.data = f'buy_{item_name}'
+        call.data = f"buy_{context.get('item_id') or get_item_id(item_name)}"
         try:
             await buy_item_callback_handler(call)
         finally:
@@ -1679,10 +1712,7 @@ async def handle_purchase_crypto_payment(call: CallbackQuery, currency: str, con
     )
     caption += f"\n\n<code>{address}</code>\n\n⏳ Expires at: {expires_at} LT"
 
-    qr = qrcode.make(address)
-    buf = BytesIO()
-    qr.save(buf, format='PNG')
-    buf.seek(0)
+    buf = await Renderer.qr_png(address)
 
     await call.answer()
     with contextlib.suppress(Exception):
@@ -1758,6 +1788,7 @@ async def finalize_purchase_invoice(bot, payment_id: str) -> None:
     info = TgConfig.STATE.pop(f'purchase_invoice_{payment_id}', None)
     if not info:
         return
+    set_outbound_priority(Priority.DELIVERY)
     TgConfig.STATE.pop(f"{info['user_id']}_active_invoice", None)
     user_id = info['user_id']
     item_name = info['item_name']
@@ -1792,20 +1823,68 @@ async def finalize_purchase_invoice(bot, payment_id: str) -> None:
         )
         return
 
-    buy_item(value_data['id'], value_data['is_infinity'])
     current_time = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
     formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
 
-    applied_credits = 0.0
-    new_balance = get_user_balance(user_id)
-    if use_balance > 0:
-        current_balance = get_user_balance(user_id)
-        applied_credits = min(use_balance, current_balance)
-        if applied_credits > 0:
-            new_balance = buy_item_for_balance(user_id, applied_credits)
-
-    purchase_id = add_bought_item(value_data['item_name'], value_data['value'], price, user_id, formatted_time)
+    current_balance = get_user_balance(user_id)
+    applied_credits = min(use_balance, current_balance) if use_balance > 0 else 0.0
+    new_balance = current_balance - applied_credits
     purchases = purchases_before + 1
+
+    photo_desc = ''
+    file_path = None
+    caption = (
+        f'✅ Item purchased. <b>Balance</b>: <i>{new_balance:.2f}</i>€\n'
+        f'📦 Purchases: {purchases}'
+    )
+    if applied_credits:
+        caption += f"\n🎁 Credits applied: {applied_credits:.2f}€"
+    is_media = os.path.isfile(value_data['value'])
+    desc_file = f"{value_data['value']}.txt"
+    if is_media:
+        if os.path.isfile(desc_file):
+            with open(desc_file) as f:
+                photo_desc = f.read()
+        if photo_desc:
+            caption += f'\n\n{photo_desc}'
+        sold_folder = os.path.join(os.path.dirname(value_data['value']), 'Sold')
+        file_path = os.path.join(sold_folder, os.path.basename(value_data['value']))
+        delivery = outbox_media(
+            chat_id,
+            file_path,
+            caption=caption,
+            parse_mode='HTML',
+            file_id=value_data.get('file_id'),
+            fallback_path=value_data['value'],
+        )
+    else:
+        text = f'✅ Item purchased. <b>Balance</b>: <i>{new_balance:.2f}</i>€\n📦 Purchases: {purchases}\n\n{value_data["value"]}'
+        delivery = outbox_text(chat_id, text, reply_markup=home_markup(lang), parse_mode='HTML')
+        photo_desc = value_data['value']
+
+    purchase_id = purchase_item(
+        value_data['id'], value_data['is_infinity'], user_id, value_data['item_name'],
+        value_data['value'], price, applied_credits, formatted_time, outbox=[delivery],
+    )
+    if purchase_id is None:
+        _discard_active_promo(user_id)
+        with contextlib.suppress(Exception):
+            await bot.edit_message_caption(
+                chat_id=chat_id,
+                message_id=message_id,
+                caption=t(lang, 'purchase_out_of_stock'),
+                reply_markup=back('back_to_menu'),
+            )
+        await bot.send_message(
+            user_id,
+            t(lang, 'purchase_out_of_stock'),
+            reply_markup=back('back_to_menu'),
+        )
+        return
+    if is_media:
+        _move_to_sold(value_data['value'], file_path)
+    OutboxWorker.notify()
+
     level_before, _, _, _ = get_level_info(purchases_before)
     level_after, discount, _, _ = get_level_info(purchases)
     await _ensure_wheel_spin_awarded(bot, user_id, purchases)
@@ -1824,44 +1903,7 @@ async def finalize_purchase_invoice(bot, payment_id: str) -> None:
     )
     parent_cat = get_category_parent(item_info_list['category_name'])
 
-    photo_desc = ''
-    file_path = None
-    caption = (
-        f'✅ Item purchased. <b>Balance</b>: <i>{new_balance:.2f}</i>€\n'
-        f'📦 Purchases: {purchases}'
-    )
-    if applied_credits:
-        caption += f"\n🎁 Credits applied: {applied_credits:.2f}€"
-    if os.path.isfile(value_data['value']):
-        desc_file = f"{value_data['value']}.txt"
-        desc_contents = ''
-        if os.path.isfile(desc_file):
-            with open(desc_file) as f:
-                desc_contents = f.read()
-        with open(value_data['value'], 'rb') as media:
-            if desc_contents:
-                caption += f'\n\n{desc_contents}'
-            if value_data['value'].endswith('.mp4'):
-                await bot.send_video(
-                    chat_id=chat_id,
-                    video=media,
-                    caption=caption,
-                    parse_mode='HTML',
-                )
-            else:
-                await bot.send_photo(
-                    chat_id=chat_id,
-                    photo=media,
-                    caption=caption,
-                    parse_mode='HTML',
-                )
-        photo_desc = desc_contents
-        sold_folder = os.path.join(os.path.dirname(value_data['value']), 'Sold')
-        os.makedirs(sold_folder, exist_ok=True)
-        file_path = os.path.join(sold_folder, os.path.basename(value_data['value']))
-        shutil.move(value_data['value'], file_path)
-        if os.path.isfile(desc_file):
-            shutil.move(desc_file, os.path.join(sold_folder, os.path.basename(desc_file)))
+    if is_media:
         log_path = os.path.join('assets', 'purchases.txt')
         os.makedirs(os.path.dirname(log_path), exist_ok=True)
         with open(log_path, 'a', encoding='utf-8') as log_file:
@@ -1871,15 +1913,6 @@ async def finalize_purchase_invoice(bot, payment_id: str) -> None:
         cleanup_item_file(value_data['value'])
         if os.path.isfile(desc_file):
             cleanup_item_file(desc_file)
-    else:
-        text = f'✅ Item purchased. <b>Balance</b>: <i>{new_balance:.2f}</i>€\n📦 Purchases: {purchases}\n\n{value_data["value"]}'
-        await bot.send_message(
-            chat_id,
-            text,
-            parse_mode='HTML',
-            reply_markup=home_markup(lang),
-        )
-        photo_desc = value_data['value']
 
     success_caption = t(lang, 'purchase_invoice_paid', item=display_name(item_name))
     with contextlib.suppress(Exception):
@@ -2294,12 +2327,12 @@ async def pay_yoomoney(call: CallbackQuery):
                                      f'⌛️ You have {int(sleep_time / 60)} minutes to pay.\n'
                                      f'<b>❗️ After payment press "Check payment"</b>',
                                 reply_markup=markup)
-    start_operation(user_id, amount, label, call.message.message_id)
+    start_operation(user_id, amount, label, call.message.message_id, provider=PROVIDER_YOOMONEY)
     await asyncio.sleep(sleep_time)
     info = get_unfinished_operation(label)
     if info:
         _, _, _ = info
-        status = await check_payment_status(label)
+        status = await check_invoice_status(label, PROVIDER_YOOMONEY)
         if status not in ('paid', 'success'):
             finish_operation(label)
             await bot.send_message(user_id, t(lang, 'invoice_cancelled'))
@@ -2335,10 +2368,7 @@ async def crypto_payment(call: CallbackQuery):
     )
 
     # Generate QR code for the address
-    qr = qrcode.make(address)
-    buf = BytesIO()
-    qr.save(buf, format='PNG')
-    buf.seek(0)
+    buf = await Renderer.qr_png(address)
 
     await bot.delete_message(chat_id=call.message.chat.id, message_id=call.message.message_id)
     sent = await bot.send_photo(
@@ -2348,18 +2378,19 @@ async def crypto_payment(call: CallbackQuery):
         parse_mode='HTML',
         reply_markup=markup,
     )
-    start_operation(user_id, amount, payment_id, sent.message_id)
+    start_operation(user_id, amount, payment_id, sent.message_id, provider=PROVIDER_NOWPAYMENTS)
     await asyncio.sleep(sleep_time)
     info = get_unfinished_operation(payment_id)
     if info:
         _, _, _ = info
-        status = await check_payment(payment_id)
+        status = await check_invoice_status(payment_id, PROVIDER_NOWPAYMENTS)
         if status not in ('finished', 'confirmed', 'sending'):
             finish_operation(payment_id)
             await bot.send_message(user_id, t(lang, 'invoice_cancelled'))
 
 
 async def checking_payment(call: CallbackQuery):
+    set_outbound_priority(Priority.PAYMENT)
     bot, user_id = await get_bot_user_ids(call)
     message_id = call.message.message_id
     label = call.data[6:]
@@ -2367,27 +2398,25 @@ async def checking_payment(call: CallbackQuery):
 
     if info:
         user_id_db, operation_value, _ = info
-        payment_status = await check_payment_status(label)
-        if payment_status is None:
-            payment_status = await check_payment(label)
+        payment_status = await check_invoice_status(label)
 
         if payment_status in ("success", "paid", "finished", "confirmed", "sending"):
             current_time = datetime.datetime.now()
             formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
-            referral_id = get_user_referral(user_id)
-            finish_operation(label)
-
-            if referral_id and TgConfig.REFERRAL_PERCENT != 0:
-                referral_percent = TgConfig.REFERRAL_PERCENT
-                referral_operation = round((referral_percent/100) * operation_value)
-                update_balance(referral_id, referral_operation)
+            credit = PaymentLedger.credit_topup(label, formatted_time, TgConfig.REFERRAL_PERCENT)
+            if not credit:
+                await call.answer(text='✅ Payment already processed')
+                return
+            operation_value = credit['value']
+            referral_id = credit['referral_id']
+            referral_operation = credit['referral_bonus']
+
+            if referral_id and referral_operation:
                 await bot.send_message(referral_id,
                                        f'✅ You received {referral_operation}€ '
                                        f'from your referral {call.from_user.first_name}',
                                        reply_markup=close())
 
-            create_operation(user_id, operation_value, formatted_time)
-            update_balance(user_id, operation_value)
             await bot.edit_message_text(chat_id=call.message.chat.id,
                                         message_id=message_id,
                                         text=f'✅ Balance topped up by {operation_value}€',
@@ -2510,6 +2539,7 @@ async def welcome_video_no_handler(call: CallbackQuery):
 
 
 def register_user_handlers(dp: Dispatcher):
+    router = callback_router(dp)
     dp.register_message_handler(
         process_security_captcha,
         lambda m: TgConfig.STATE.get(m.from_user.id) == 'security_captcha',
@@ -2520,96 +2550,52 @@ def register_user_handlers(dp: Dispatcher):
     dp.register_message_handler(purchase_tip_trigger,
                                  lambda m: m.text and m.text.startswith('✅ Item purchased.'), state='*')
 
-    dp.register_callback_query_handler(shop_callback_handler,
-                                       lambda c: c.data == 'shop')
-    dp.register_callback_query_handler(dummy_button,
-                                       lambda c: c.data == 'dummy_button')
-    dp.register_callback_query_handler(welcome_video_yes_handler,
-                                       lambda c: c.data == 'welcome_video_yes', state='*')
-    dp.register_callback_query_handler(welcome_video_no_handler,
-                                       lambda c: c.data == 'welcome_video_no', state='*')
-    dp.register_callback_query_handler(profile_callback_handler,
-                                       lambda c: c.data == 'profile')
-    dp.register_callback_query_handler(wheel_spin_open_handler,
-                                       lambda c: c.data == 'wheel_spin', state='*')
-    dp.register_callback_query_handler(wheel_spin_confirm_handler,
-                                       lambda c: c.data == 'wheel_spin_confirm', state='*')
-    dp.register_callback_query_handler(wheel_spin_cancel_handler,
-                                       lambda c: c.data == 'wheel_spin_cancel', state='*')
-    dp.register_callback_query_handler(rules_callback_handler,
-                                       lambda c: c.data == 'rules')
-    dp.register_callback_query_handler(help_callback_handler,
-                                       lambda c: c.data == 'help')
-    dp.register_callback_query_handler(replenish_balance_callback_handler,
-                                       lambda c: c.data == 'replenish_balance')
-    dp.register_callback_query_handler(price_list_callback_handler,
-                                       lambda c: c.data == 'price_list')
-    dp.register_callback_query_handler(blackjack_callback_handler,
-                                       lambda c: c.data == 'blackjack')
-    dp.register_callback_query_handler(blackjack_set_bet_handler,
-                                       lambda c: c.data == 'blackjack_set_bet')
-    dp.register_callback_query_handler(blackjack_place_bet_handler,
-                                       lambda c: c.data == 'blackjack_place_bet')
-    dp.register_callback_query_handler(blackjack_play_again_handler,
-                                       lambda c: c.data.startswith('blackjack_play_'))
-    dp.register_callback_query_handler(blackjack_move_handler,
-                                       lambda c: c.data in ('blackjack_hit', 'blackjack_stand'))
-    dp.register_callback_query_handler(blackjack_history_handler,
-                                       lambda c: c.data.startswith('blackjack_history_'))
-    dp.register_callback_query_handler(blackjack_rules_handler,
-                                       lambda c: c.data == 'blackjack_rules')
-    dp.register_callback_query_handler(feedback_service_handler,
-                                       lambda c: c.data.startswith('feedback_service_'), state='*')
-    dp.register_callback_query_handler(feedback_product_handler,
-                                       lambda c: c.data.startswith('feedback_product_'), state='*')
-    dp.register_callback_query_handler(bought_items_callback_handler,
-                                       lambda c: c.data == 'bought_items', state='*')
-    dp.register_callback_query_handler(back_to_menu_callback_handler,
-                                       lambda c: c.data == 'back_to_menu',
-                                       state='*')
-    dp.register_callback_query_handler(close_callback_handler,
-                                       lambda c: c.data == 'close', state='*')
-    dp.register_callback_query_handler(change_language,
-                                       lambda c: c.data == 'change_language', state='*')
-    dp.register_callback_query_handler(set_language,
-                                       lambda c: c.data.startswith('set_lang_'), state='*')
-
-    dp.register_callback_query_handler(navigate_bought_items,
-                                       lambda c: c.data.startswith('bought-goods-page_'), state='*')
-    dp.register_callback_query_handler(bought_item_info_callback_handler,
-                                       lambda c: c.data.startswith('bought-item:'), state='*')
-    dp.register_callback_query_handler(items_list_callback_handler,
-                                       lambda c: c.data.startswith('category_'), state='*')
-    dp.register_callback_query_handler(item_info_callback_handler,
-                                       lambda c: c.data.startswith('item_'), state='*')
-    dp.register_callback_query_handler(confirm_buy_callback_handler,
-                                       lambda c: c.data.startswith('confirm_'), state='*')
-    dp.register_callback_query_handler(apply_promo_callback_handler,
-                                       lambda c: c.data.startswith('applypromo_'), state='*')
-    dp.register_callback_query_handler(pay_with_crypto_handler,
-                                       lambda c: c.data.startswith('cryptobuy_'), state='*')
-    dp.register_callback_query_handler(pay_with_credit_and_crypto_handler,
-                                       lambda c: c.data.startswith('creditpay_'), state='*')
-    dp.register_callback_query_handler(buy_item_callback_handler,
-                                       lambda c: c.data.startswith('buy_'), state='*')
-    dp.register_callback_query_handler(tip_callback_handler,
-                                       lambda c: c.data.startswith('tip_'), state='*')
-    dp.register_callback_query_handler(pay_yoomoney,
-                                       lambda c: c.data == 'pay_yoomoney', state='*')
-    dp.register_callback_query_handler(crypto_payment,
-                                       lambda c: c.data.startswith('crypto_'), state='*')
-    dp.register_callback_query_handler(cancel_purchase_invoice,
-                                       lambda c: c.data.startswith('cancel_purchase_'), state='*')
-    dp.register_callback_query_handler(cancel_payment,
-                                       lambda c: c.data.startswith('cancel_') and not c.data.startswith('cancel_purchase_'), state='*')
-    dp.register_callback_query_handler(confirm_cancel_payment,
-                                       lambda c: c.data.startswith('confirm_cancel_'), state='*')
-    dp.register_callback_query_handler(check_purchase_invoice,
-                                       lambda c: c.data.startswith('check_purchase_'), state='*')
-    dp.register_callback_query_handler(checking_payment,
-                                       lambda c: c.data.startswith('check_') and not c.data.startswith('check_purchase_'), state='*')
-    dp.register_callback_query_handler(process_home_menu,
-                                       lambda c: c.data == 'home_menu', state='*')
+    router.exact('shop', shop_callback_handler)
+    router.exact('dummy_button', dummy_button)
+    router.exact('welcome_video_yes', welcome_video_yes_handler)
+    router.exact('welcome_video_no', welcome_video_no_handler)
+    router.exact('profile', profile_callback_handler)
+    router.exact('wheel_spin', wheel_spin_open_handler)
+    router.exact('wheel_spin_confirm', wheel_spin_confirm_handler)
+    router.exact('wheel_spin_cancel', wheel_spin_cancel_handler)
+    router.exact('rules', rules_callback_handler)
+    router.exact('help', help_callback_handler)
+    router.exact('replenish_balance', replenish_balance_callback_handler)
+    router.exact('price_list', price_list_callback_handler)
+    router.exact('blackjack', blackjack_callback_handler)
+    router.exact('blackjack_set_bet', blackjack_set_bet_handler)
+    router.exact('blackjack_place_bet', blackjack_place_bet_handler)
+    router.prefix('blackjack_play_', blackjack_play_again_handler)
+    router.exact('blackjack_hit', blackjack_move_handler)
+    router.exact('blackjack_stand', blackjack_move_handler)
+    router.prefix('blackjack_history_', blackjack_history_handler)
+    router.exact('blackjack_rules', blackjack_rules_handler)
+    router.prefix('feedback_service_', feedback_service_handler)
+    router.prefix('feedback_product_', feedback_product_handler)
+    router.exact('bought_items', bought_items_callback_handler)
+    router.exact('back_to_menu', back_to_menu_callback_handler)
+    router.exact('close', close_callback_handler)
+    router.exact('change_language', change_language)
+    router.prefix('set_lang_', set_language)
+
+    router.prefix('bought-goods-page_', navigate_bought_items)
+    router.prefix('bought-item:', bought_item_info_callback_handler)
+    router.prefix('category_', items_list_callback_handler)
+    router.prefix('item_', item_info_callback_handler)
+    router.prefix('confirm_', confirm_buy_callback_handler)
+    router.prefix('applypromo_', apply_promo_callback_handler)
+    router.prefix('cryptobuy_', pay_with_crypto_handler)
+    router.prefix('creditpay_', pay_with_credit_and_crypto_handler)
+    router.prefix('buy_', buy_item_callback_handler)
+    router.prefix('tip_', tip_callback_handler)
+    router.exact('pay_yoomoney', pay_yoomoney)
+    router.prefix('crypto_', crypto_payment)
+    router.prefix('cancel_purchase_', cancel_purchase_invoice)
+    router.prefix('cancel_', cancel_payment)
+    router.prefix('confirm_cancel_', confirm_cancel_payment)
+    router.prefix('check_purchase_', check_purchase_invoice)
+    router.prefix('check_', checking_payment)
+    router.exact('home_menu', process_home_menu)
 
     dp.register_message_handler(process_replenish_balance,
                                 lambda c: TgConfig.STATE.get(c.from_user.id) == 'process_replenish_balance')
@@ -2625,5 +2611,4 @@ def register_user_handlers(dp: Dispatcher):
                                 lambda c: TgConfig.STATE.get(c.from_user.id) == 'blackjack_enter_bet')
     dp.register_message_handler(pavogti,
                                 commands=['pavogti'])
-    dp.register_callback_query_handler(pavogti_item_callback,
-                                       lambda c: c.data.startswith('pavogti_item_'))
\ No newline at end of file
+    router.prefix('pavogti_item_', pavogti_item_callback)
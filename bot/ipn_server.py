@@ -1,28 +1,27 @@
-from flask import Flask, request, abort
+from flask import Flask, Response, request, abort
 import datetime
 import hmac
 import hashlib
 import asyncio
-from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from bot.localization import t
 
 from bot.misc import EnvKeys, TgConfig
-from bot.database import Database
-from bot.database.models.main import UnfinishedOperations
-from bot.database.methods import (
-    finish_operation,
-    create_operation,
-    update_balance,
-    get_user_referral,
-    get_user_language,
-)
+from bot.misc.bot import create_bot
+from bot.database.methods import get_unfinished_operation, get_user_language
 from bot.logger_mesh import logger
+from bot.utils.outbox import OutboxWorker, outbox_delete, outbox_text
+from bot.utils.payment_ledger import PaymentLedger
+from bot.utils.rate_limiter import Priority
+from bot.utils.loop_watchdog import LoopWatchdog
+from bot.utils.metrics import render_metrics
 from bot.utils.security import SecurityManager
 from bot.utils.notifications import notify_owner_of_topup
 
 app = Flask(__name__)
 
+CREDIT_STATUSES = ("finished", "confirmed", "sending", "paid", "partially_paid")
+
 
 def verify_signature(data: bytes, signature: str | None) -> bool:
     if not EnvKeys.NOWPAYMENTS_IPN_SECRET:
@@ -37,6 +36,27 @@ def verify_signature(data: bytes, signature: str | None) -> bool:
     return hmac.compare_digest(calc, signature)
 
 
+def _require_metrics_token() -> None:
+    # The IPN server listens publicly, so the debug routes do not exist until METRICS_TOKEN is set.
+    if not EnvKeys.METRICS_TOKEN:
+        abort(404)
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), EnvKeys.METRICS_TOKEN.encode()):
+        abort(401)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    _require_metrics_token()
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/debug/loop-stalls", methods=["GET"])
+def loop_stalls():
+    _require_metrics_token()
+    return Response(LoopWatchdog.report() + "\n", mimetype="text/plain")
+
+
 @app.route("/nowpayments-ipn", methods=["POST"])
 @app.route("/", methods=["POST"])  # fallback if IPN path omitted
 def nowpayments_ipn():
@@ -71,26 +91,37 @@ def nowpayments_ipn():
         return "", 400
     payment_id = str(payment_id_raw)
 
-    if status in ("finished", "confirmed", "sending", "paid", "partially_paid"):
-        session = Database().session
-        record = (
-            session.query(UnfinishedOperations)
-            .filter(UnfinishedOperations.operation_id == payment_id)
-            .first()
+    # Crediting statuses are not pre-claimed: credit_topup writes its own
+    # ledger row in the same transaction as the balance change, so a failed
+    # credit leaves the status open for the provider's retry.
+    if status not in CREDIT_STATUSES and not PaymentLedger.claim(payment_id, status):
+        logger.info("Ignoring repeated IPN %s with status %s from %s", payment_id, status, ip_addr)
+        return "", 200
+
+    if status in CREDIT_STATUSES:
+        formatted_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        operation = get_unfinished_operation(payment_id)
+        outbox = None
+        if operation:
+            # the invoice removal and confirmation are committed with the credit
+            op_user_id, op_value, op_message_id = operation
+            lang = get_user_language(op_user_id) or 'en'
+            markup = InlineKeyboardMarkup().add(
+                InlineKeyboardButton(t(lang, 'back_home'), callback_data='home_menu')
+            )
+            outbox = [
+                outbox_text(op_user_id, t(lang, 'payment_successful', amount=op_value),
+                            reply_markup=markup, priority=Priority.PAYMENT),
+            ]
+            if op_message_id:
+                outbox.insert(0, outbox_delete(op_user_id, op_message_id))
+        credit = PaymentLedger.credit_topup(
+            payment_id, formatted_time, TgConfig.REFERRAL_PERCENT, outbox=outbox
         )
-        if record:
-            value = record.operation_value
-            user_id = record.user_id
-            message_id = record.message_id
-            finish_operation(payment_id)
-            formatted_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            create_operation(user_id, value, formatted_time)
-            update_balance(user_id, value)
-
-            referral_id = get_user_referral(user_id)
-            if referral_id and TgConfig.REFERRAL_PERCENT != 0:
-                referral_operation = round((TgConfig.REFERRAL_PERCENT / 100) * value)
-                update_balance(referral_id, referral_operation)
+        if credit:
+            value = credit['value']
+            user_id = credit['user_id']
+            OutboxWorker.notify()
 
             logger.info(
                 "NOWPayments IPN confirmed payment %s for user %s from %s",
@@ -99,20 +130,7 @@ def nowpayments_ipn():
                 ip_addr,
             )
 
-            # notify user and delete invoice
-            bot = Bot(token=EnvKeys.TOKEN, parse_mode="HTML")
-            lang = get_user_language(user_id) or 'en'
-            markup = InlineKeyboardMarkup().add(
-                InlineKeyboardButton(t(lang, 'back_home'), callback_data='home_menu')
-            )
-            asyncio.run(bot.delete_message(chat_id=user_id, message_id=message_id))
-            asyncio.run(
-                bot.send_message(
-                    chat_id=user_id,
-                    text=t(lang, 'payment_successful', amount=value),
-                    reply_markup=markup,
-                )
-            )
+            bot = create_bot()
             try:
                 chat = asyncio.run(bot.get_chat(user_id))
                 username = (
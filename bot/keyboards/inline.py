@@ -4,10 +4,14 @@ from bot.database.models import Permission
 from bot.localization import t
 from bot.database.methods import (
     get_category_parent,
-    select_item_values_amount,
-    check_value,
+    get_category_id,
+    get_category_ids,
+    get_category_name,
+    get_item_id,
+    get_item_ids,
+    get_item_name,
+    get_stock_counts,
 )
-from bot.misc import TgConfig
 from bot.utils import display_name
 
 
@@ -61,8 +65,9 @@ def main_menu(role: int, reviews: str = None, price: str = None, lang: str = 'en
 def categories_list(list_items: list[str]) -> InlineKeyboardMarkup:
     """Show all categories without pagination."""
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(list_items)
     for name in list_items:
-        markup.add(InlineKeyboardButton(text=name, callback_data=f'category_{name}'))
+        markup.add(InlineKeyboardButton(text=name, callback_data=f'category_{category_ids[name]}'))
     markup.add(InlineKeyboardButton('🔙 Back to menu', callback_data='back_to_menu'))
     return markup
 
@@ -70,8 +75,9 @@ def categories_list(list_items: list[str]) -> InlineKeyboardMarkup:
 def goods_list(list_items: list[str], category_name: str) -> InlineKeyboardMarkup:
     """Show all goods for a category without pagination."""
     markup = InlineKeyboardMarkup()
+    item_ids = get_item_ids(list_items)
     for name in list_items:
-        markup.add(InlineKeyboardButton(text=display_name(name), callback_data=f'item_{name}'))
+        markup.add(InlineKeyboardButton(text=display_name(name), callback_data=f'item_{item_ids[name]}'))
     markup.add(InlineKeyboardButton('🔙 Go back', callback_data='shop'))
     return markup
 
@@ -79,10 +85,11 @@ def goods_list(list_items: list[str], category_name: str) -> InlineKeyboardMarku
 def subcategories_list(list_items: list[str], parent: str) -> InlineKeyboardMarkup:
     """Show all subcategories without pagination."""
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(list_items)
     for name in list_items:
-        markup.add(InlineKeyboardButton(text=name, callback_data=f'category_{name}'))
+        markup.add(InlineKeyboardButton(text=name, callback_data=f'category_{category_ids[name]}'))
     back_parent = get_category_parent(parent)
-    back_data = 'shop' if back_parent is None else f'category_{back_parent}'
+    back_data = 'shop' if back_parent is None else f'category_{get_category_id(back_parent)}'
     markup.add(InlineKeyboardButton('🔙 Go back', callback_data=back_data))
     return markup
 
@@ -104,11 +111,11 @@ def user_items_list(list_items: list, data: str, back_data: str, pre_back: str,
     return markup
 
 
-def item_info(item_name: str, category_name: str, lang: str) -> InlineKeyboardMarkup:
+def item_info(item_id: int, category_id: int, lang: str) -> InlineKeyboardMarkup:
     """Return inline keyboard for a single item without basket option."""
     inline_keyboard = [
-        [InlineKeyboardButton('💰 Buy', callback_data=f'confirm_{item_name}')],
-        [InlineKeyboardButton('🔙 Go back', callback_data=f'category_{category_name}')]
+        [InlineKeyboardButton('💰 Buy', callback_data=f'confirm_{item_id}')],
+        [InlineKeyboardButton('🔙 Go back', callback_data=f'category_{category_id}')]
     ]
     return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
 
@@ -172,7 +179,7 @@ def console(role: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
 
 def confirm_purchase_menu(
-    item_name: str,
+    item_id: int,
     lang: str,
     user_id: int | None,
     price: float,
@@ -185,7 +192,7 @@ def confirm_purchase_menu(
         inline_keyboard.append([
             InlineKeyboardButton(
                 t(lang, 'pay_with_balance', amount=f'{price:.2f}'),
-                callback_data=f'buy_{item_name}',
+                callback_data=f'buy_{item_id}',
             )
         ])
     elif balance > 0:
@@ -198,20 +205,20 @@ def confirm_purchase_menu(
                     credits=f'{balance:.2f}',
                     due=f'{due:.2f}',
                 ),
-                callback_data=f'creditpay_{item_name}',
+                callback_data=f'creditpay_{item_id}',
             )
         ])
 
     inline_keyboard.append([
         InlineKeyboardButton(
             t(lang, 'pay_with_crypto', amount=f'{price:.2f}'),
-            callback_data=f'cryptobuy_{item_name}',
+            callback_data=f'cryptobuy_{item_id}',
         )
     ])
 
     if promo_available:
         inline_keyboard.append(
-            [InlineKeyboardButton(t(lang, 'apply_promo'), callback_data=f'applypromo_{item_name}')]
+            [InlineKeyboardButton(t(lang, 'apply_promo'), callback_data=f'applypromo_{item_id}')]
         )
     inline_keyboard.append([InlineKeyboardButton('🔙 Back to menu', callback_data='back_to_menu')])
     return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
@@ -412,114 +419,53 @@ def wheel_spin_confirm_keyboard(lang: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
 
 
-def _stock_cache_key(user_id: int) -> str:
-    return f'{user_id}_stock_cache'
+def _get_category_token(name: str) -> str:
+    return f'c{get_category_id(name)}'
 
 
-def _ensure_stock_cache(user_id: int) -> dict:
-    key = _stock_cache_key(user_id)
-    cache = TgConfig.STATE.get(key)
-    if not isinstance(cache, dict):
-        cache = {
-            'category_tokens': {},
-            'categories': {},
-            'item_tokens': {},
-            'items': {},
-        }
-        TgConfig.STATE[key] = cache
-    else:
-        cache.setdefault('category_tokens', {})
-        cache.setdefault('categories', {})
-        cache.setdefault('item_tokens', {})
-        cache.setdefault('items', {})
-    return cache
-
-
-def reset_stock_cache(user_id: int) -> None:
-    TgConfig.STATE[_stock_cache_key(user_id)] = {
-        'category_tokens': {},
-        'categories': {},
-        'item_tokens': {},
-        'items': {},
-    }
-
-
-def reset_all_stock_caches() -> None:
-    """Clear cached stock navigation data for every user."""
-    keys = [key for key in TgConfig.STATE.keys() if key.endswith('_stock_cache')]
-    for key in keys:
-        TgConfig.STATE[key] = {
-            'category_tokens': {},
-            'categories': {},
-            'item_tokens': {},
-            'items': {},
-        }
-
-
-def _get_category_token(cache: dict, name: str) -> str:
-    tokens = cache['category_tokens']
-    reverse = cache['categories']
-    if name not in tokens:
-        token = f'c{len(tokens) + 1}'
-        tokens[name] = token
-        reverse[token] = name
-    return tokens[name]
-
-
-def _get_item_token(cache: dict, name: str) -> str:
-    tokens = cache['item_tokens']
-    reverse = cache['items']
-    if name not in tokens:
-        token = f'i{len(tokens) + 1}'
-        tokens[name] = token
-        reverse[token] = name
-    return tokens[name]
+def _get_item_token(name: str) -> str:
+    return f'i{get_item_id(name)}'
 
 
 def resolve_stock_category(user_id: int, token: str) -> str | None:
-    cache = _ensure_stock_cache(user_id)
-    return cache['categories'].get(token)
+    return get_category_name(token[1:]) if token.startswith('c') else None
 
 
 def resolve_stock_item(user_id: int, token: str) -> str | None:
-    cache = _ensure_stock_cache(user_id)
-    return cache['items'].get(token)
+    return get_item_name(token[1:]) if token.startswith('i') else None
 
 
 def stock_categories_list(user_id: int, list_items: list[str], parent: str | None) -> InlineKeyboardMarkup:
     """List categories or subcategories for stock view."""
-    cache = _ensure_stock_cache(user_id)
     markup = InlineKeyboardMarkup()
+    category_ids = get_category_ids(list_items + ([parent] if parent is not None else []))
     for name in list_items:
-        token = _get_category_token(cache, name)
-        markup.add(InlineKeyboardButton(text=name, callback_data=f'stock_cat:{token}'))
+        markup.add(InlineKeyboardButton(text=name, callback_data=f'stock_cat:c{category_ids[name]}'))
     if parent is None:
         back_data = 'console'
     else:
-        parent_token = _get_category_token(cache, parent)
-        back_data = f'stock_cat:{parent_token}'
+        back_data = f'stock_cat:c{category_ids[parent]}'
     markup.add(InlineKeyboardButton('🔙 Go back', callback_data=back_data))
     return markup
 
 
 def stock_goods_list(user_id: int, list_items: list[str], category_name: str) -> InlineKeyboardMarkup:
     """Show goods with stock counts for a category."""
-    cache = _ensure_stock_cache(user_id)
-    # Ensure the current category has a token so the "Go back" button can reference it later.
-    _get_category_token(cache, category_name)
     markup = InlineKeyboardMarkup()
+    item_ids = get_item_ids(list_items)
+    stock = get_stock_counts(list(item_ids.values()))
     for name in list_items:
-        amount = '∞' if check_value(name) else select_item_values_amount(name)
-        item_token = _get_item_token(cache, name)
+        infinite, count = stock.get(item_ids[name], (False, 0))
+        amount = '∞' if infinite else count
         markup.add(InlineKeyboardButton(
             text=f'{display_name(name)} ({amount})',
-            callback_data=f'stock_item:{item_token}'
+            callback_data=f'stock_item:i{item_ids[name]}'
         ))
     parent = get_category_parent(category_name)
     if parent is None:
         back_data = 'console'
     else:
-        parent_token = _get_category_token(cache, parent)
+        parent_token = _get_category_token(parent)
         back_data = f'stock_cat:{parent_token}'
     markup.add(InlineKeyboardButton('🔙 Go back', callback_data=back_data))
     return markup
@@ -527,8 +473,7 @@ def stock_goods_list(user_id: int, list_items: list[str], category_name: str) ->
 
 def stock_values_list(user_id: int, values, item_name: str) -> InlineKeyboardMarkup:
     """List individual stock entries for an item."""
-    cache = _ensure_stock_cache(user_id)
-    item_token = _get_item_token(cache, item_name)
+    item_token = _get_item_token(item_name)
     markup = InlineKeyboardMarkup()
     for val in values:
         markup.add(InlineKeyboardButton(
@@ -540,8 +485,7 @@ def stock_values_list(user_id: int, values, item_name: str) -> InlineKeyboardMar
 
 
 def stock_value_actions(user_id: int, value_id: int, item_name: str) -> InlineKeyboardMarkup:
-    cache = _ensure_stock_cache(user_id)
-    item_token = _get_item_token(cache, item_name)
+    item_token = _get_item_token(item_name)
     inline_keyboard = [
         [InlineKeyboardButton('🗑 Delete', callback_data=f'stock_del:{value_id}')],
         [InlineKeyboardButton('🔙 Go back', callback_data=f'stock_vals:{item_token}')],
@@ -551,9 +495,8 @@ def stock_value_actions(user_id: int, value_id: int, item_name: str) -> InlineKe
 
 def stock_item_actions(user_id: int, item_name: str, category_name: str) -> InlineKeyboardMarkup:
     """Actions available for a single item inside stock management."""
-    cache = _ensure_stock_cache(user_id)
-    item_token = _get_item_token(cache, item_name)
-    category_token = _get_category_token(cache, category_name)
+    item_token = _get_item_token(item_name)
+    category_token = _get_category_token(category_name)
     inline_keyboard = [
         [InlineKeyboardButton('📦 View stock', callback_data=f'stock_vals:{item_token}')],
         [InlineKeyboardButton('✏️ Rename title', callback_data=f'stock_title:{item_token}')],
@@ -566,8 +509,7 @@ def stock_item_actions(user_id: int, item_name: str, category_name: str) -> Inli
 
 def stock_price_prompt(user_id: int, item_name: str) -> InlineKeyboardMarkup:
     """Inline keyboard shown while waiting for a new price input."""
-    cache = _ensure_stock_cache(user_id)
-    item_token = _get_item_token(cache, item_name)
+    item_token = _get_item_token(item_name)
     inline_keyboard = [
         [InlineKeyboardButton('🔙 Cancel', callback_data=f'stock_item:{item_token}')],
     ]
@@ -576,8 +518,7 @@ def stock_price_prompt(user_id: int, item_name: str) -> InlineKeyboardMarkup:
 
 def stock_item_return(user_id: int, item_name: str) -> InlineKeyboardMarkup:
     """Inline keyboard that returns back to the item overview."""
-    cache = _ensure_stock_cache(user_id)
-    item_token = _get_item_token(cache, item_name)
+    item_token = _get_item_token(item_name)
     inline_keyboard = [
         [InlineKeyboardButton('🔙 Back to item', callback_data=f'stock_item:{item_token}')],
     ]
@@ -1,10 +1,192 @@
+"""Process-wide logging setup.
+
+Records are handed to a bounded queue by a :class:`logging.handlers.QueueHandler`
+on the root logger and written to ``LOG_FILE`` by a :class:`QueueListener`
+thread, so ``logger.info`` inside a handler never touches the disk on the
+event loop.  The file rotates when it reaches ``LOG_MAX_BYTES`` and at every
+``LOG_ROTATE_INTERVAL`` seconds boundary; rotated files are gzipped
+(``bot.log.1.gz`` is the newest) and ``LOG_BACKUPS`` of them are kept.
+
+Every line is a JSON object carrying the update and user ids bound by the log
+context middleware (``LOG_FORMAT=text`` restores the old plain format).
+
+The settings are read from the environment directly rather than through
+``EnvKeys``: ``bot.misc`` itself imports this module.
+"""
+
+from __future__ import annotations
+
+import atexit
+import datetime
+import gzip
+import json
 import logging
+import os
+import queue
+import shutil
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+__all__ = [
+    "LOG_FILE",
+    "JsonFormatter",
+    "bind_log_context",
+    "log_files",
+    "logger",
+    "logging_stats",
+    "stop_logging",
+]
+
+load_dotenv()
+
+LOG_FILE = os.environ.get('LOG_FILE', 'bot.log')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', str(10 * 1024 ** 2)))
+LOG_ROTATE_INTERVAL = float(os.environ.get('LOG_ROTATE_INTERVAL', str(24 * 3600)))
+LOG_BACKUPS = int(os.environ.get('LOG_BACKUPS', '14'))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+_log_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_context", default=None)
+
+# Attributes every LogRecord has; anything else came in through ``extra=``.
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def bind_log_context(**fields: Any) -> None:
+    """Attach ``fields`` to every record logged from the current task (and the work it passes to ``asyncio.to_thread``)."""
+
+    _log_context.set(fields)
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        fields = _log_context.get()
+        if fields:
+            for key, value in fields.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, context and ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _BoundedQueueHandler(QueueHandler):
+    """Drops records instead of blocking the caller when the writer falls behind."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
 
-log_file = 'bot.log'
-file_handler = logging.FileHandler(log_file, encoding='utf-8')
-file_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments here, but keep the traceback apart from the
+        # message so the file formatter can still put it in its own field.
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
-logging.basicConfig(level=logging.INFO, handlers=[file_handler])
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _GzipRotatingFileHandler(RotatingFileHandler):
+    """Size based rotation plus a rollover at every ``interval`` boundary, gzipping old files."""
+
+    def __init__(self, filename: str, max_bytes: int, backups: int, interval: float) -> None:
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        self.interval = interval
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._gzip
+        now = time.time()
+        self.rollover_at = self._next_boundary(now)
+        if interval > 0 and os.path.exists(self.baseFilename):
+            if os.path.getmtime(self.baseFilename) < self.rollover_at - interval:
+                self.rollover_at = now  # written before the current period: rotate on the first record
+
+    def _next_boundary(self, now: float) -> float:
+        if self.interval <= 0:
+            return float("inf")
+        return (now // self.interval + 1) * self.interval
+
+    @staticmethod
+    def _gzip(source: str, dest: str) -> None:
+        with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.rollover_at = self._next_boundary(time.time())
+
+
+def log_files() -> List[str]:
+    """The current log file followed by the rotated ones, newest first, that exist."""
+
+    names = [LOG_FILE] + [f"{LOG_FILE}.{index}.gz" for index in range(1, LOG_BACKUPS + 1)]
+    return [name for name in names if os.path.exists(name)]
+
+
+file_handler = _GzipRotatingFileHandler(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUPS, LOG_ROTATE_INTERVAL)
+if LOG_FORMAT == 'text':
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+else:
+    file_handler.setFormatter(JsonFormatter())
+
+_queue_handler = _BoundedQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+_queue_handler.addFilter(_ContextFilter())
+_listener = QueueListener(_queue_handler.queue, file_handler, respect_handler_level=True)
+_listener.start()
+
+logging.basicConfig(level=LOG_LEVEL, handlers=[_queue_handler])
 logger = logging.getLogger(__name__)
+
+
+def logging_stats() -> Dict[str, int]:
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
+
+
+def stop_logging() -> None:
+    """Write out the queued records and close the file; safe to call twice."""
+
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        file_handler.close()
+
+
+atexit.register(stop_logging)
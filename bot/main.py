@@ -1,21 +1,43 @@
 from aiogram.utils import executor
-from aiogram import Bot, Dispatcher
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram import Dispatcher
 
 from bot.filters import register_all_filters
-from bot.misc import EnvKeys
+from bot.misc import EnvKeys, TgConfig
+from bot.misc.bot import create_bot
 from bot.handlers import register_all_handlers
+from bot.database.methods import count_unfinished_operations
 from bot.database.models import register_models
-from bot.logger_mesh import logger, file_handler
+from bot.logger_mesh import logger, logging_stats
 from bot.middlewares import setup_middlewares
-
-logger.addHandler(file_handler)
+from bot.utils.broadcast import BroadcastEngine
+from bot.utils.loop_watchdog import LoopWatchdog
+from bot.utils.metrics import OPEN_INVOICES, LoopLagMonitor
+from bot.utils.notifications import OwnerDigest
+from bot.utils.outbox import OutboxWorker
+from bot.utils.renderer import Renderer
+from bot.utils.sql_profiler import SQLProfiler
+from bot.utils.state_storage import SessionFlusher, SessionFSMStorage, create_state_backend
+from bot.utils.stock_uploader import StockUploader
+from bot.utils.warmup import warm_up
 
 
 async def __on_start_up(dp: Dispatcher) -> None:
     register_all_filters(dp)
     register_all_handlers(dp)
     register_models()
+    OPEN_INVOICES.set(count_unfinished_operations())
+    backend = create_state_backend()
+    if backend is not None:
+        TgConfig.SESSIONS.attach(backend)
+        SessionFlusher.start(TgConfig.SESSIONS)
+    warm_up()
+    LoopWatchdog.start()
+    LoopLagMonitor.start()
+    await Renderer.start()
+    BroadcastEngine.resume_all(dp.bot)
+    StockUploader.start(dp.bot)
+    OutboxWorker.start(dp.bot)
+    OwnerDigest.start(dp.bot)
 
     try:
         owner_id = int(EnvKeys.OWNER_ID) if EnvKeys.OWNER_ID else None
@@ -31,8 +53,26 @@ async def __on_start_up(dp: Dispatcher) -> None:
         logger.warning("OWNER_ID is not set or invalid; cannot send startup ping.")
 
 
+async def __on_shutdown(dp: Dispatcher) -> None:
+    LoopWatchdog.stop()
+    LoopLagMonitor.stop()
+    await OwnerDigest.flush()
+    SessionFlusher.stop(TgConfig.SESSIONS)
+    await Renderer.shutdown()
+    logger.info("Edit coalescer stats: %s", dp.bot.edits.stats())
+    logger.info("Session store stats: %s", TgConfig.SESSIONS.stats())
+    SQLProfiler.dump()
+    LoopWatchdog.dump()
+    logger.info("Logging stats: %s", logging_stats())
+
+
 def start_bot():
-    bot = Bot(token=EnvKeys.TOKEN, parse_mode='HTML')
-    dp = Dispatcher(bot, storage=MemoryStorage())
+    bot = create_bot()
+    dp = Dispatcher(bot, storage=SessionFSMStorage(TgConfig.SESSIONS))
     setup_middlewares(dp)
-    executor.start_polling(dp, skip_updates=True, on_startup=__on_start_up)
+    if EnvKeys.WEBHOOK_HOST:
+        from bot.webhook_server import start_webhook
+
+        start_webhook(dp, on_startup=__on_start_up, on_shutdown=__on_shutdown)
+        return
+    executor.start_polling(dp, skip_updates=True, on_startup=__on_start_up, on_shutdown=__on_shutdown)
@@ -1,8 +1,14 @@
 from aiogram import Dispatcher
 
 from .antispam import setup_antispam
+from .log_context import setup_log_context
+from .metrics import setup_metrics
+from .session import setup_sessions
 
 
 def setup_middlewares(dp: Dispatcher) -> None:
     """Register all middlewares used by the bot."""
+    setup_log_context(dp)
+    setup_sessions(dp)
     setup_antispam(dp)
+    setup_metrics(dp)
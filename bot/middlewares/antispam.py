@@ -1,108 +1,223 @@
-import asyncio
+"""Incoming update rate limiting.
+
+Each user gets one GCRA (generic cell rate algorithm) slot per update kind:
+the only state is the theoretical arrival time of the next allowed update,
+so an update is checked in O(1) and excess updates are dropped immediately
+instead of parking a sleeping task per throttled event.  Users who keep
+flooding collect strikes and are blocked for exponentially growing periods.
+
+Per-user state lives in a bounded LRU (:class:`SpamGuard`), so neither idle
+users nor a flood of throw-away accounts can grow memory without limit.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Dict, Optional
 
 from aiogram import types
-from aiogram.dispatcher import DEFAULT_RATE_LIMIT, Dispatcher
-from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher import Dispatcher
+from aiogram.dispatcher.handler import CancelHandler
 from aiogram.dispatcher.middlewares import BaseMiddleware
-from aiogram.utils.exceptions import Throttled
 
 from bot.logger_mesh import logger
+from bot.misc import EnvKeys
 
+__all__ = ["AntiSpamMiddleware", "Decision", "SpamGuard", "setup_antispam"]
 
-class AntiSpamMiddleware(BaseMiddleware):
-    """Simple anti-spam middleware that throttles user actions."""
+
+class Decision(IntEnum):
+    """Outcome of :meth:`SpamGuard.check`."""
+
+    ALLOW = 0
+    WARN = 1        # first dropped update of a burst; tell the user once
+    DROP = 2        # further dropped updates; stay silent
+    BLOCK = 3       # the update that triggered a temporary block
+    BLOCKED = 4     # dropped while blocked
+
+
+class _UserState:
+    __slots__ = ("message_tat", "callback_tat", "strikes", "last_strike", "blocks", "blocked_until", "warned")
+
+    def __init__(self) -> None:
+        self.message_tat = 0.0
+        self.callback_tat = 0.0
+        self.strikes = 0
+        self.last_strike = 0.0
+        self.blocks = 0
+        self.blocked_until = 0.0
+        self.warned = False
+
+
+@dataclass(slots=True)
+class _Limit:
+    interval: float     # seconds between updates at the sustained rate
+    tolerance: float    # how far ahead of schedule a burst may run
+
+
+class SpamGuard:
+    """GCRA limiter with strike escalation over a bounded LRU of users."""
 
     def __init__(
         self,
         message_rate: float = 1.0,
         callback_rate: float = 0.7,
-        warn_after: int = 1,
-        cooldown_multiplier: float = 1.5,
+        burst: int = 3,
+        strikes_to_block: int = 10,
+        strike_window: float = 60.0,
+        block_base: float = 30.0,
+        block_max: float = 3600.0,
+        forgive_after: float = 3600.0,
+        max_users: int = 50_000,
     ) -> None:
+        burst = max(burst, 1)
+        self._limits = {
+            "message": _Limit(message_rate, message_rate * (burst - 1)),
+            "callback": _Limit(callback_rate, callback_rate * (burst - 1)),
+        }
+        self.strikes_to_block = max(strikes_to_block, 1)
+        self.strike_window = strike_window
+        self.block_base = block_base
+        self.block_max = block_max
+        self.forgive_after = forgive_after
+        self.max_users = max_users
+        self._users: "OrderedDict[int, _UserState]" = OrderedDict()
+        self.allowed = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.blocks = 0
+        self.evicted = 0
+
+    def _state(self, user_id: int) -> _UserState:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState()
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    def check(self, user_id: int, kind: str, now: Optional[float] = None) -> Decision:
+        """Record an update of ``kind`` (``message``/``callback``) and return a :class:`Decision`."""
+
+        now = time.monotonic() if now is None else now
+        state = self._state(user_id)
+
+        if now < state.blocked_until:
+            self.blocked += 1
+            return Decision.BLOCKED
+        if state.blocks and now - state.blocked_until > self.forgive_after:
+            state.blocks = 0
+
+        limit = self._limits[kind]
+        attr = "callback_tat" if kind == "callback" else "message_tat"
+        tat = max(getattr(state, attr), now)
+        if tat - now <= limit.tolerance:
+            setattr(state, attr, tat + limit.interval)
+            state.warned = False
+            self.allowed += 1
+            return Decision.ALLOW
+
+        self.dropped += 1
+        if now - state.last_strike > self.strike_window:
+            state.strikes = 0
+        state.strikes += 1
+        state.last_strike = now
+        if state.strikes >= self.strikes_to_block:
+            state.blocked_until = now + min(self.block_base * 2 ** state.blocks, self.block_max)
+            state.blocks += 1
+            state.strikes = 0
+            self.blocks += 1
+            return Decision.BLOCK
+        if not state.warned:
+            state.warned = True
+            return Decision.WARN
+        return Decision.DROP
+
+    def blocked_for(self, user_id: int, now: Optional[float] = None) -> float:
+        state = self._users.get(user_id)
+        if state is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(state.blocked_until - now, 0.0)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._users),
+            "allowed": self.allowed,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+            "blocks": self.blocks,
+            "evicted": self.evicted,
+        }
+
+
+class AntiSpamMiddleware(BaseMiddleware):
+    """Drops messages and callback queries from users who exceed the rate limit."""
+
+    def __init__(self, guard: SpamGuard) -> None:
         super().__init__()
-        self.message_rate = message_rate or DEFAULT_RATE_LIMIT
-        self.callback_rate = callback_rate or DEFAULT_RATE_LIMIT
-        self.warn_after = max(warn_after, 0)
-        self.cooldown_multiplier = max(cooldown_multiplier, 1.0)
-        self._prefix = "antispam"
+        self.guard = guard
 
     async def on_process_message(self, message: types.Message, data: dict) -> None:
-        await self._throttle(target=message, event_type="message")
+        await self._throttle(message, "message")
 
-    async def on_process_callback_query(
-        self, callback_query: types.CallbackQuery, data: dict
-    ) -> None:
-        await self._throttle(target=callback_query, event_type="callback")
+    async def on_process_callback_query(self, callback_query: types.CallbackQuery, data: dict) -> None:
+        await self._throttle(callback_query, "callback")
 
-    async def _throttle(
-        self,
-        target: types.Message | types.CallbackQuery,
-        event_type: str,
-    ) -> None:
-        dp = Dispatcher.get_current()
-        handler = current_handler.get()
-
-        if handler:
-            limit = getattr(
-                handler,
-                "throttling_rate_limit",
-                self.callback_rate if event_type == "callback" else self.message_rate,
-            )
-            key = getattr(
-                handler,
-                "throttling_key",
-                f"{self._prefix}:{event_type}:{handler.__name__}:{target.from_user.id}",
-            )
-        else:
-            limit = self.callback_rate if event_type == "callback" else self.message_rate
-            key = f"{self._prefix}:{event_type}:{target.from_user.id}"
+    async def _throttle(self, target: types.Message | types.CallbackQuery, kind: str) -> None:
+        user = target.from_user
+        if user is None:
+            return
+        decision = self.guard.check(user.id, kind)
+        if decision == Decision.ALLOW:
+            return
+        if decision in (Decision.WARN, Decision.BLOCK):
+            await self._notify(target, decision)
+        elif isinstance(target, types.CallbackQuery):
+            await self._dismiss(target)
+        raise CancelHandler()
 
+    @staticmethod
+    async def _dismiss(callback_query: types.CallbackQuery) -> None:
+        # Stop the client's loading spinner on a silently dropped button press.
         try:
-            await dp.throttle(key, rate=limit)
-        except Throttled as throttled:
-            await self._handle_throttled(target, throttled, event_type)
-            raise CancelHandler()
+            await callback_query.answer()
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.debug("Failed to answer dropped callback from %s: %s", callback_query.from_user.id, exc)
 
-    async def _handle_throttled(
-        self,
-        target: types.Message | types.CallbackQuery,
-        throttled: Throttled,
-        event_type: str,
-    ) -> None:
+    async def _notify(self, target: types.Message | types.CallbackQuery, decision: Decision) -> None:
         user_id = target.from_user.id
-        wait_time = throttled.rate * self.cooldown_multiplier
-        warn_user = throttled.exceeded_count <= self.warn_after + 1
-
-        if isinstance(target, types.CallbackQuery):
-            try:
-                if warn_user:
-                    await target.answer(
-                        "⚠️ You're interacting too quickly. Please slow down.",
-                        show_alert=False,
-                    )
-                else:
-                    await target.answer(
-                        "⏳ Too many requests. Try again in a few seconds.",
-                        show_alert=True,
-                    )
-            except Exception as exc:  # pragma: no cover - defensive logging
-                logger.debug("Failed to answer throttled callback for %s: %s", user_id, exc)
+        if decision == Decision.BLOCK:
+            seconds = self.guard.blocked_for(user_id)
+            logger.warning("Blocking %s for %.0fs after repeated flooding", user_id, seconds)
+            text = f"⏳ Too many requests. Try again in {seconds:.0f}s."
+        elif isinstance(target, types.CallbackQuery):
+            text = "⚠️ You're interacting too quickly. Please slow down."
         else:
-            message: types.Message = target
-            try:
-                if warn_user:
-                    await message.reply(
-                        "⚠️ Slow down! Please wait a moment before sending another command.",
-                    )
-                else:
-                    await message.reply(
-                        f"⏳ You're sending messages too quickly. Try again in {wait_time:.1f}s.",
-                    )
-            except Exception as exc:  # pragma: no cover - defensive logging
-                logger.debug("Failed to notify throttled user %s: %s", user_id, exc)
-
-        await asyncio.sleep(wait_time)
-
-
-def setup_antispam(dp: Dispatcher) -> None:
-    dp.middleware.setup(AntiSpamMiddleware())
+            text = "⚠️ Slow down! Please wait a moment before sending another command."
+        try:
+            if isinstance(target, types.CallbackQuery):
+                await target.answer(text, show_alert=decision == Decision.BLOCK)
+            else:
+                await target.reply(text)
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.debug("Failed to notify throttled user %s: %s", user_id, exc)
+
+
+def setup_antispam(dp: Dispatcher) -> SpamGuard:
+    guard = SpamGuard(
+        message_rate=EnvKeys.ANTISPAM_MESSAGE_RATE,
+        callback_rate=EnvKeys.ANTISPAM_CALLBACK_RATE,
+        burst=EnvKeys.ANTISPAM_BURST,
+        strikes_to_block=EnvKeys.ANTISPAM_STRIKES_TO_BLOCK,
+        max_users=EnvKeys.ANTISPAM_MAX_USERS,
+    )
+    dp["spam_guard"] = guard
+    dp.middleware.setup(AntiSpamMiddleware(guard))
+    return guard
@@ -0,0 +1,24 @@
+"""Binds the update and user ids to every log record written while an update is handled.
+
+aiogram handles each update in its own task, so the binding ends with it and
+needs no cleanup; it is registered first so the other middlewares' records
+carry the ids too.
+"""
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from bot.logger_mesh import bind_log_context
+from bot.middlewares.session import SessionPersistenceMiddleware
+
+__all__ = ["LogContextMiddleware", "setup_log_context"]
+
+
+class LogContextMiddleware(BaseMiddleware):
+    async def on_pre_process_update(self, update: types.Update, data: dict) -> None:
+        bind_log_context(update_id=update.update_id,
+                         user_id=SessionPersistenceMiddleware._user_id(update))
+
+
+def setup_log_context(dp: Dispatcher) -> None:
+    dp.middleware.setup(LogContextMiddleware())
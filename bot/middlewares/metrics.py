@@ -0,0 +1,78 @@
+"""Per-update metrics (handler latency and the SQL each update ran) and the
+collector exporting the sizes of the bot's in-memory state from the event loop."""
+
+from __future__ import annotations
+
+import time
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from bot.misc import TgConfig
+from bot.utils.metrics import (
+    HANDLER_SECONDS,
+    STATE_ENTRIES,
+    UPDATE_DB_QUERIES,
+    UPDATE_DB_SECONDS,
+    UpdateContext,
+    current_update,
+    on_collect,
+    set_current_update,
+)
+from bot.utils.security import SecurityManager
+from bot.utils.sql_profiler import SQLProfiler
+
+__all__ = ["MetricsMiddleware", "setup_metrics"]
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Binds an :class:`UpdateContext` to every update and records it when done.
+
+    The handler label is the name of the registered handler function; callback
+    queries are labelled with the route the callback router picked.  It is
+    registered last, so updates dropped by the anti-spam middleware stay
+    ``unhandled``.
+    """
+
+    async def trigger(self, action, args):
+        if action.startswith("process_") and action != "process_update":
+            context = current_update()
+            handler = current_handler.get(None)
+            if context is not None and handler is not None:
+                context.handler = getattr(handler, "__name__", type(handler).__name__)
+        return await super().trigger(action, args)
+
+    async def on_pre_process_update(self, update: types.Update, data: dict) -> None:
+        set_current_update(UpdateContext())
+
+    async def on_post_process_update(self, update: types.Update, results, data: dict) -> None:
+        context = current_update()
+        if context is None:
+            return
+        handler = context.handler or "unhandled"
+        HANDLER_SECONDS.observe(time.perf_counter() - context.started, handler=handler)
+        UPDATE_DB_QUERIES.observe(context.db_queries, handler=handler)
+        UPDATE_DB_SECONDS.observe(context.db_seconds, handler=handler)
+        SQLProfiler.finish_update(context)
+        set_current_update(None)
+
+
+def setup_metrics(dp: Dispatcher) -> None:
+    dp.middleware.setup(MetricsMiddleware())
+    bot = dp.bot
+    guard = dp.get("spam_guard")
+
+    @on_collect
+    def _state_entries() -> None:
+        sessions = TgConfig.SESSIONS.stats()
+        for key in ("sessions", "session_values", "global_keys"):
+            STATE_ENTRIES.set(sessions[key], store=key)
+        STATE_ENTRIES.set(bot.edits.stats()["tracked_messages"], store="edit_digests")
+        outbound = bot.outbound.stats()
+        STATE_ENTRIES.set(outbound["chat_buckets"], store="outbound_chat_buckets")
+        STATE_ENTRIES.set(outbound["waiting"], store="outbound_waiting")
+        if guard is not None:
+            STATE_ENTRIES.set(guard.stats()["users"], store="spam_guard_users")
+        for name, table in SecurityManager.stats().items():
+            STATE_ENTRIES.set(table["entries"], store=f"security_{name}")
@@ -0,0 +1,57 @@
+from typing import Optional
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from bot.logger_mesh import logger
+from bot.misc import TgConfig
+from bot.misc.session_store import SessionStore
+
+_UPDATE_FIELDS = (
+    "message",
+    "edited_message",
+    "callback_query",
+    "inline_query",
+    "chosen_inline_result",
+    "shipping_query",
+    "pre_checkout_query",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+)
+
+
+class SessionPersistenceMiddleware(BaseMiddleware):
+    """Revalidates the user's session before an update and saves it afterwards."""
+
+    def __init__(self, store: SessionStore) -> None:
+        super().__init__()
+        self.store = store
+
+    @staticmethod
+    def _user_id(update: types.Update) -> Optional[int]:
+        for field in _UPDATE_FIELDS:
+            event = getattr(update, field, None)
+            user = getattr(event, "from_user", None) if event is not None else None
+            if user is not None:
+                return user.id
+        return None
+
+    async def on_pre_process_update(self, update: types.Update, data: dict) -> None:
+        user_id = self._user_id(update)
+        if user_id is not None:
+            self.store.refresh(user_id)
+            self.store.session(user_id)
+
+    async def on_post_process_update(self, update: types.Update, results, data: dict) -> None:
+        user_id = self._user_id(update)
+        if user_id is None:
+            return
+        try:
+            self.store.persist(user_id)
+        except Exception:
+            logger.exception("Failed to persist session of %s", user_id)
+
+
+def setup_sessions(dp: Dispatcher) -> None:
+    dp.middleware.setup(SessionPersistenceMiddleware(TgConfig.SESSIONS))
@@ -0,0 +1,128 @@
+"""Bot factory and the transport hooks shared by polling and webhook modes."""
+
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+
+from aiogram import Bot
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
+from aiogram.dispatcher.webhook import AnswerCallbackQuery
+from aiogram.utils.exceptions import MessageNotModified, RetryAfter
+
+from bot.misc.env import EnvKeys
+from bot.utils.edit_coalescer import EditCoalescer
+from bot.utils.metrics import TELEGRAM_ERRORS, TELEGRAM_SECONDS
+from bot.utils.rate_limiter import OutboundScheduler, current_priority, is_rate_limited
+
+__all__ = ["ShopBot", "InlineCallbackAnswer", "INLINE_CALLBACK_ANSWER", "create_bot"]
+
+
+class InlineCallbackAnswer:
+    """Slot collecting the answer to the callback query of the current webhook update."""
+
+    __slots__ = ("callback_query_id", "response", "closed")
+
+    def __init__(self, callback_query_id: str) -> None:
+        self.callback_query_id = callback_query_id
+        self.response: AnswerCallbackQuery | None = None
+        self.closed = False
+
+
+INLINE_CALLBACK_ANSWER: ContextVar[InlineCallbackAnswer | None] = ContextVar(
+    "inline_callback_answer", default=None
+)
+
+
+class ShopBot(Bot):
+    """Bot used by the shop.
+
+    Chat-bound requests pass through the outbound scheduler, edits that would
+    not change a message are skipped, and in webhook mode callback answers
+    ride on the HTTP response.  Every request that reaches the Bot API is
+    timed for the metrics endpoint.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbound = OutboundScheduler()
+        self.edits = EditCoalescer()
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        if self.edits.should_skip(method, data):
+            return True
+        try:
+            result = await self._send_request(method, data, files, **kwargs)
+        except MessageNotModified:
+            self.edits.record_not_modified(data)
+            raise
+        self.edits.record(method, data, result)
+        return result
+
+    async def _call_api(self, method, data=None, files=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().request(method, data, files, **kwargs)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(method=method, error=type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=method)
+
+    async def _send_request(self, method, data=None, files=None, **kwargs):
+        if not is_rate_limited(method):
+            return await self._call_api(method, data, files, **kwargs)
+
+        chat_id = (data or {}).get('chat_id')
+        try:
+            chat_id = int(chat_id) if chat_id is not None else None
+        except (TypeError, ValueError):
+            chat_id = None  # @channel usernames only count against the global bucket
+
+        priority = current_priority()
+        for attempt in range(self.outbound.max_retries + 1):
+            await self.outbound.acquire(chat_id, priority)
+            try:
+                return await self._call_api(method, data, files, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.outbound.max_retries:
+                    raise
+                self.outbound.pause(e.timeout)
+                _rewind(files)
+
+    async def answer_callback_query(self, callback_query_id, text=None, show_alert=None,
+                                    url=None, cache_time=None):
+        slot = INLINE_CALLBACK_ANSWER.get()
+        if (
+            slot is not None
+            and not slot.closed
+            and slot.response is None
+            and slot.callback_query_id == callback_query_id
+        ):
+            slot.response = AnswerCallbackQuery(
+                callback_query_id, text=text, show_alert=show_alert, url=url, cache_time=cache_time
+            )
+            return True
+        return await super().answer_callback_query(
+            callback_query_id, text=text, show_alert=show_alert, url=url, cache_time=cache_time
+        )
+
+
+def _rewind(files) -> None:
+    """Rewind uploaded streams so a retried request sends them again."""
+    for value in (files or {}).values():
+        stream = getattr(value, 'file', value)
+        if hasattr(stream, 'seek'):
+            try:
+                stream.seek(0)
+            except (OSError, ValueError):
+                pass
+
+
+def create_bot() -> ShopBot:
+    """Return a bot bound to the configured Bot API server."""
+
+    server = TELEGRAM_PRODUCTION
+    if EnvKeys.TELEGRAM_API_SERVER:
+        server = TelegramAPIServer.from_base(EnvKeys.TELEGRAM_API_SERVER)
+    return ShopBot(token=EnvKeys.TOKEN, parse_mode='HTML', server=server)
@@ -1,9 +1,18 @@
 from abc import ABC
 from typing import Final
 
+from bot.misc.env import EnvKeys
+from bot.misc.session_store import SessionStore
+
 
 class TgConfig(ABC):
-    STATE: Final = {}
+    SESSIONS: Final = SessionStore(
+        ttl=EnvKeys.SESSION_TTL,
+        max_sessions=EnvKeys.SESSION_MAX_USERS,
+        max_global_keys=EnvKeys.SESSION_MAX_GLOBAL_KEYS,
+    )
+    # Mapping view of SESSIONS kept for handlers that still use string keys.
+    STATE: Final = SESSIONS.mapping()
     BASKETS: Final = {}
     BLACKJACK_STATS: Final = {}
     CHANNEL_URL: Final = 'https://t.me/+iXbi98gT0v5lOTNk'
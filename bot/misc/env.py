@@ -18,6 +18,47 @@ class EnvKeys(ABC):
     SHK_MERCHANT_ID: Final = os.environ.get('SHK_MERCHANT_ID')
     NOWPAYMENTS_API_KEY: Final = os.environ.get('NOWPAYMENTS_API_KEY', 'PHXJH8R-3F3MRDT-M28PW7S-E0MV698')
 
+    NOWPAYMENTS_API_BASE: Final = os.environ.get('NOWPAYMENTS_API_BASE', 'https://api.nowpayments.io/v1')
     NOWPAYMENTS_IPN_URL: Final = os.environ.get('NOWPAYMENTS_IPN_URL')
     NOWPAYMENTS_IPN_SECRET: Final = os.environ.get('NOWPAYMENTS_IPN_SECRET')
 
+    STORAGE_CHAT_ID: Final = os.environ.get('STORAGE_CHAT_ID')
+
+    TELEGRAM_API_SERVER: Final = os.environ.get('TELEGRAM_API_SERVER')
+
+    WEBHOOK_HOST: Final = os.environ.get('WEBHOOK_HOST')
+    WEBHOOK_PATH: Final = os.environ.get('WEBHOOK_PATH', '/telegram-webhook')
+    WEBHOOK_SECRET: Final = os.environ.get('WEBHOOK_SECRET')
+    WEBAPP_HOST: Final = os.environ.get('WEBAPP_HOST', '0.0.0.0')
+    WEBAPP_PORT: Final = int(os.environ.get('WEBAPP_PORT', '8080'))
+    WEBHOOK_MAX_CONCURRENCY: Final = int(os.environ.get('WEBHOOK_MAX_CONCURRENCY', '40'))
+
+    RENDER_WORKERS: Final = int(os.environ.get('RENDER_WORKERS', '2'))
+    CAPTCHA_POOL_SIZE: Final = int(os.environ.get('CAPTCHA_POOL_SIZE', '32'))
+
+    SESSION_TTL: Final = float(os.environ.get('SESSION_TTL', str(6 * 3600)))
+    SESSION_MAX_USERS: Final = int(os.environ.get('SESSION_MAX_USERS', '20000'))
+    SESSION_MAX_GLOBAL_KEYS: Final = int(os.environ.get('SESSION_MAX_GLOBAL_KEYS', '10000'))
+    STATE_BACKEND: Final = os.environ.get('STATE_BACKEND', 'sqlite')
+    REDIS_URL: Final = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    STATE_SHARED: Final = os.environ.get('STATE_SHARED', '').lower()
+    STATE_FLUSH_INTERVAL: Final = float(os.environ.get('STATE_FLUSH_INTERVAL', '5'))
+
+    OWNER_DIGEST_WINDOW: Final = float(os.environ.get('OWNER_DIGEST_WINDOW', '60'))
+    OWNER_DIGEST_IMMEDIATE_AMOUNT: Final = float(os.environ.get('OWNER_DIGEST_IMMEDIATE_AMOUNT', '50'))
+
+    ANTISPAM_MESSAGE_RATE: Final = float(os.environ.get('ANTISPAM_MESSAGE_RATE', '1.0'))
+    ANTISPAM_CALLBACK_RATE: Final = float(os.environ.get('ANTISPAM_CALLBACK_RATE', '0.7'))
+    ANTISPAM_BURST: Final = int(os.environ.get('ANTISPAM_BURST', '3'))
+    ANTISPAM_STRIKES_TO_BLOCK: Final = int(os.environ.get('ANTISPAM_STRIKES_TO_BLOCK', '10'))
+    ANTISPAM_MAX_USERS: Final = int(os.environ.get('ANTISPAM_MAX_USERS', '50000'))
+
+    METRICS_TOKEN: Final = os.environ.get('METRICS_TOKEN')
+
+    SQL_PROFILE: Final = os.environ.get('SQL_PROFILE', '').lower() in ('1', 'true', 'yes')
+    SQL_PROFILE_N_PLUS_ONE: Final = int(os.environ.get('SQL_PROFILE_N_PLUS_ONE', '5'))
+    SQL_SLOW_QUERY_MS: Final = float(os.environ.get('SQL_SLOW_QUERY_MS', '50'))
+    SQL_PROFILE_REPORT: Final = os.environ.get('SQL_PROFILE_REPORT', 'sql_profile.txt')
+
+    LOOP_STALL_MS: Final = float(os.environ.get('LOOP_STALL_MS', '100'))
+    LOOP_STALL_REPORT: Final = os.environ.get('LOOP_STALL_REPORT', 'loop_stalls.txt')
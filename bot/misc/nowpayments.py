@@ -1,9 +1,8 @@
-import requests
 from typing import Tuple
 
 from .env import EnvKeys
 
-API_BASE = "https://api.nowpayments.io/v1"
+API_BASE = EnvKeys.NOWPAYMENTS_API_BASE.rstrip("/")
 API_KEY = EnvKeys.NOWPAYMENTS_API_KEY
 
 IPN_URL = EnvKeys.NOWPAYMENTS_IPN_URL
@@ -12,6 +11,8 @@ IPN_URL = EnvKeys.NOWPAYMENTS_IPN_URL
 
 def create_payment(amount_eur: float, pay_currency: str) -> Tuple[str, str, float]:
     """Create a payment and return payment_id, pay_address and pay_amount."""
+    import requests
+
     headers = {
         "x-api-key": API_KEY,
         "Content-Type": "application/json",
@@ -33,6 +34,8 @@ def create_payment(amount_eur: float, pay_currency: str) -> Tuple[str, str, floa
 
 def check_payment(payment_id: str) -> str | None:
     """Return payment status string for given payment id."""
+    import requests
+
     headers = {"x-api-key": API_KEY}
     resp = requests.get(f"{API_BASE}/payment/{payment_id}", headers=headers)
     if resp.status_code == 404:
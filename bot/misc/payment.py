@@ -1,9 +1,29 @@
-from yoomoney import Quickpay, Client
+from __future__ import annotations
+
+import asyncio
 import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from bot.database.methods import get_operation_provider
+from bot.logger_mesh import logger
 from bot.misc import EnvKeys
+from bot.misc.nowpayments import check_payment
+
+if TYPE_CHECKING:  # yoomoney pulls in requests; import it on first use
+    from yoomoney import Client
+
+PROVIDER_YOOMONEY = 'yoomoney'
+PROVIDER_NOWPAYMENTS = 'nowpayments'
+
+# Upstream lookups are blocking HTTP calls; keep them off the event loop and bounded.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='payment-check')
 
 
 def quick_pay(message):
+    from yoomoney import Quickpay
+
     bill = Quickpay(
         receiver=EnvKeys.ACCOUNT_NUMBER,
         quickpay_form="shop",
@@ -17,8 +37,113 @@ def quick_pay(message):
     return label, url
 
 
+class YooMoneyAdapter:
+    """Shared YooMoney client answering status checks from a periodic history snapshot.
+
+    ``operation_history`` is fetched at most once per ``history_interval`` and
+    indexed by label, so every pending invoice is answered from the same
+    upstream call.  A label missing from the snapshot triggers an earlier
+    refresh once ``min_refresh_interval`` has passed; if it is still missing,
+    the payment may be older than the last ``history_records`` operations, so
+    the label is looked up on its own, at most once per ``history_interval``.
+    """
+
+    history_interval: float = 15.0
+    min_refresh_interval: float = 3.0
+    history_records: int = 100
+
+    _client: Client | None = None
+    _statuses: dict[str, str] = {}
+    _fetched_at: float = 0.0
+    _refresh_lock: asyncio.Lock | None = None
+    _label_checked: dict[str, float] = {}
+    max_label_checks: int = 10_000
+
+    @classmethod
+    def _get_client(cls) -> Client:
+        if cls._client is None:
+            from yoomoney import Client
+
+            cls._client = Client(EnvKeys.ACCESS_TOKEN)
+        return cls._client
+
+    @classmethod
+    def _fetch_history(cls) -> dict[str, str]:
+        history = cls._get_client().operation_history(records=cls.history_records)
+        statuses = {}
+        # Operations are returned newest first; keep the latest status per label.
+        for operation in history.operations:
+            if operation.label and operation.label not in statuses:
+                statuses[operation.label] = operation.status
+        return statuses
+
+    @classmethod
+    def _fetch_label(cls, label: str) -> str | None:
+        history = cls._get_client().operation_history(label=label)
+        for operation in history.operations:
+            return operation.status
+        return None
+
+    @classmethod
+    def _label_check_due(cls, label: str) -> bool:
+        now = time.monotonic()
+        if now - cls._label_checked.get(label, float('-inf')) < cls.history_interval:
+            return False
+        if len(cls._label_checked) >= cls.max_label_checks:
+            cls._label_checked = {
+                key: at for key, at in cls._label_checked.items() if now - at < cls.history_interval
+            }
+        cls._label_checked[label] = now
+        return True
+
+    @classmethod
+    def _is_fresh(cls, label: str) -> bool:
+        age = time.monotonic() - cls._fetched_at
+        if label in cls._statuses:
+            return age < cls.history_interval
+        return age < cls.min_refresh_interval
+
+    @classmethod
+    async def status(cls, label: str) -> str | None:
+        """Return the YooMoney status for ``label`` or None if it is unknown."""
+
+        if cls._refresh_lock is None:
+            cls._refresh_lock = asyncio.Lock()
+        if not cls._is_fresh(label):
+            async with cls._refresh_lock:
+                # Another waiter may have refreshed the snapshot meanwhile.
+                if not cls._is_fresh(label):
+                    loop = asyncio.get_running_loop()
+                    try:
+                        cls._statuses = await loop.run_in_executor(_executor, cls._fetch_history)
+                    except Exception as e:
+                        logger.error("YooMoney history fetch failed: %s", e)
+                    cls._fetched_at = time.monotonic()
+        status = cls._statuses.get(label)
+        if status is None and cls._label_check_due(label):
+            loop = asyncio.get_running_loop()
+            try:
+                status = await loop.run_in_executor(_executor, cls._fetch_label, label)
+            except Exception as e:
+                logger.error("YooMoney lookup of %s failed: %s", label, e)
+            if status is not None:
+                cls._statuses[label] = status
+        return status
+
+
+def infer_provider(operation_id: str) -> str:
+    """Guess the provider from the invoice id format (YooMoney labels are ``<user>_<random>``)."""
+    return PROVIDER_YOOMONEY if '_' in operation_id else PROVIDER_NOWPAYMENTS
+
+
 async def check_payment_status(label: str):
-    client = Client(EnvKeys.ACCESS_TOKEN)
-    history = client.operation_history(label=label)
-    for operation in history.operations:
-        return operation.status
+    return await YooMoneyAdapter.status(label)
+
+
+async def check_invoice_status(operation_id: str, provider: str | None = None) -> str | None:
+    """Return the upstream status of an invoice from the provider that issued it."""
+    provider = provider or get_operation_provider(operation_id) or infer_provider(operation_id)
+    if provider == PROVIDER_YOOMONEY:
+        return await YooMoneyAdapter.status(operation_id)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, check_payment, operation_id)
@@ -0,0 +1,419 @@
+"""Bounded per-user session store.
+
+Handler state used to live in one process-wide dict keyed by strings such as
+``f'{user_id}_price'`` that was never cleaned up.  :class:`SessionStore` keeps
+one :class:`UserSession` per user instead, ordered by last access, and drops
+sessions that were idle for longer than the TTL or that fall off the end when
+the store is over its caps.  Keys that do not belong to a user
+(``purchase_invoice_<id>``, ``photo_info_<id>``) are kept in a separate
+bounded table with the same TTL.
+
+:class:`StateMapping` exposes the store through the old ``TgConfig.STATE``
+mapping interface so handlers can move to the typed API one at a time.
+
+With a backend attached (see ``bot.utils.state_storage``) the in-memory
+sessions act as a write-through cache: a session is loaded on first use,
+revalidated against the stored version when an update for its user arrives
+and saved once after the update if its content changed.  Revalidation costs
+a backend round trip per update, so it only happens when the backend is
+``shared`` with other processes; otherwise nobody else can have changed the
+stored copy.  Writes through :class:`StateMapping` mark the session dirty, so
+a change made outside its user's update (an admin handler, a background task)
+is saved by :meth:`SessionStore.flush` instead of waiting for that user's
+next update.  Global keys are
+written and deleted in the backend immediately, and a ``pop`` only returns a
+value to the caller that actually removed it, so two processes cannot both
+claim the same invoice.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import pickle
+import re
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional, Protocol, Tuple
+
+from bot.logger_mesh import logger
+
+__all__ = ["SessionStore", "StateBackend", "StateMapping", "UserSession"]
+
+_MISSING = object()
+_USER_KEY_RE = re.compile(r"^(-?\d+)_(.+)$")
+
+
+class StateBackend(Protocol):
+    """Persistent storage used behind :class:`SessionStore`.
+
+    ``shared`` tells whether other processes may write to the same storage.
+    """
+
+    shared: bool
+
+    def load_session(self, user_id: int) -> Optional[Tuple[int, bytes]]: ...
+
+    def session_version(self, user_id: int) -> Optional[int]: ...
+
+    def save_session(self, user_id: int, payload: bytes) -> int: ...
+
+    def load_global(self, key: str) -> Optional[bytes]: ...
+
+    def save_global(self, key: str, payload: bytes) -> None: ...
+
+    def delete_global(self, key: str) -> bool: ...
+
+    def purge(self) -> None: ...
+
+
+class UserSession:
+    """State of a single user: the bare dialog state, named values and FSM data."""
+
+    __slots__ = ("user_id", "state", "values", "fsm", "touched", "version", "digest")
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+        self.state: Any = _MISSING
+        self.values: Dict[str, Any] = {}
+        self.fsm: Dict[int, Dict[str, Any]] = {}
+        self.touched = time.monotonic()
+        self.version: Optional[int] = None
+        self.digest: Optional[bytes] = None
+
+    def dump(self) -> bytes:
+        state = None if self.state is _MISSING else self.state
+        return pickle.dumps((self.state is not _MISSING, state, self.values, self.fsm),
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, user_id: int, version: int, payload: bytes) -> "UserSession":
+        session = cls(user_id)
+        has_state, state, session.values, session.fsm = pickle.loads(payload)
+        session.state = state if has_state else _MISSING
+        session.version = version
+        session.digest = hashlib.blake2b(payload, digest_size=16).digest()
+        return session
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.values.get(name, default)
+
+    def set(self, name: str, value: Any) -> None:
+        self.values[name] = value
+
+    def pop(self, name: str, default: Any = None) -> Any:
+        return self.values.pop(name, default)
+
+    def __len__(self) -> int:
+        return len(self.values) + (self.state is not _MISSING) + len(self.fsm)
+
+
+class SessionStore:
+    """LRU of user sessions with idle TTL and size caps."""
+
+    def __init__(self, ttl: float = 6 * 3600, max_sessions: int = 20_000,
+                 max_global_keys: int = 10_000) -> None:
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_global_keys = max_global_keys
+        self._sessions: "OrderedDict[int, UserSession]" = OrderedDict()
+        self._globals: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._dirty: set[int] = set()
+        self.backend: Optional[StateBackend] = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.loads = 0
+        self.saves = 0
+
+    def attach(self, backend: StateBackend) -> None:
+        """Persist sessions and global keys in ``backend`` from now on."""
+
+        self.backend = backend
+        backend.purge()
+
+    # -- user sessions -------------------------------------------------
+
+    def session(self, user_id: int, create: bool = True) -> Optional[UserSession]:
+        """Return the session of ``user_id`` and mark it as recently used."""
+
+        now = time.monotonic()
+        session = self._sessions.get(user_id)
+        if session is not None and now - session.touched > self.ttl:
+            del self._sessions[user_id]
+            self.expired += 1
+            session = None
+        if session is None:
+            self.misses += 1
+            session = self._load(user_id)
+            if session is None:
+                if not create:
+                    return None
+                session = UserSession(user_id)
+            self._sessions[user_id] = session
+            self._enforce_caps(now)
+        else:
+            self.hits += 1
+            self._sessions.move_to_end(user_id)
+        session.touched = now
+        return session
+
+    def _load(self, user_id: int) -> Optional[UserSession]:
+        if self.backend is None:
+            return None
+        stored = self.backend.load_session(user_id)
+        if stored is None:
+            return None
+        self.loads += 1
+        try:
+            return UserSession.load(user_id, *stored)
+        except Exception:
+            logger.exception("Discarding unreadable stored session of %s", user_id)
+            return None
+
+    def refresh(self, user_id: int) -> None:
+        """Drop the cached session if another process saved a newer version."""
+
+        session = self._sessions.get(user_id)
+        if self.backend is None or session is None or not self.backend.shared:
+            return
+        if self.backend.session_version(user_id) != session.version:
+            del self._sessions[user_id]
+
+    def mark_dirty(self, user_id: int) -> None:
+        """Have the next :meth:`flush` save the session of ``user_id``."""
+
+        if self.backend is not None:
+            self._dirty.add(user_id)
+
+    def persist(self, user_id: int) -> None:
+        """Save the session of ``user_id`` if it changed since it was loaded or saved."""
+
+        self._dirty.discard(user_id)
+        session = self._sessions.get(user_id)
+        if self.backend is None or session is None or (session.version is None and not len(session)):
+            return
+        try:
+            payload = session.dump()
+        except (pickle.PicklingError, TypeError, AttributeError) as exc:
+            logger.warning("Session of %s is not serialisable and stays in memory: %s", user_id, exc)
+            return
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        if digest == session.digest:
+            return
+        try:
+            session.version = self.backend.save_session(user_id, payload)
+        except Exception:
+            self._dirty.add(user_id)
+            raise
+        session.digest = digest
+        self.saves += 1
+
+    def persist_all(self) -> None:
+        for user_id in list(self._sessions):
+            self.persist(user_id)
+
+    def flush(self) -> int:
+        """Save every dirty session; returns how many were written."""
+
+        saves = self.saves
+        for user_id in list(self._dirty):
+            try:
+                self.persist(user_id)
+            except Exception:
+                logger.exception("Failed to persist session of %s", user_id)
+        return self.saves - saves
+
+    def drop(self, user_id: int) -> None:
+        self._dirty.discard(user_id)
+        self._sessions.pop(user_id, None)
+
+    def drop_value(self, name: str) -> int:
+        """Remove ``name`` from every session; returns how many sessions had it."""
+
+        removed = 0
+        for session in self._sessions.values():
+            if session.values.pop(name, _MISSING) is not _MISSING:
+                removed += 1
+        return removed
+
+    # -- keys that do not belong to a user -----------------------------
+
+    def get_global(self, key: str, default: Any = None) -> Any:
+        entry = self._globals.get(key)
+        if entry is None and self.backend is not None:
+            payload = self.backend.load_global(key)
+            if payload is not None:
+                entry = self._globals[key] = (time.monotonic(), pickle.loads(payload))
+        if entry is None:
+            return default
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._globals[key]
+            self.expired += 1
+            return default
+        return entry[1]
+
+    def set_global(self, key: str, value: Any) -> None:
+        now = time.monotonic()
+        if self.backend is not None:
+            self.backend.save_global(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        self._globals[key] = (now, value)
+        self._globals.move_to_end(key)
+        self._enforce_caps(now)
+
+    def pop_global(self, key: str, default: Any = _MISSING) -> Any:
+        if self.backend is not None:
+            value = self.get_global(key, _MISSING)
+            self._globals.pop(key, None)
+            if value is not _MISSING and self.backend.delete_global(key):
+                return value
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        entry = self._globals.pop(key, None)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        return entry[1]
+
+    # -- housekeeping ----------------------------------------------------
+
+    def _enforce_caps(self, now: float) -> None:
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session.touched > self.ttl:
+                self.expired += 1
+            elif len(self._sessions) > self.max_sessions:
+                self.evicted += 1
+                if user_id in self._dirty:
+                    try:
+                        self.persist(user_id)
+                    except Exception:
+                        logger.exception("Failed to persist evicted session of %s", user_id)
+            else:
+                break
+            self._dirty.discard(user_id)
+            del self._sessions[user_id]
+        while self._globals:
+            key, (touched, _) = next(iter(self._globals.items()))
+            if now - touched > self.ttl:
+                self.expired += 1
+            elif len(self._globals) > self.max_global_keys:
+                self.evicted += 1
+            else:
+                break
+            del self._globals[key]
+
+    def sweep(self) -> None:
+        """Drop everything idle for longer than the TTL."""
+
+        self._enforce_caps(time.monotonic())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "session_values": sum(len(session) for session in self._sessions.values()),
+            "global_keys": len(self._globals),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "loads": self.loads,
+            "saves": self.saves,
+            "dirty": len(self._dirty),
+        }
+
+    def mapping(self) -> "StateMapping":
+        return StateMapping(self)
+
+
+class StateMapping(MutableMapping):
+    """``TgConfig.STATE`` compatible view of a :class:`SessionStore`.
+
+    ``STATE[user_id]`` maps to the session's bare state, ``STATE[f'{user_id}_x']``
+    to the session value ``x`` and every other key to the global table.
+    """
+
+    def __init__(self, store: SessionStore) -> None:
+        self.store = store
+
+    @staticmethod
+    def _split(key: Any) -> Tuple[Optional[int], Optional[str]]:
+        if isinstance(key, int):
+            return key, None
+        match = _USER_KEY_RE.match(key) if isinstance(key, str) else None
+        if match:
+            return int(match.group(1)), match.group(2)
+        return None, None
+
+    def __getitem__(self, key: Any) -> Any:
+        user_id, name = self._split(key)
+        if user_id is None:
+            value = self.store.get_global(key, _MISSING)
+        else:
+            session = self.store.session(user_id, create=False)
+            if session is None:
+                raise KeyError(key)
+            value = session.state if name is None else session.values.get(name, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        user_id, name = self._split(key)
+        if user_id is None:
+            self.store.set_global(key, value)
+            return
+        session = self.store.session(user_id)
+        if name is None:
+            session.state = value
+        else:
+            session.values[name] = value
+        self.store.mark_dirty(user_id)
+
+    def __delitem__(self, key: Any) -> None:
+        user_id, name = self._split(key)
+        if user_id is None:
+            self.store.pop_global(key)
+            return
+        session = self.store.session(user_id, create=False)
+        if session is None:
+            raise KeyError(key)
+        if name is None:
+            if session.state is _MISSING:
+                raise KeyError(key)
+            session.state = _MISSING
+        else:
+            del session.values[name]
+        self.store.mark_dirty(user_id)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key: Any, default: Any = _MISSING) -> Any:
+        if self._split(key)[0] is None:
+            return self.store.pop_global(key, default)
+        try:
+            value = self[key]
+        except KeyError:
+            if default is _MISSING:
+                raise
+            return default
+        del self[key]
+        return value
+
+    def __iter__(self) -> Iterator[Any]:
+        for user_id, session in list(self.store._sessions.items()):
+            if session.state is not _MISSING:
+                yield user_id
+            for name in list(session.values):
+                yield f"{user_id}_{name}"
+        yield from list(self.store._globals)
+
+    def __len__(self) -> int:
+        return sum(len(session) for session in self.store._sessions.values()) + len(self.store._globals)
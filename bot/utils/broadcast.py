@@ -0,0 +1,190 @@
+"""Resumable broadcast jobs.
+
+A broadcast is stored in ``broadcast_jobs`` together with the id of the last
+recipient whose batch completed.  Recipients are streamed from the users table
+in keyset batches and copied concurrently through the broadcast lane of the
+outbound scheduler, which paces them near Telegram's limits and handles
+``RetryAfter``.  Users who blocked the bot are flagged so later broadcasts skip
+them.  Unfinished jobs are resumed from their checkpoint on startup; a job
+stopped by an unexpected error is marked ``failed`` and left alone.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict
+
+from aiogram import Bot
+from aiogram.utils.exceptions import (
+    BotBlocked,
+    BotKicked,
+    CantInitiateConversation,
+    ChatNotFound,
+    TelegramAPIError,
+    UserDeactivated,
+)
+
+from bot.database.methods import (
+    count_broadcast_recipients,
+    create_broadcast_job,
+    fail_broadcast_job,
+    finish_broadcast_job,
+    get_broadcast_job,
+    get_unfinished_broadcast_jobs,
+    select_broadcast_recipients,
+    set_users_bot_blocked,
+    update_broadcast_progress,
+)
+from bot.keyboards import back, close
+from bot.logger_mesh import logger
+from bot.utils.rate_limiter import Priority, set_outbound_priority
+
+__all__ = ["BroadcastEngine"]
+
+_UNREACHABLE = (BotBlocked, BotKicked, CantInitiateConversation, ChatNotFound, UserDeactivated)
+
+
+def _format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m {seconds}s" if minutes else f"{seconds}s"
+
+
+class BroadcastEngine:
+    """Runs broadcast jobs as background tasks."""
+
+    batch_size: int = 500
+    concurrency: int = 25
+    progress_interval: float = 5.0
+
+    _tasks: Dict[int, asyncio.Task] = {}
+
+    @classmethod
+    def start(cls, bot: Bot, sender_id: int, source_chat_id: int, source_message_id: int,
+              progress_message_id: int | None = None) -> int:
+        """Create a job for the given source message and start sending it."""
+
+        job_id = create_broadcast_job(
+            sender_id, source_chat_id, source_message_id,
+            total=count_broadcast_recipients(),
+            progress_message_id=progress_message_id,
+        )
+        cls._spawn(bot, job_id)
+        return job_id
+
+    @classmethod
+    def resume_all(cls, bot: Bot) -> None:
+        for job_id in get_unfinished_broadcast_jobs():
+            logger.info("Resuming broadcast job %s", job_id)
+            cls._spawn(bot, job_id)
+
+    @classmethod
+    def _spawn(cls, bot: Bot, job_id: int) -> None:
+        task = cls._tasks.get(job_id)
+        if task is not None and not task.done():
+            return
+        cls._tasks[job_id] = asyncio.create_task(cls._run(bot, job_id))
+
+    @staticmethod
+    async def _send(bot: Bot, job: dict, target_id: int) -> str:
+        try:
+            await bot.copy_message(
+                chat_id=target_id,
+                from_chat_id=job['source_chat_id'],
+                message_id=job['source_message_id'],
+                reply_markup=close(),
+            )
+            return 'sent'
+        except _UNREACHABLE:
+            return 'blocked'
+        except TelegramAPIError as exc:
+            logger.warning("Failed to deliver broadcast to %s: %s", target_id, exc)
+            return 'failed'
+        except Exception as exc:  # network errors and timeouts must not stop the whole job
+            logger.warning("Failed to deliver broadcast to %s: %r", target_id, exc)
+            return 'failed'
+
+    @classmethod
+    async def _report(cls, bot: Bot, job: dict, counters: dict, started: float, done_at_start: int,
+                      finished: bool = False) -> None:
+        if not job['progress_message_id']:
+            return
+        processed = counters['sent'] + counters['failed'] + counters['blocked']
+        if finished:
+            text = 'Broadcast finished'
+        else:
+            rate = (processed - done_at_start) / max(time.monotonic() - started, 1e-6)
+            remaining = max(job['total'] - processed, 0)
+            eta = _format_eta(remaining / rate) if rate > 0 else '—'
+            text = f'📣 Broadcast in progress: {processed}/{job["total"]}\n⏳ ETA: {eta}'
+        text += (f'\n✅ Sent: {counters["sent"]}'
+                 f'\n🚫 Blocked: {counters["blocked"]}'
+                 f'\n⚠️ Failed: {counters["failed"]}')
+        try:
+            await bot.edit_message_text(
+                chat_id=job['sender_id'],
+                message_id=job['progress_message_id'],
+                text=text,
+                reply_markup=back("console") if finished else None,
+            )
+        except Exception as exc:
+            logger.debug("Broadcast progress update failed: %r", exc)
+
+    @classmethod
+    async def _run(cls, bot: Bot, job_id: int) -> None:
+        job = get_broadcast_job(job_id)
+        if not job or job['status'] != 'running':
+            return
+        set_outbound_priority(Priority.BROADCAST)
+        semaphore = asyncio.Semaphore(cls.concurrency)
+        counters = {key: job[key] for key in ('sent', 'failed', 'blocked')}
+        done_at_start = sum(counters.values())
+        started = last_report = time.monotonic()
+        last_user_id = job['last_user_id']
+
+        async def deliver(target_id: int) -> str:
+            async with semaphore:
+                return await cls._send(bot, job, target_id)
+
+        try:
+            while True:
+                batch = select_broadcast_recipients(last_user_id, cls.batch_size)
+                if not batch:
+                    break
+                results = await asyncio.gather(*(deliver(target_id) for target_id in batch))
+                newly_blocked = [target_id for target_id, result in zip(batch, results) if result == 'blocked']
+                set_users_bot_blocked(newly_blocked)
+                for result in results:
+                    counters[result] += 1
+                last_user_id = batch[-1]
+                update_broadcast_progress(job_id, last_user_id, **counters)
+                if time.monotonic() - last_report >= cls.progress_interval:
+                    last_report = time.monotonic()
+                    await cls._report(bot, job, counters, started, done_at_start)
+            finish_broadcast_job(job_id)
+        except asyncio.CancelledError:
+            logger.info("Broadcast job %s interrupted at user %s", job_id, last_user_id)
+            raise
+        except Exception:
+            logger.exception("Broadcast job %s failed at user %s", job_id, last_user_id)
+            try:
+                fail_broadcast_job(job_id)
+            except Exception:
+                logger.exception("Could not mark broadcast job %s as failed", job_id)
+            return
+        finally:
+            cls._tasks.pop(job_id, None)
+
+        set_outbound_priority(Priority.DEFAULT)
+        await cls._report(bot, job, counters, started, done_at_start, finished=True)
+        try:
+            await bot.delete_message(chat_id=job['source_chat_id'], message_id=job['source_message_id'])
+        except Exception as exc:
+            logger.debug("Could not delete broadcast source message: %r", exc)
+        logger.info(
+            "Broadcast job %s by %s finished: %s sent, %s blocked, %s failed",
+            job_id, job['sender_id'], counters['sent'], counters['blocked'], counters['failed'],
+        )
@@ -0,0 +1,178 @@
+"""Dispatch callback queries by their ``callback_data`` prefix.
+
+aiogram evaluates callback filters one after another, so with every handler
+registered through a ``lambda c: c.data.startswith(...)`` filter the cost of a
+button press grows with the number of handlers.  :class:`CallbackRouter` is
+registered as the only callback handler instead.  Exact actions are looked up
+in a dict and prefixes in a character trie; the longest matching prefix wins,
+which also removes the need for ``and not c.data.startswith(...)`` filters.
+The matched action and the rest of the data are available to the handler
+through :func:`current_route`.
+
+Routes may carry a ``guard`` for the few handlers that also depend on the
+user's dialog state.  :meth:`CallbackRouter.check` reports routes that can
+never be reached and prefixes that used to shadow longer ones.
+"""
+
+from __future__ import annotations
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from aiogram import Dispatcher
+from aiogram.types import CallbackQuery
+
+from bot.logger_mesh import logger
+from bot.utils.metrics import current_update
+
+__all__ = ["CallbackRoute", "CallbackRouter", "callback_router", "current_route"]
+
+Handler = Callable[[CallbackQuery], Awaitable[Any]]
+Guard = Callable[[CallbackQuery], bool]
+
+
+class CallbackRoute(NamedTuple):
+    """``callback_data`` split into the registered action and its arguments."""
+
+    action: str
+    args: str
+
+
+_CURRENT_ROUTE: ContextVar[Optional[CallbackRoute]] = ContextVar("callback_route", default=None)
+
+
+def current_route() -> Optional[CallbackRoute]:
+    return _CURRENT_ROUTE.get()
+
+
+@dataclass(slots=True)
+class _Route:
+    action: str
+    handler: Handler
+    guard: Optional[Guard]
+    exact: bool
+    order: int
+
+    def accepts(self, query: CallbackQuery) -> bool:
+        return self.guard is None or self.guard(query)
+
+    def describe(self) -> str:
+        kind = "==" if self.exact else "startswith"
+        return f"{self.handler.__name__} ({kind} {self.action!r})"
+
+
+class _TrieNode:
+    __slots__ = ("children", "routes")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _TrieNode] = {}
+        self.routes: List[_Route] = []
+
+
+class CallbackRouter:
+    """Exact-match dict plus longest-prefix trie of callback handlers."""
+
+    def __init__(self) -> None:
+        self._exact: Dict[str, List[_Route]] = {}
+        self._root = _TrieNode()
+        self._routes: List[_Route] = []
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def exact(self, action: str, handler: Handler, guard: Optional[Guard] = None) -> None:
+        route = _Route(action, handler, guard, True, len(self._routes))
+        self._routes.append(route)
+        self._exact.setdefault(action, []).append(route)
+
+    def prefix(self, prefix: str, handler: Handler, guard: Optional[Guard] = None) -> None:
+        route = _Route(prefix, handler, guard, False, len(self._routes))
+        self._routes.append(route)
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.routes.append(route)
+
+    def resolve(self, data: str, query: Optional[CallbackQuery] = None) -> Optional[Tuple[_Route, CallbackRoute]]:
+        """Return the route for ``data``; guards are evaluated against ``query``."""
+
+        for route in self._exact.get(data, ()):
+            if query is None or route.accepts(query):
+                return route, CallbackRoute(data, "")
+
+        matches: List[Tuple[int, List[_Route]]] = []
+        node = self._root
+        for depth, char in enumerate(data, 1):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.routes:
+                matches.append((depth, node.routes))
+        for depth, routes in reversed(matches):
+            for route in routes:
+                if query is None or route.accepts(query):
+                    return route, CallbackRoute(data[:depth], data[depth:])
+        return None
+
+    async def dispatch(self, query: CallbackQuery) -> Any:
+        resolved = self.resolve(query.data or "", query)
+        if resolved is None:
+            logger.debug("No callback handler for %r", query.data)
+            return None
+        route, parsed = resolved
+        context = current_update()
+        if context is not None:
+            context.handler = route.handler.__name__
+        token = _CURRENT_ROUTE.set(parsed)
+        try:
+            return await route.handler(query)
+        finally:
+            _CURRENT_ROUTE.reset(token)
+
+    def conflicts(self) -> Tuple[List[str], List[str]]:
+        """Return (errors, warnings) about the registered routes.
+
+        Errors are routes that can never run because an unguarded route with
+        the same action was registered first.  Warnings are routes that a
+        shorter prefix registered earlier used to capture in the old
+        first-match filter chain; the router now sends them to the longer one.
+        """
+
+        errors: List[str] = []
+        warnings: List[str] = []
+        seen: Dict[Tuple[bool, str], _Route] = {}
+        for route in self._routes:
+            first = seen.get((route.exact, route.action))
+            if first is not None and first.guard is None:
+                errors.append(f"{route.describe()} is unreachable: {first.describe()} handles the same data")
+            elif first is None:
+                seen[(route.exact, route.action)] = route
+        prefixes = [route for route in self._routes if not route.exact]
+        for route in self._routes:
+            for shorter in prefixes:
+                if (shorter.order < route.order and shorter.action != route.action
+                        and route.action.startswith(shorter.action)):
+                    warnings.append(f"{route.describe()} was shadowed by {shorter.describe()}")
+                    break
+        return errors, warnings
+
+    def check(self) -> None:
+        """Validate the routes at startup; raise on unreachable handlers."""
+
+        errors, warnings = self.conflicts()
+        for warning in warnings:
+            logger.warning("Callback route %s; it now wins as the longer match", warning)
+        if errors:
+            raise ValueError("Conflicting callback routes:\n" + "\n".join(errors))
+        logger.info("Callback router: %s routes, %s exact actions", len(self._routes), len(self._exact))
+
+
+def callback_router(dp: Dispatcher) -> CallbackRouter:
+    """Return the dispatcher's router, registering it as the callback handler on first use."""
+
+    router = dp.get("callback_router")
+    if router is None:
+        router = dp["callback_router"] = CallbackRouter()
+        dp.register_callback_query_handler(router.dispatch, state="*")
+    return router
@@ -0,0 +1,105 @@
+"""Skip ``editMessageText`` calls that would not change the message.
+
+The coalescer remembers a digest of the text and markup last rendered into each
+(chat, message).  It is fed by successful ``sendMessage``/``editMessageText``
+calls and cleared by caption, markup or media edits and deletions.  An edit
+whose digest matches is answered locally instead of costing an API call that
+would end in ``MessageNotModified``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+__all__ = ["EditCoalescer"]
+
+_RENDERED_FIELDS = ("text", "parse_mode", "entities", "disable_web_page_preview", "reply_markup")
+_INVALIDATING_METHODS = frozenset({
+    "editMessageCaption",
+    "editMessageReplyMarkup",
+    "editMessageMedia",
+    "deleteMessage",
+})
+
+Key = Tuple[str, str]
+
+
+class EditCoalescer:
+    """Bounded LRU of rendered message digests with hit counters."""
+
+    def __init__(self, max_entries: int = 50_000) -> None:
+        self.max_entries = max_entries
+        self._digests: "OrderedDict[Key, bytes]" = OrderedDict()
+        self.skipped = 0
+        self.forwarded = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def _key(data: Dict[str, Any], message_id: Any = None) -> Optional[Key]:
+        inline_id = data.get("inline_message_id")
+        if inline_id:
+            return ("inline", str(inline_id))
+        message_id = message_id if message_id is not None else data.get("message_id")
+        chat_id = data.get("chat_id")
+        if chat_id is None or message_id is None:
+            return None
+        return (str(chat_id), str(message_id))
+
+    @staticmethod
+    def _digest(data: Dict[str, Any]) -> bytes:
+        rendered = [str(data.get(field) or "") for field in _RENDERED_FIELDS]
+        return hashlib.blake2b(json.dumps(rendered).encode(), digest_size=16).digest()
+
+    def _store(self, key: Key, digest: bytes) -> None:
+        self._digests[key] = digest
+        self._digests.move_to_end(key)
+        while len(self._digests) > self.max_entries:
+            self._digests.popitem(last=False)
+
+    def should_skip(self, method: str, data: Optional[Dict[str, Any]]) -> bool:
+        """Return True if the call is a no-op edit; invalidates entries for other edits."""
+
+        data = data or {}
+        if method in _INVALIDATING_METHODS:
+            key = self._key(data)
+            if key is not None:
+                self._digests.pop(key, None)
+            return False
+        if method != "editMessageText":
+            return False
+        key = self._key(data)
+        if key is not None and self._digests.get(key) == self._digest(data):
+            self._digests.move_to_end(key)
+            self.skipped += 1
+            return True
+        self.forwarded += 1
+        return False
+
+    def record(self, method: str, data: Optional[Dict[str, Any]], result: Any) -> None:
+        """Remember what a successful send or edit rendered."""
+
+        if method not in ("sendMessage", "editMessageText") or not data:
+            return
+        message_id = result.get("message_id") if isinstance(result, dict) else None
+        key = self._key(data, message_id)
+        if key is not None:
+            self._store(key, self._digest(data))
+
+    def record_not_modified(self, data: Optional[Dict[str, Any]]) -> None:
+        """Telegram confirmed the content is already shown; remember it."""
+
+        self.not_modified += 1
+        key = self._key(data or {})
+        if key is not None:
+            self._store(key, self._digest(data))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "edits_skipped": self.skipped,
+            "edits_forwarded": self.forwarded,
+            "edits_not_modified": self.not_modified,
+            "tracked_messages": len(self._digests),
+        }
@@ -0,0 +1,140 @@
+"""Size-capped mapping whose entries expire.
+
+:class:`ExpiringDict` keeps entries in LRU order for the hard size cap and
+their expiry times in a min-heap, so :meth:`ExpiringDict.cleanup` only looks
+at entries that actually expired (O(k log n)) instead of scanning the whole
+table.  Re-setting a key leaves its old heap entry behind; stale entries are
+skipped when popped and the heap is rebuilt once they outnumber live ones.
+
+The mapping is guarded by a lock because the IPN server calls into it from
+Flask worker threads.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+__all__ = ["ExpiringDict"]
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class ExpiringDict(Generic[K, V]):
+    """LRU mapping with per-entry expiry and a hard ``maxsize``."""
+
+    def __init__(self, ttl: float, maxsize: int, clock: Callable[[], float] = time.time) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self._heap: List[Tuple[float, int, K]] = []
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def _drop_expired(self, key: K, now: float) -> bool:
+        entry = self._data.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._data[key]
+            self.expired += 1
+            return True
+        return False
+
+    def get(self, key: K, default: Any = None) -> Any:
+        with self._lock:
+            if self._drop_expired(key, self._clock()):
+                return default
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def expires_at(self, key: K) -> Optional[float]:
+        with self._lock:
+            if self._drop_expired(key, self._clock()):
+                return None
+            entry = self._data.get(key)
+            return entry[0] if entry else None
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """Store ``value`` for ``ttl`` seconds (the default TTL if omitted)."""
+
+        with self._lock:
+            expiry = self._clock() + (self.ttl if ttl is None else ttl)
+            self._data[key] = (expiry, value)
+            self._data.move_to_end(key)
+            heapq.heappush(self._heap, (expiry, next(self._counter), key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evicted += 1
+            if len(self._heap) > 2 * len(self._data) + 64:
+                self._rebuild_heap()
+
+    def setdefault(self, key: K, factory: Callable[[], V], ttl: Optional[float] = None) -> V:
+        """Return the live value for ``key``, storing ``factory()`` if there is none."""
+
+        with self._lock:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = factory()
+                self.set(key, value, ttl)
+            return value
+
+    def touch(self, key: K, ttl: Optional[float] = None) -> None:
+        """Extend the lifetime of an existing entry."""
+
+        with self._lock:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                self.set(key, value, ttl)
+
+    def pop(self, key: K, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None or entry[0] <= self._clock():
+                return default
+            return entry[1]
+
+    def cleanup(self) -> int:
+        """Drop every expired entry; returns how many were removed."""
+
+        removed = 0
+        with self._lock:
+            now = self._clock()
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                expiry, _, key = heapq.heappop(heap)
+                entry = self._data.get(key)
+                if entry is not None and entry[0] == expiry:
+                    del self._data[key]
+                    removed += 1
+            self.expired += removed
+        return removed
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(expiry, next(self._counter), key) for key, (expiry, _) in self._data.items()]
+        heapq.heapify(self._heap)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "heap": len(self._heap),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
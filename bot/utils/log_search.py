@@ -0,0 +1,84 @@
+"""Tail and grep the bot's log files for the admin ``/logs`` command.
+
+The current file is read backwards in blocks, so a tail costs the size of the
+excerpt rather than the size of the file; rotated ``.gz`` files are only
+opened when the current one does not hold enough lines or matches.  Both
+functions block and are meant to run in a worker thread.
+"""
+
+from __future__ import annotations
+
+import gzip
+import os
+import re
+from collections import deque
+from typing import Deque, Iterator, List, Optional
+
+from bot.logger_mesh import log_files
+
+__all__ = ["compress_lines", "recent_lines"]
+
+_BLOCK = 64 * 1024
+
+
+def _reversed_lines(path: str) -> Iterator[str]:
+    """Lines of a plain text file from the last to the first."""
+
+    with open(path, 'rb') as fh:
+        position = fh.seek(0, os.SEEK_END)
+        rest = b''
+        while position > 0:
+            size = min(_BLOCK, position)
+            position -= size
+            fh.seek(position)
+            chunk = fh.read(size) + rest
+            lines = chunk.split(b'\n')
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode('utf-8', errors='replace')
+        if rest:
+            yield rest.decode('utf-8', errors='replace')
+
+
+def _gzip_lines_reversed(path: str, limit: int, pattern: Optional[re.Pattern]) -> List[str]:
+    """The last ``limit`` (matching) lines of a gzipped file, newest first."""
+
+    kept: Deque[str] = deque(maxlen=limit)
+    with gzip.open(path, 'rt', encoding='utf-8', errors='replace') as fh:
+        for line in fh:
+            line = line.rstrip('\n')
+            if line and (pattern is None or pattern.search(line)):
+                kept.append(line)
+    return list(reversed(kept))
+
+
+def recent_lines(limit: int, pattern: Optional[str] = None) -> List[str]:
+    """Up to ``limit`` most recent log lines, oldest first, optionally only those matching ``pattern``.
+
+    ``pattern`` is a case-insensitive regular expression; when it does not
+    compile it is searched for literally.
+    """
+
+    try:
+        regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+    except re.error:
+        regex = re.compile(re.escape(pattern), re.IGNORECASE)
+    found: List[str] = []
+    for path in log_files():
+        if path.endswith('.gz'):
+            found.extend(_gzip_lines_reversed(path, limit - len(found), regex))
+        else:
+            for line in _reversed_lines(path):
+                if regex is None or regex.search(line):
+                    found.append(line)
+                    if len(found) >= limit:
+                        break
+        if len(found) >= limit:
+            break
+    found.reverse()
+    return found
+
+
+def compress_lines(lines: List[str]) -> bytes:
+    return gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'))
@@ -0,0 +1,217 @@
+"""Event loop stall detector.
+
+The event loop lag probe (:class:`~bot.utils.metrics.LoopLagMonitor`)
+records when it expects to wake up next; while the watchdog runs, the probe
+wakes up at least every ``probe_interval`` seconds.  A sampling thread checks
+that deadline every ``sample_interval`` seconds; once the loop is more than
+``LOOP_STALL_MS`` late it is stuck in synchronous code, and the thread grabs
+the loop thread's stack with ``sys._current_frames()`` on every check until
+the probe runs again.
+
+Each sample is attributed to
+
+* the handler: the outermost frame under ``bot/handlers`` (else the outermost
+  ``bot`` frame, e.g. a background worker),
+* the site: the innermost ``bot`` frame, the code that made the blocking call,
+* the call: the frame right below the site, e.g. ``shutil.move`` or
+  ``requests.api.post``, or the source line of the site when the call went
+  straight into C code.
+
+A stall is charged to the site sampled most often during it.
+:meth:`LoopWatchdog.report` ranks the sites by total blocked time; it is
+served on ``/debug/loop-stalls`` and logged and written to
+``LOOP_STALL_REPORT`` on shutdown.  Stalls are also counted per handler in
+``bot_event_loop_stalls_total`` and ``bot_event_loop_stall_seconds_total``.
+"""
+
+from __future__ import annotations
+
+import linecache
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from bot.logger_mesh import logger
+from bot.misc import EnvKeys
+from bot.utils.metrics import Counter, LoopLagMonitor
+
+__all__ = ["LOOP_STALLS", "LOOP_STALL_SECONDS", "LoopWatchdog"]
+
+LOOP_STALLS = Counter("bot_event_loop_stalls_total", "Event loop stalls above the threshold.", ["handler"])
+LOOP_STALL_SECONDS = Counter(
+    "bot_event_loop_stall_seconds_total", "Seconds the event loop was blocked in stalls.", ["handler"]
+)
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_BOT_DIR = os.path.join(_ROOT, "bot") + os.sep
+_HANDLERS_DIR = os.path.join(_ROOT, "bot", "handlers") + os.sep
+_STACK_DEPTH = 12
+
+# (handler, site, call)
+_Key = Tuple[str, str, str]
+
+
+@dataclass(slots=True)
+class _SiteStats:
+    stalls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    samples: int = 0
+    stack: List[str] = field(default_factory=list)
+
+
+def _relative(path: str) -> str:
+    return os.path.relpath(path, _ROOT) if path.startswith(_BOT_DIR) else path
+
+
+def _attribute(frame) -> Tuple[_Key, List[str]]:
+    """Handler, site and call of a stack given its innermost frame, plus a short formatted stack."""
+
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()  # outermost first
+
+    ours = [index for index, f in enumerate(frames) if f.f_code.co_filename.startswith(_BOT_DIR)]
+    handler = next((f.f_code.co_qualname for f in frames if f.f_code.co_filename.startswith(_HANDLERS_DIR)), None)
+    if handler is None:
+        handler = frames[ours[0]].f_code.co_qualname if ours else "<loop>"
+    site = call = ""
+    if ours:
+        inner = frames[ours[-1]]
+        site = f"{_relative(inner.f_code.co_filename)}:{inner.f_lineno} {inner.f_code.co_qualname}"
+        if ours[-1] + 1 < len(frames):
+            callee = frames[ours[-1] + 1]
+            call = f"{callee.f_globals.get('__name__', '?')}.{callee.f_code.co_qualname}"
+        else:  # blocked in C code (sqlite, time.sleep, socket I/O): show the calling line instead
+            call = linecache.getline(inner.f_code.co_filename, inner.f_lineno).strip()
+    else:
+        leaf = frames[-1]
+        site = f"{leaf.f_globals.get('__name__', '?')}.{leaf.f_code.co_qualname}"
+    stack = [
+        f"{_relative(f.f_code.co_filename)}:{f.f_lineno} {f.f_code.co_qualname}"
+        for f in frames[-_STACK_DEPTH:]
+    ]
+    return (handler, site, call), stack
+
+
+class LoopWatchdog:
+    """Detects event loop stalls and samples the stack that causes them."""
+
+    threshold: float = EnvKeys.LOOP_STALL_MS / 1000
+    probe_interval: float = 0.05
+    sample_interval: float = 0.02
+    report_path: str = EnvKeys.LOOP_STALL_REPORT
+    top_sites: int = 20
+
+    _thread: Optional[threading.Thread] = None
+    _stopped = threading.Event()
+    _loop_thread_id: Optional[int] = None
+    _sites: Dict[_Key, _SiteStats] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls) -> None:
+        """Start watching the running loop; a no-op when ``LOOP_STALL_MS`` is 0.
+
+        Also starts the lag probe, at ``probe_interval`` if it runs slower.
+        """
+
+        if cls.threshold <= 0 or (cls._thread is not None and cls._thread.is_alive()):
+            return
+        LoopLagMonitor.interval = min(LoopLagMonitor.interval, cls.probe_interval)
+        LoopLagMonitor.start()
+        cls._loop_thread_id = threading.get_ident()
+        cls._stopped.clear()
+        cls._thread = threading.Thread(target=cls._sample, name="loop-watchdog", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        cls._stopped.set()
+        if cls._thread is not None:
+            cls._thread.join(timeout=1)
+            cls._thread = None
+
+    @classmethod
+    def _sample(cls) -> None:
+        # loop.time() is time.monotonic(), so the probe's deadline can be compared from this thread.
+        samples: _Tally = _Tally()
+        stacks: Dict[_Key, List[str]] = {}
+        lag = 0.0
+        while not cls._stopped.wait(cls.sample_interval):
+            current = time.monotonic() - LoopLagMonitor.deadline
+            if current > cls.threshold:
+                frame = sys._current_frames().get(cls._loop_thread_id)
+                if frame is None:
+                    continue
+                key, stack = _attribute(frame)
+                del frame
+                samples[key] += 1
+                stacks.setdefault(key, stack)
+                lag = max(lag, current)
+            elif samples:
+                cls._record(samples, stacks, lag)
+                samples, stacks, lag = _Tally(), {}, 0.0
+
+    @classmethod
+    def _record(cls, samples: _Tally, stacks: Dict[_Key, List[str]], seconds: float) -> None:
+        key = samples.most_common(1)[0][0]
+        handler, site, call = key
+        with cls._lock:
+            stats = cls._sites.get(key)
+            if stats is None:
+                stats = cls._sites[key] = _SiteStats(stack=stacks[key])
+            stats.stalls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.samples += sum(samples.values())
+        LOOP_STALLS.inc(handler=handler)
+        LOOP_STALL_SECONDS.inc(seconds, handler=handler)
+        logger.warning(
+            "Event loop blocked for %.0fms in %s at %s%s", seconds * 1000, handler, site, f" -> {call}" if call else ""
+        )
+
+    @classmethod
+    def report(cls) -> str:
+        """Stall sites ranked by total blocked time, each with the stack of its first sample."""
+
+        with cls._lock:
+            sites = sorted(cls._sites.items(), key=lambda item: item[1].seconds, reverse=True)
+        total = sum(stats.seconds for _, stats in sites)
+        lines = [
+            f"Event loop stalls: {sum(stats.stalls for _, stats in sites)} stalls, {total:.2f}s blocked "
+            f"(threshold {cls.threshold * 1000:.0f}ms)"
+        ]
+        for (handler, site, call), stats in sites[:cls.top_sites]:
+            lines.append(
+                f"{stats.seconds:>8.2f}s {stats.stalls:>5} stalls  max {stats.max_seconds * 1000:>6.0f}ms  "
+                f"{handler}: {site}{f' -> {call}' if call else ''}"
+            )
+            lines.extend(f"        {entry}" for entry in stats.stack)
+        return "\n".join(lines)
+
+    @classmethod
+    def dump(cls, path: Optional[str] = None) -> None:
+        """Log the report and write it to ``path`` (``LOOP_STALL_REPORT`` by default)."""
+
+        if not cls._sites:
+            return
+        report = cls.report()
+        logger.info("%s", report)
+        path = path or cls.report_path
+        try:
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(report + "\n")
+        except OSError as exc:
+            logger.error("Failed to write loop stall report to %s: %s", path, exc)
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._sites.clear()
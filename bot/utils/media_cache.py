@@ -0,0 +1,153 @@
+"""Reuse Telegram ``file_id`` values for files sent from disk.
+
+The first send of a file uploads its bytes; the ``file_id`` Telegram returns is
+stored in the ``media_cache`` table keyed by path, modification time and size,
+so every later send of the same file only transmits the id.  Editing or
+replacing the file changes the key and triggers a fresh upload, as does a
+``file_id`` that Telegram refuses.  Recently used ids are also kept in a
+bounded in-memory LRU in front of the indexed table.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import Message
+from aiogram.utils.exceptions import BadRequest, WrongFileIdentifier
+
+from bot.database.methods import (
+    delete_media_file_id,
+    get_media_file_id,
+    move_media_file_id,
+    save_media_file_id,
+)
+from bot.logger_mesh import logger
+
+__all__ = ["MediaCache", "media_kind"]
+
+_SENDERS = {
+    "photo": ("send_photo", "photo"),
+    "video": ("send_video", "video"),
+    "document": ("send_document", "document"),
+}
+
+
+def media_kind(path: str) -> str:
+    """Return the send method family used for ``path`` across the bot."""
+
+    return "video" if str(path).lower().endswith(".mp4") else "photo"
+
+
+def _file_id_of(message: Message, kind: str) -> Optional[str]:
+    if kind == "photo":
+        return message.photo[-1].file_id if message.photo else None
+    media = getattr(message, kind, None) or message.animation or message.document
+    return media.file_id if media else None
+
+
+# Errors meaning the id itself is no longer usable; anything else (file too
+# big, wrong type, ...) would fail the same way on a fresh upload.
+_REJECTED_FILE_ID = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "file reference expired",
+    "file_reference_expired",
+)
+
+
+def _is_rejected_file_id(exc: BadRequest) -> bool:
+    if isinstance(exc, WrongFileIdentifier):
+        return True
+    text = str(exc).lower()
+    return any(marker in text for marker in _REJECTED_FILE_ID)
+
+
+class MediaCache:
+    """Sends files by cached ``file_id`` and uploads them only when needed."""
+
+    max_memo: int = 2000
+
+    _memo: "OrderedDict[Tuple[str, str], Tuple[int, int, str]]" = OrderedDict()
+
+    @staticmethod
+    def _key(path: str) -> Tuple[str, int, int]:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def _memo_put(cls, key: Tuple[str, str], value: Tuple[int, int, str]) -> None:
+        cls._memo[key] = value
+        cls._memo.move_to_end(key)
+        while len(cls._memo) > cls.max_memo:
+            cls._memo.popitem(last=False)
+
+    @classmethod
+    def lookup(cls, path: str, kind: str) -> Optional[str]:
+        abs_path, mtime_ns, size = cls._key(path)
+        cached = cls._memo.get((abs_path, kind))
+        if cached and cached[:2] == (mtime_ns, size):
+            cls._memo.move_to_end((abs_path, kind))
+            return cached[2]
+        file_id = get_media_file_id(abs_path, mtime_ns, size, kind)
+        if file_id:
+            cls._memo_put((abs_path, kind), (mtime_ns, size, file_id))
+        return file_id
+
+    @classmethod
+    def _remember(cls, path: str, kind: str, file_id: str) -> None:
+        try:
+            abs_path, mtime_ns, size = cls._key(path)
+        except OSError as exc:  # moved or deleted during the upload; the send itself succeeded
+            logger.debug("Not caching file_id of %s: %s", path, exc)
+            return
+        cls._memo_put((abs_path, kind), (mtime_ns, size, file_id))
+        save_media_file_id(abs_path, mtime_ns, size, kind, file_id)
+
+    @classmethod
+    def _forget(cls, path: str, kind: str, file_id: str) -> None:
+        cls._memo.pop((os.path.abspath(path), kind), None)
+        delete_media_file_id(file_id)
+
+    @classmethod
+    def move(cls, old_path: str, new_path: str) -> None:
+        """Keep cached ids of a file that was moved or renamed (mtime and size survive a move)."""
+
+        old_abs, new_abs = os.path.abspath(old_path), os.path.abspath(new_path)
+        for kind in _SENDERS:
+            cached = cls._memo.pop((old_abs, kind), None)
+            if cached:
+                cls._memo_put((new_abs, kind), cached)
+        move_media_file_id(old_abs, new_abs)
+
+    @classmethod
+    async def send(cls, bot: Bot, chat_id: int | str, path: str, kind: Optional[str] = None,
+                   file_id: Optional[str] = None, **kwargs: Any) -> Message:
+        """Send the file at ``path`` to ``chat_id`` reusing its ``file_id`` when possible.
+
+        ``file_id`` takes precedence over the cache, e.g. the id stored with a
+        pre-uploaded stock value.
+        """
+
+        kind = kind or media_kind(path)
+        method_name, field = _SENDERS[kind]
+        method = getattr(bot, method_name)
+
+        file_id = file_id or cls.lookup(path, kind)
+        if file_id:
+            try:
+                return await method(chat_id, **{field: file_id}, **kwargs)
+            except BadRequest as exc:
+                if not _is_rejected_file_id(exc):
+                    raise
+                logger.warning("Cached file_id for %s was rejected (%s); uploading again", path, exc)
+                cls._forget(path, kind, file_id)
+
+        with open(path, "rb") as media:
+            message = await method(chat_id, **{field: media}, **kwargs)
+        new_file_id = _file_id_of(message, kind)
+        if new_file_id:
+            cls._remember(path, kind, new_file_id)
+        return message
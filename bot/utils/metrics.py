@@ -0,0 +1,333 @@
+"""Process metrics in the Prometheus text format.
+
+A small registry of counters, gauges and histograms, rendered by
+:func:`render_metrics` for the ``/metrics`` route of the IPN server.  Metrics
+are updated from the bot's event loop and from the Flask threads, so every
+metric guards its samples with a lock.
+
+Per-update figures (the handler that ran, the number of SQL queries and the
+time spent in them) are collected in an :class:`UpdateContext` held in a
+context variable for the duration of the update; see
+:mod:`bot.middlewares.metrics`.  Gauges that mirror in-memory state are filled
+by collectors registered with :func:`on_collect`.  That state belongs to the
+event loop, so the collectors run there, from :class:`LoopLagMonitor` every
+``collect_interval`` seconds, and a scrape only reads the cached values.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bot.logger_mesh import logger
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "LoopLagMonitor",
+    "UpdateContext",
+    "current_update",
+    "instrument_engine",
+    "on_collect",
+    "render_metrics",
+    "set_current_update",
+    "HANDLER_SECONDS",
+    "UPDATE_DB_QUERIES",
+    "UPDATE_DB_SECONDS",
+    "DB_QUERIES",
+    "DB_SECONDS",
+    "TELEGRAM_SECONDS",
+    "TELEGRAM_ERRORS",
+    "OPEN_INVOICES",
+    "STATE_ENTRIES",
+    "LOOP_LAG",
+]
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down; collectors usually overwrite it on scrape."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts plus sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket..., count above the last bucket], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        names = self.labelnames + ("le",)
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(names, key + (_format_value(bound),)), cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+_REGISTRY: List[_Metric] = []
+_COLLECTORS: List[Callable[[], None]] = []
+
+
+def on_collect(collector: Callable[[], None]) -> Callable[[], None]:
+    """Register ``collector`` to refresh gauges from the event loop (see :class:`LoopLagMonitor`)."""
+
+    _COLLECTORS.append(collector)
+    return collector
+
+
+def _run_collectors() -> None:
+    for collector in list(_COLLECTORS):
+        try:
+            collector()
+        except Exception:
+            logger.exception("Metrics collector %s failed", getattr(collector, "__name__", collector))
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@dataclass(slots=True)
+class UpdateContext:
+    """What one update cost; lives in a context variable while it is processed."""
+
+    started: float = field(default_factory=time.perf_counter)
+    handler: Optional[str] = None
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    sql_shapes: Optional[Dict[str, Any]] = None     # filled by the SQL profiler when enabled
+
+
+_CURRENT_UPDATE: ContextVar[Optional[UpdateContext]] = ContextVar("update_context", default=None)
+
+
+def current_update() -> Optional[UpdateContext]:
+    return _CURRENT_UPDATE.get()
+
+
+def set_current_update(context: Optional[UpdateContext]) -> None:
+    """Bind ``context`` for the rest of the current task (one task per update)."""
+
+    _CURRENT_UPDATE.set(context)
+
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds", "Time from receiving an update to finishing its handler.", ("handler",)
+)
+UPDATE_DB_QUERIES = Histogram(
+    "bot_update_db_queries", "SQL queries executed while processing one update.", ("handler",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250),
+)
+UPDATE_DB_SECONDS = Histogram(
+    "bot_update_db_seconds", "Time spent in SQL queries while processing one update.", ("handler",)
+)
+DB_QUERIES = Counter("bot_db_queries_total", "SQL queries executed by the process.")
+DB_SECONDS = Counter("bot_db_query_seconds_total", "Time spent executing SQL queries.")
+TELEGRAM_SECONDS = Histogram(
+    "bot_telegram_request_seconds", "Latency of Bot API requests.", ("method",)
+)
+TELEGRAM_ERRORS = Counter(
+    "bot_telegram_request_errors_total", "Failed Bot API requests.", ("method", "error")
+)
+# Loaded at startup and kept current by the methods that add and remove unfinished operations.
+OPEN_INVOICES = Gauge("bot_open_invoices", "Unfinished payment operations awaiting confirmation.")
+STATE_ENTRIES = Gauge("bot_state_entries", "Entries held in in-memory state tables.", ("store",))
+LOOP_LAG = Gauge("bot_event_loop_lag_seconds", "How late the last event loop lag probe woke up.")
+_LOOP_LAG_SECONDS = Histogram(
+    "bot_event_loop_lag_probe_seconds", "Distribution of event loop lag probes.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+def instrument_engine(engine) -> None:
+    """Count and time every SQL statement ``engine`` executes."""
+
+    from sqlalchemy import event
+
+    # A single start time per connection: a statement that raises never
+    # reaches _after, and the next statement overwrites its entry.
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        DB_QUERIES.inc()
+        DB_SECONDS.inc(elapsed)
+        update = _CURRENT_UPDATE.get()
+        if update is not None:
+            update.db_queries += 1
+            update.db_seconds += elapsed
+
+
+class LoopLagMonitor:
+    """Sleeps for ``interval`` in a loop and records how late it wakes up.
+
+    ``deadline`` is when the current sleep should end on the loop's clock
+    (``time.monotonic()``); the stall watchdog reads it from its own thread.
+    Every ``collect_interval`` seconds it also runs the :func:`on_collect`
+    collectors.
+    """
+
+    interval: float = 0.5
+    collect_interval: float = 5.0
+    deadline: float = 0.0
+
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._task is not None and not cls._task.done():
+            return
+        loop = asyncio.get_running_loop()
+        cls.deadline = loop.time() + cls.interval
+        cls._task = loop.create_task(cls._run())
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
+
+    @classmethod
+    async def _run(cls) -> None:
+        loop = asyncio.get_running_loop()
+        next_collect = loop.time()
+        while True:
+            if loop.time() >= next_collect:
+                _run_collectors()
+                next_collect = loop.time() + cls.collect_interval
+            cls.deadline = loop.time() + cls.interval
+            await asyncio.sleep(cls.interval)
+            lag = max(loop.time() - cls.deadline, 0.0)
+            LOOP_LAG.set(lag)
+            _LOOP_LAG_SECONDS.observe(lag)
@@ -6,21 +6,29 @@ package should keep their existing behaviour, while modern setups ought to work
 without installing the legacy dependency.  This module mirrors the public
 surface that callers rely on and delegates to the old helpers when possible,
 providing local implementations otherwise.
+
+Local notifications are batched by :class:`OwnerDigest`: events arriving within
+``OWNER_DIGEST_WINDOW`` seconds are sent as one digest message, with their
+files grouped into media groups.  Amounts of at least
+``OWNER_DIGEST_IMMEDIATE_AMOUNT`` are still sent immediately.
 """
 
 from __future__ import annotations
 
+import asyncio
+import functools
 from dataclasses import dataclass
 from decimal import Decimal, InvalidOperation
 from pathlib import Path
 from typing import Iterable
 
 from aiogram import Bot
-from aiogram.types import FSInputFile
+from aiogram.types import InputFile, InputMediaDocument, InputMediaPhoto
 
 from bot.logger_mesh import logger
 from bot.misc import EnvKeys
 from bot.utils import display_name
+from bot.utils.rate_limiter import Priority, outbound_priority
 
 try:  # pragma: no cover - optional dependency
     from utils.notifications import (  # type: ignore
@@ -34,6 +42,8 @@ except (ImportError, AttributeError):  # pragma: no cover - legacy package absen
     _legacy_notify_owner_of_topup = None
 
 __all__ = [
+    "OwnerDigest",
+    "notify_owner_of_feedback",
     "notify_owner_of_purchase",
     "notify_owner_of_prize_win",
     "notify_owner_of_topup",
@@ -89,6 +99,17 @@ def _format_amount(value: object) -> str:
     return f"{quantized:.2f}"
 
 
+def _owner_lane(func):
+    """Send owner notifications through the low-priority outbound lane."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with outbound_priority(Priority.OWNER):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
 def _join_non_empty(parts: Iterable[str]) -> str:
     return "\n".join(part for part in parts if part)
 
@@ -121,13 +142,157 @@ async def _send_owner_file(bot: Bot, file_path: Path, caption: str | None = None
     try:
         await bot.send_document(
             owner_id,
-            FSInputFile(str(file_path)),
+            InputFile(str(file_path)),
             caption=caption or None,
         )
     except Exception as exc:  # pragma: no cover - optional attachment
         logger.error("Failed to deliver owner attachment %s: %s", file_path, exc)
 
 
+@dataclass(slots=True)
+class _DigestEntry:
+    """One owner event: its text plus an optional file on disk or photo ``file_id``."""
+
+    text: str
+    document: Path | None = None
+    photo_file_id: str | None = None
+    caption: str | None = None
+
+
+def _is_high_value(amount: object) -> bool:
+    try:
+        return float(str(amount)) >= EnvKeys.OWNER_DIGEST_IMMEDIATE_AMOUNT
+    except (TypeError, ValueError):
+        return False
+
+
+def _chunk_texts(texts: list[str], header: str, limit: int = 4096) -> list[str]:
+    chunks: list[str] = []
+    current = header
+    for text in texts:
+        text = text[:limit - len(header) - 2]
+        if len(current) + len(text) + 2 > limit:
+            chunks.append(current)
+            current = header
+        current += "\n\n" + text
+    chunks.append(current)
+    return chunks
+
+
+class OwnerDigest:
+    """Collects owner notifications and sends them in batches."""
+
+    window: float = EnvKeys.OWNER_DIGEST_WINDOW
+    max_entries: int = 50
+    media_group_size: int = 10
+
+    _bot: Bot | None = None
+    _loop: asyncio.AbstractEventLoop | None = None
+    _entries: list[_DigestEntry] = []
+    _task: asyncio.Task | None = None
+
+    @classmethod
+    def start(cls, bot: Bot) -> None:
+        """Enable batching on the running loop; events from other threads are handed to it."""
+
+        cls._bot = bot
+        cls._loop = asyncio.get_running_loop()
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls.window > 0 and cls._loop is not None and not cls._loop.is_closed()
+
+    @classmethod
+    async def submit(cls, bot: Bot, entry: _DigestEntry, immediate: bool = False) -> None:
+        if immediate or not cls.enabled():
+            await cls._deliver(bot, [entry])
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is cls._loop:
+            cls._append(entry)
+        else:
+            cls._loop.call_soon_threadsafe(cls._append, entry)
+
+    @classmethod
+    def _append(cls, entry: _DigestEntry) -> None:
+        cls._entries.append(entry)
+        if len(cls._entries) >= cls.max_entries:
+            cls._loop.create_task(cls.flush())
+        elif cls._task is None or cls._task.done():
+            cls._task = cls._loop.create_task(cls._flush_later())
+
+    @classmethod
+    async def _flush_later(cls) -> None:
+        await asyncio.sleep(cls.window)
+        await cls.flush()
+
+    @classmethod
+    async def flush(cls) -> None:
+        """Send everything collected so far (also called on shutdown)."""
+
+        entries, cls._entries = cls._entries, []
+        if entries and cls._bot is not None:
+            with outbound_priority(Priority.OWNER):
+                await cls._deliver(cls._bot, entries)
+
+    @classmethod
+    async def _deliver(cls, bot: Bot, entries: list[_DigestEntry]) -> None:
+        owner_id = _resolve_owner_id()
+        if owner_id is None:
+            return
+
+        if len(entries) == 1:
+            await cls._send_single(bot, owner_id, entries[0])
+            return
+
+        header = f"🧾 {len(entries)} events"
+        for text in _chunk_texts([entry.text for entry in entries], header):
+            await _send_owner_message(bot, text)
+
+        documents = [
+            InputMediaDocument(InputFile(str(entry.document)), caption=entry.caption)
+            for entry in entries
+            if entry.document is not None and entry.document.is_file()
+        ]
+        photos = [
+            InputMediaPhoto(entry.photo_file_id, caption=entry.caption)
+            for entry in entries
+            if entry.photo_file_id
+        ]
+        for media in (documents, photos):
+            for start in range(0, len(media), cls.media_group_size):
+                await cls._send_group(bot, owner_id, media[start:start + cls.media_group_size])
+
+    @staticmethod
+    async def _send_single(bot: Bot, owner_id: int, entry: _DigestEntry) -> None:
+        if entry.photo_file_id:
+            try:
+                await bot.send_photo(owner_id, entry.photo_file_id, caption=entry.caption)
+                return
+            except Exception as exc:  # pragma: no cover - fall back to text
+                logger.error("Failed to send prize photo notification: %s", exc)
+        await _send_owner_message(bot, entry.text)
+        if entry.document is not None and entry.document.is_file():
+            await _send_owner_file(bot, entry.document, caption=entry.caption)
+
+    @staticmethod
+    async def _send_group(bot: Bot, owner_id: int, media: list) -> None:
+        try:
+            if len(media) == 1:
+                item = media[0]
+                if isinstance(item, InputMediaPhoto):
+                    await bot.send_photo(owner_id, item.media, caption=item.caption)
+                else:
+                    await bot.send_document(owner_id, item.media, caption=item.caption)
+                return
+            await bot.send_media_group(owner_id, media)
+        except Exception as exc:  # pragma: no cover - optional attachments
+            logger.error("Failed to deliver owner digest attachments: %s", exc)
+
+
 async def _local_notify_owner_of_purchase(
     bot: Bot,
     username: str | None,
@@ -161,21 +326,20 @@ async def _local_notify_owner_of_purchase(
     if photo_description:
         header_lines.extend(["", photo_description.strip()])
 
-    await _send_owner_message(bot, _join_non_empty(header_lines))
+    entry = _DigestEntry(_join_non_empty(header_lines))
+    if file_path:
+        path = Path(file_path)
+        if path.is_file():
+            caption_parts = [f"{item_display} — {price_display}€"]
+            if photo_description:
+                caption_parts.append(photo_description.strip())
+            caption = _join_non_empty(caption_parts)
+            entry.document = path
+            entry.caption = caption[:1024] if caption else None
+        else:
+            logger.debug("Owner attachment missing or not a file: %s", file_path)
 
-    if not file_path:
-        return
-
-    path = Path(file_path)
-    if not path.is_file():
-        logger.debug("Owner attachment missing or not a file: %s", file_path)
-        return
-
-    caption_parts = [f"{item_display} — {price_display}€"]
-    if photo_description:
-        caption_parts.append(photo_description.strip())
-    caption = _join_non_empty(caption_parts)
-    await _send_owner_file(bot, path, caption=caption[:1024] if caption else None)
+    await OwnerDigest.submit(bot, entry, immediate=_is_high_value(price))
 
 
 async def _local_notify_owner_of_prize_win(
@@ -190,10 +354,6 @@ async def _local_notify_owner_of_prize_win(
     photo_file_id: str | None,
     formatted_time: str,
 ) -> None:
-    owner_id = _resolve_owner_id()
-    if owner_id is None:
-        return
-
     user_repr = username if username else (full_name or str(user_id))
     prize_bits = [prize_emoji or "🎁", prize_name]
     prize_line = " ".join(bit for bit in prize_bits if bit)
@@ -208,15 +368,8 @@ async def _local_notify_owner_of_prize_win(
         lines.append(f"📍 Location: {prize_location}")
 
     message = _join_non_empty(lines)
-
-    if photo_file_id:
-        try:
-            await bot.send_photo(owner_id, photo_file_id, caption=message)
-            return
-        except Exception as exc:  # pragma: no cover - fall back to text
-            logger.error("Failed to send prize photo notification: %s", exc)
-
-    await _send_owner_message(bot, message)
+    entry = _DigestEntry(message, photo_file_id=photo_file_id, caption=message[:1024])
+    await OwnerDigest.submit(bot, entry)
 
 
 async def _local_notify_owner_of_topup(
@@ -232,9 +385,10 @@ async def _local_notify_owner_of_topup(
         f"💶 Amount: {price_display}€",
         f"🕒 Time: {formatted_time}",
     ]
-    await _send_owner_message(bot, _join_non_empty(lines))
+    await OwnerDigest.submit(bot, _DigestEntry(_join_non_empty(lines)), immediate=_is_high_value(amount))
 
 
+@_owner_lane
 async def notify_owner_of_purchase(
     bot: Bot,
     username: str | None,
@@ -273,6 +427,7 @@ async def notify_owner_of_purchase(
     )
 
 
+@_owner_lane
 async def notify_owner_of_prize_win(
     bot: Bot,
     *,
@@ -312,6 +467,7 @@ async def notify_owner_of_prize_win(
     )
 
 
+@_owner_lane
 async def notify_owner_of_topup(
     bot: Bot,
     username: str | None,
@@ -323,3 +479,14 @@ async def notify_owner_of_topup(
         return
 
     await _local_notify_owner_of_topup(bot, username, amount, formatted_time)
+
+
+@_owner_lane
+async def notify_owner_of_feedback(
+    bot: Bot,
+    username: str | None,
+    service_rating: object,
+    product_rating: object,
+) -> None:
+    text = f"User {username or 'unknown'} feedback: service {service_rating}, product {product_rating}"
+    await OwnerDigest.submit(bot, _DigestEntry(text))
@@ -0,0 +1,216 @@
+"""Transactional outbox for messages that must reach the user.
+
+Purchase deliveries and payment confirmations are written to the
+``outbox_messages`` table in the same transaction as the state change they
+report (see ``purchase_item`` and ``credit_topup``).  :class:`OutboxWorker`
+drains the table from the bot's event loop and retries failures with
+exponential backoff, which gives at-least-once delivery without making the
+handler wait for Telegram.  Database errors while draining pause the worker
+with backoff instead of ending it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.exceptions import (
+    BotBlocked,
+    ChatNotFound,
+    MessageCantBeEdited,
+    MessageNotModified,
+    MessageToDeleteNotFound,
+    MessageToEditNotFound,
+    TelegramAPIError,
+    UserDeactivated,
+)
+
+from bot.database.methods import mark_outbox_sent, reschedule_outbox, rollback_session, select_due_outbox
+from bot.logger_mesh import logger
+from bot.utils.media_cache import MediaCache
+from bot.utils.rate_limiter import Priority, outbound_priority
+
+__all__ = ["OutboxWorker", "outbox_text", "outbox_media", "outbox_delete"]
+
+_PERMANENT_ERRORS = (BotBlocked, ChatNotFound, UserDeactivated)
+
+
+def outbox_text(chat_id: int, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None,
+                parse_mode: Optional[str] = None, edit_message_id: Optional[int] = None,
+                priority: Priority = Priority.DELIVERY) -> dict:
+    """Describe a text message; ``edit_message_id`` edits that message, falling back to a new one."""
+
+    return {
+        'action': 'text',
+        'chat_id': chat_id,
+        'text': text,
+        'parse_mode': parse_mode,
+        'reply_markup': reply_markup.as_json() if reply_markup else None,
+        'edit_message_id': edit_message_id,
+        'priority': int(priority),
+    }
+
+
+def outbox_media(chat_id: int, path: str, caption: Optional[str] = None, parse_mode: Optional[str] = None,
+                 file_id: Optional[str] = None, fallback_path: Optional[str] = None,
+                 priority: Priority = Priority.DELIVERY) -> dict:
+    """Describe a photo/video sent from ``path`` (or ``fallback_path`` if it was not moved yet)."""
+
+    return {
+        'action': 'media',
+        'chat_id': chat_id,
+        'path': path,
+        'fallback_path': fallback_path,
+        'file_id': file_id,
+        'caption': caption,
+        'parse_mode': parse_mode,
+        'priority': int(priority),
+    }
+
+
+def outbox_delete(chat_id: int, message_id: int, priority: Priority = Priority.PAYMENT) -> dict:
+    return {'action': 'delete', 'chat_id': chat_id, 'message_id': message_id, 'priority': int(priority)}
+
+
+class OutboxWorker:
+    """Background task delivering outbox rows with retries."""
+
+    poll_interval: float = 5.0
+    batch_size: int = 20
+    base_backoff: int = 5
+    max_backoff: int = 3600
+    max_attempts: int = 10
+    retry_delay: float = 5.0
+    max_retry_delay: float = 300.0
+
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _wakeup: Optional[asyncio.Event] = None
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def start(cls, bot: Bot) -> None:
+        if cls._task is not None and not cls._task.done():
+            return
+        cls._loop = asyncio.get_running_loop()
+        cls._wakeup = asyncio.Event()
+        cls._task = cls._loop.create_task(cls._run(bot))
+
+    @classmethod
+    def notify(cls) -> None:
+        """Wake the worker; safe to call from the IPN thread."""
+
+        if cls._loop is None or cls._wakeup is None or cls._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is cls._loop:
+            cls._wakeup.set()
+        else:
+            cls._loop.call_soon_threadsafe(cls._wakeup.set)
+
+    @staticmethod
+    async def _deliver(bot: Bot, message: dict[str, Any]) -> None:
+        action = message['action']
+        chat_id = message['chat_id']
+        if action == 'delete':
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message['message_id'])
+            except MessageToDeleteNotFound:
+                pass
+            return
+
+        if action == 'media':
+            path = message['path']
+            if not os.path.isfile(path) and message.get('fallback_path'):
+                path = message['fallback_path']
+            await MediaCache.send(
+                bot, chat_id, path,
+                file_id=message.get('file_id'),
+                caption=message.get('caption'),
+                parse_mode=message.get('parse_mode'),
+            )
+            return
+
+        markup = message.get('reply_markup')
+        reply_markup = InlineKeyboardMarkup(**json.loads(markup)) if markup else None
+        if message.get('edit_message_id'):
+            try:
+                await bot.edit_message_text(
+                    message['text'], chat_id=chat_id, message_id=message['edit_message_id'],
+                    parse_mode=message.get('parse_mode'), reply_markup=reply_markup,
+                )
+                return
+            except MessageNotModified:
+                return
+            except (MessageCantBeEdited, MessageToEditNotFound):
+                pass
+        await bot.send_message(chat_id, message['text'], parse_mode=message.get('parse_mode'),
+                               reply_markup=reply_markup)
+
+    @classmethod
+    async def _process(cls, bot: Bot, row_id: int, payload: str, attempts: int) -> None:
+        message = json.loads(payload)
+        try:
+            with outbound_priority(Priority(message.get('priority', Priority.DELIVERY))):
+                await cls._deliver(bot, message)
+        except Exception as exc:
+            attempts += 1
+            permanent = isinstance(exc, _PERMANENT_ERRORS) or attempts >= cls.max_attempts
+            delay = min(cls.base_backoff * 2 ** (attempts - 1), cls.max_backoff)
+            reschedule_outbox(row_id, attempts, int(time.time()) + delay, repr(exc), failed=permanent)
+            if permanent:
+                logger.error("Outbox message %s to %s dropped after %s attempts: %s",
+                             row_id, message.get('chat_id'), attempts, exc)
+            elif isinstance(exc, TelegramAPIError):
+                logger.warning("Outbox message %s failed (attempt %s), retrying in %ss: %s",
+                               row_id, attempts, delay, exc)
+            else:
+                logger.exception("Outbox message %s failed (attempt %s)", row_id, attempts)
+            return
+        mark_outbox_sent(row_id)
+
+    @classmethod
+    async def _drain(cls, bot: Bot) -> bool:
+        """Deliver one batch of due rows; ``True`` when more may be waiting."""
+
+        due = select_due_outbox(int(time.time()), cls.batch_size)
+        if not due:
+            return False
+        # Let the whole batch finish before raising, so no row is still in
+        # flight when the next batch is selected.
+        results = await asyncio.gather(*(cls._process(bot, *row) for row in due), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return len(due) == cls.batch_size
+
+    @classmethod
+    async def _run(cls, bot: Bot) -> None:
+        delay = cls.retry_delay
+        while True:
+            try:
+                more = await cls._drain(bot)
+            except Exception:
+                logger.exception("Outbox delivery interrupted; retrying in %.0fs", delay)
+                try:
+                    rollback_session()
+                except Exception as exc:
+                    logger.debug("Rollback after outbox failure failed: %s", exc)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, cls.max_retry_delay)
+                continue
+            delay = cls.retry_delay
+            if more:
+                continue
+            cls._wakeup.clear()
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.poll_interval)
+            except asyncio.TimeoutError:
+                pass
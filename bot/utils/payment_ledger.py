@@ -0,0 +1,77 @@
+"""Idempotency ledger for payment provider callbacks.
+
+NOWPayments retries IPN deliveries and reports several statuses for a single
+payment, while the bot also polls for the same payment from the event loop.
+Every (payment_id, status) pair is recorded in the ``processed_payment_events``
+table whose unique constraint guarantees that only one caller wins.  A bounded
+in-memory LRU sits in front of the table so retries that were already seen by
+this process are rejected without touching the database.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+from bot.database.methods import credit_topup, is_payment_event_processed, record_payment_event
+from bot.logger_mesh import logger
+
+__all__ = ["PaymentLedger"]
+
+
+class PaymentLedger:
+    """Exactly-once gate shared by the IPN thread and the bot event loop."""
+
+    CREDITED = "credited"
+
+    max_entries: int = 10_000
+
+    _recent: "OrderedDict[tuple[str, str], None]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def _remember(cls, key: tuple[str, str]) -> None:
+        cls._recent[key] = None
+        cls._recent.move_to_end(key)
+        while len(cls._recent) > cls.max_entries:
+            cls._recent.popitem(last=False)
+
+    @classmethod
+    def claim(cls, payment_id: str, status: str) -> bool:
+        """Record the event and return True only for the first caller."""
+
+        key = (str(payment_id), status)
+        with cls._lock:
+            if key in cls._recent:
+                cls._recent.move_to_end(key)
+                return False
+            claimed = record_payment_event(*key)
+            cls._remember(key)
+        if not claimed:
+            logger.info("Payment event %s/%s already processed", *key)
+        return claimed
+
+    @classmethod
+    def credit_topup(
+        cls,
+        payment_id: str,
+        operation_time: str,
+        referral_percent: int = 0,
+        outbox: list[dict] | None = None,
+    ) -> dict | None:
+        """Credit a top-up once; return the credit details or ``None`` if done before.
+
+        The ``credited`` ledger row and the ``outbox`` messages are written in
+        the same transaction as the balance changes, so a failure never
+        consumes the claim.
+        """
+
+        key = (str(payment_id), cls.CREDITED)
+        with cls._lock:
+            if key in cls._recent:
+                return None
+            credit = credit_topup(key[0], operation_time, referral_percent, ledger_status=cls.CREDITED,
+                                  outbox=outbox)
+            if credit is not None or is_payment_event_processed(*key):
+                cls._remember(key)
+        return credit
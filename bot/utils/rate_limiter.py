@@ -0,0 +1,239 @@
+"""Outbound Telegram rate limiting with priority lanes.
+
+Every API call that posts into a chat goes through :class:`OutboundScheduler`
+before reaching Telegram.  Token buckets enforce the global limit (30 msg/s),
+a per-chat limit (about 1 msg/s with a short burst) and the stricter group
+limit (20 msg/min).  Waiting calls are granted in lane order, so a purchase
+delivery is never stuck behind a broadcast.  The lane of the current task is
+chosen with :func:`outbound_priority`::
+
+    with outbound_priority(Priority.BROADCAST):
+        await bot.send_message(chat_id, text)
+
+``RetryAfter`` answers pause the scheduler for the requested time and the call
+is retried transparently.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Deque, Dict, Iterator, Optional
+
+from bot.logger_mesh import logger
+
+__all__ = [
+    "Priority",
+    "OutboundScheduler",
+    "outbound_priority",
+    "set_outbound_priority",
+    "current_priority",
+    "is_rate_limited",
+]
+
+
+class Priority(IntEnum):
+    """Outbound lanes; lower values are served first."""
+
+    DELIVERY = 0
+    PAYMENT = 1
+    DEFAULT = 2
+    OWNER = 3
+    BROADCAST = 4
+
+
+_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.DEFAULT)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+def set_outbound_priority(priority: Priority) -> None:
+    """Switch the lane for the rest of the current task.
+
+    aiogram runs every update handler in its own task, so this does not leak
+    into other updates.
+    """
+
+    _priority.set(priority)
+
+
+@contextmanager
+def outbound_priority(priority: Priority) -> Iterator[None]:
+    """Send every request made inside the block through ``priority``'s lane."""
+
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+def is_rate_limited(method: str) -> bool:
+    """Return True for API methods that post into a chat."""
+
+    return method.startswith(_LIMITED_PREFIXES)
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float = -1.0
+    updated: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self) -> None:
+        if self.tokens < 0:
+            self.tokens = self.capacity
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available."""
+
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass(slots=True, eq=False)
+class _Waiter:
+    chat_id: Optional[int]
+    future: asyncio.Future
+
+
+class OutboundScheduler:
+    """Grants send slots in priority order while respecting Telegram's limits."""
+
+    global_rate: float = 30.0
+    chat_rate: float = 1.0
+    chat_burst: float = 3.0
+    group_rate: float = 20 / 60
+    group_burst: float = 3.0
+    scan_depth: int = 64
+    max_retries: int = 5
+
+    def __init__(self) -> None:
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._lanes: list[Deque[_Waiter]] = [deque() for _ in Priority]
+        self._paused_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump_task: Optional[asyncio.Task] = None
+        self.granted = 0
+        self.retry_after_hits = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chat_buckets": len(self._chats),
+            "waiting": sum(len(lane) for lane in self._lanes),
+            "granted": self.granted,
+            "retry_after_hits": self.retry_after_hits,
+        }
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        for chat_id in [cid for cid, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    async def acquire(self, chat_id: Optional[int], priority: Priority = Priority.DEFAULT) -> None:
+        """Wait until a request to ``chat_id`` may be sent."""
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # The IPN thread drives its bot through short-lived loops.
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._pump_task = None
+            for lane in self._lanes:
+                lane.clear()
+        waiter = _Waiter(chat_id, loop.create_future())
+        self._lanes[priority].append(waiter)
+        self._wakeup.set()
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = loop.create_task(self._pump())
+        await waiter.future
+
+    def pause(self, seconds: float) -> None:
+        """Stop granting slots for ``seconds`` after a flood-control answer."""
+
+        self.retry_after_hits += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning("Telegram flood control: pausing outbound requests for %ss", seconds)
+
+    def _next_ready(self, now: float) -> tuple[Optional[Deque[_Waiter]], Optional[_Waiter], float]:
+        soonest = float("inf")
+        for lane in self._lanes:
+            for index, waiter in enumerate(lane):
+                if index >= self.scan_depth:
+                    break
+                if waiter.future.done():
+                    continue
+                if waiter.chat_id is None:
+                    return lane, waiter, 0.0
+                wait = self._bucket(waiter.chat_id).wait_time(now)
+                if wait <= 0:
+                    return lane, waiter, 0.0
+                soonest = min(soonest, wait)
+        return None, None, soonest
+
+    def _drop_cancelled(self) -> bool:
+        pending = False
+        for lane in self._lanes:
+            while lane and lane[0].future.done():
+                lane.popleft()
+            pending = pending or bool(lane)
+        return pending
+
+    async def _pump(self) -> None:
+        while self._drop_cancelled():
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._global.wait_time(now))
+            if delay <= 0:
+                lane, waiter, delay = self._next_ready(now)
+                if waiter is not None:
+                    lane.remove(waiter)
+                    self._global.consume(now)
+                    if waiter.chat_id is not None:
+                        self._bucket(waiter.chat_id).consume(now)
+                    waiter.future.set_result(None)
+                    self.granted += 1
+                    if self.granted % 1000 == 0:
+                        self._prune(now)
+                    continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, 1.0))
+            except asyncio.TimeoutError:
+                pass
+        self._prune(time.monotonic())
@@ -0,0 +1,137 @@
+"""Image rendering offloaded from the event loop.
+
+QR codes for payment addresses and CAPTCHA challenges are CPU-bound Pillow
+work.  :class:`Renderer` runs it in a small process pool, keeps the PNG bytes
+of recent QR codes keyed by address and maintains a pool of pre-rendered
+CAPTCHA challenges that is topped up in the background, so handlers only
+await finished bytes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Callable, Deque, Optional
+
+from bot.logger_mesh import logger
+from bot.misc import EnvKeys
+from bot.utils.security import SecurityManager, render_captcha_png
+
+__all__ = ["Renderer", "render_qr_png"]
+
+
+def render_qr_png(data: str) -> bytes:
+    """Return ``data`` encoded as a QR code PNG."""
+
+    import qrcode
+
+    buffer = BytesIO()
+    qrcode.make(data).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _render_captcha() -> tuple[str, str, bytes]:
+    question, answer = SecurityManager._generate_captcha()
+    return question, answer, render_captcha_png(question)
+
+
+class Renderer:
+    """Process-pool backed renderer shared by all handlers."""
+
+    qr_cache_size: int = 512
+    captcha_pool_size: int = EnvKeys.CAPTCHA_POOL_SIZE
+    workers: int = EnvKeys.RENDER_WORKERS
+
+    _executor: Optional[Executor] = None
+    _qr_cache: "OrderedDict[str, bytes]" = OrderedDict()
+    _captcha_pool: Deque[tuple[str, str, bytes]] = deque()
+    _refill_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def _get_executor(cls) -> Optional[Executor]:
+        if cls._executor is None and cls.workers > 0:
+            # Workers are spawned so they never inherit locks held by the IPN thread.
+            cls._executor = ProcessPoolExecutor(
+                max_workers=cls.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return cls._executor
+
+    @classmethod
+    async def _run(cls, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        executor = cls._get_executor()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            logger.error("Renderer process pool broke; falling back to threads")
+            cls._executor = None
+            cls.workers = 0
+            return await loop.run_in_executor(None, func, *args)
+
+    @staticmethod
+    def _as_file(data: bytes, name: str) -> BytesIO:
+        buffer = BytesIO(data)
+        buffer.name = name
+        return buffer
+
+    @classmethod
+    async def qr_png(cls, address: str) -> BytesIO:
+        """Return a QR code for ``address`` ready for ``send_photo``."""
+
+        data = cls._qr_cache.get(address)
+        if data is None:
+            data = await cls._run(render_qr_png, address)
+            cls._qr_cache[address] = data
+            while len(cls._qr_cache) > cls.qr_cache_size:
+                cls._qr_cache.popitem(last=False)
+        else:
+            cls._qr_cache.move_to_end(address)
+        return cls._as_file(data, "qr.png")
+
+    @classmethod
+    async def captcha(cls) -> tuple[str, str, BytesIO]:
+        """Return ``(question, answer, image)`` taken from the pre-rendered pool."""
+
+        if cls._captcha_pool:
+            question, answer, data = cls._captcha_pool.popleft()
+        else:
+            question, answer, data = await cls._run(_render_captcha)
+        cls._schedule_refill()
+        return question, answer, cls._as_file(data, "captcha.png")
+
+    @classmethod
+    def _schedule_refill(cls) -> None:
+        if cls._refill_task is None or cls._refill_task.done():
+            cls._refill_task = asyncio.get_running_loop().create_task(cls._refill())
+
+    @classmethod
+    async def _refill(cls) -> None:
+        while len(cls._captcha_pool) < cls.captcha_pool_size:
+            missing = cls.captcha_pool_size - len(cls._captcha_pool)
+            batch = min(missing, max(cls.workers, 1))
+            try:
+                rendered = await asyncio.gather(*(cls._run(_render_captcha) for _ in range(batch)))
+            except Exception as e:
+                logger.error("CAPTCHA pool refill failed: %s", e)
+                return
+            cls._captcha_pool.extend(rendered)
+
+    @classmethod
+    async def start(cls) -> None:
+        """Start the worker processes and fill the CAPTCHA pool."""
+
+        cls._get_executor()
+        cls._schedule_refill()
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls._refill_task is not None:
+            cls._refill_task.cancel()
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
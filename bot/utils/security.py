@@ -1,23 +1,69 @@
-"""Security utilities for user verification and IP monitoring."""
+"""Security utilities for user verification and IP monitoring.
+
+Challenges, blocks and per-IP request logs live in :class:`ExpiringDict`
+tables with a TTL and a hard size cap, so idle entries disappear and a flood
+of distinct IPs or users cannot grow memory without bound.  Verified users
+are stored in the database and only cached here, so a restart does not send
+everyone through the CAPTCHA again.
+"""
 
 from __future__ import annotations
 
 import random
 import time
-from collections import defaultdict, deque
+from collections import deque
 from dataclasses import dataclass, field
 from io import BytesIO
 from typing import Deque, Dict, Optional
 
-try:  # Pillow is required for rendering the CAPTCHA challenges
-    from PIL import Image, ImageDraw, ImageFont
-except Exception:  # pragma: no cover - Pillow should be available but keep guard
-    Image = ImageDraw = ImageFont = None
+from bot.logger_mesh import logger
+from bot.utils.expiring import ExpiringDict
 
 
-from typing import Deque, Dict, Optional
+def render_captcha_png(question: str) -> bytes:
+    """Render ``question`` as a noisy PNG; runs in renderer worker processes."""
 
-from bot.logger_mesh import logger
+    try:  # Pillow is only needed by the renderer workers
+        from PIL import Image, ImageDraw, ImageFont
+    except Exception as exc:  # pragma: no cover - Pillow should be available but keep guard
+        raise RuntimeError("Pillow must be installed to generate verification CAPTCHA images.") from exc
+
+    # Default dimensions chosen to work with Telegram's image preview sizes.
+    width, height = 420, 180
+    background_color = (247, 247, 247)
+    text_color = (20, 20, 20)
+
+    image = Image.new("RGB", (width, height), background_color)
+    draw = ImageDraw.Draw(image)
+
+    try:
+        font = ImageFont.truetype("arial.ttf", 64)
+    except Exception:
+        font = ImageFont.load_default()
+
+    bbox = draw.textbbox((0, 0), question, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    x = (width - text_width) / 2
+    y = (height - text_height) / 2
+    draw.text((x, y), question, font=font, fill=text_color)
+
+    # Add minimal noise so automated bots struggle while humans can read easily.
+    for _ in range(5):
+        x1 = random.randint(0, width)
+        y1 = random.randint(0, height)
+        x2 = random.randint(0, width)
+        y2 = random.randint(0, height)
+        draw.line((x1, y1, x2, y2), fill=(160, 160, 160), width=2)
+
+    for _ in range(80):
+        dot_x = random.randint(0, width - 1)
+        dot_y = random.randint(0, height - 1)
+        draw.point((dot_x, dot_y), fill=(200, 200, 200))
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
 
 
 @dataclass
@@ -37,17 +83,11 @@ class VerificationChallenge:
 class SecurityManager:
     """Centralised security helpers for the bot and web services."""
 
-    _user_challenges: Dict[int, VerificationChallenge] = {}
-    _verified_users: set[int] = set()
-    _blocked_users: Dict[int, float] = {}
-
-    _ip_requests: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=200))
-    _ip_failures: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=50))
-    _blocked_ips: Dict[str, float] = {}
-
     captcha_attempt_limit: int = 3
     photo_attempt_limit: int = 2
     block_duration: float = 15 * 60  # 15 minutes
+    challenge_ttl: float = 30 * 60
+    verified_cache_ttl: float = 6 * 3600
 
     ip_rate_window: float = 60.0
     ip_rate_limit: int = 30
@@ -55,6 +95,14 @@ class SecurityManager:
     ip_failure_window: float = 10 * 60.0
     ip_anomaly_threshold: int = 120
 
+    _user_challenges: ExpiringDict[int, VerificationChallenge] = ExpiringDict(challenge_ttl, 20_000)
+    _verified_users: ExpiringDict[int, bool] = ExpiringDict(verified_cache_ttl, 50_000)
+    _blocked_users: ExpiringDict[int, bool] = ExpiringDict(block_duration, 50_000)
+
+    _ip_requests: ExpiringDict[str, Deque[float]] = ExpiringDict(ip_rate_window, 20_000)
+    _ip_failures: ExpiringDict[str, Deque[float]] = ExpiringDict(ip_failure_window, 20_000)
+    _blocked_ips: ExpiringDict[str, bool] = ExpiringDict(block_duration, 20_000)
+
     @staticmethod
     def _generate_captcha() -> tuple[str, str]:
         left = random.randint(10, 99)
@@ -73,7 +121,7 @@ class SecurityManager:
         if not challenge:
             question, answer = cls._generate_captcha()
             challenge = VerificationChallenge(question=question, answer=answer, referral=referral)
-            cls._user_challenges[user_id] = challenge
+            cls._user_challenges.set(user_id, challenge)
             logger.info("Created security challenge for user %s", user_id)
         elif referral and not challenge.referral:
             challenge.referral = referral
@@ -83,8 +131,9 @@ class SecurityManager:
     def refresh_captcha(cls, user_id: int) -> VerificationChallenge:
         question, answer = cls._generate_captcha()
         challenge = cls._user_challenges.setdefault(
-            user_id, VerificationChallenge(question=question, answer=answer)
+            user_id, lambda: VerificationChallenge(question=question, answer=answer)
         )
+        cls._user_challenges.touch(user_id)
         challenge.question = question
         challenge.answer = answer
         challenge.captcha_verified = False
@@ -98,53 +147,24 @@ class SecurityManager:
         """Return an image containing the CAPTCHA question."""
 
         challenge = challenge or cls.ensure_challenge(user_id)
-
-        if Image is None:
-            raise RuntimeError("Pillow must be installed to generate verification CAPTCHA images.")
-
-        # Default dimensions chosen to work with Telegram's image preview sizes.
-        width, height = 420, 180
-        background_color = (247, 247, 247)
-        text_color = (20, 20, 20)
-
-        image = Image.new("RGB", (width, height), background_color)
-        draw = ImageDraw.Draw(image)
-
-        try:
-            font = ImageFont.truetype("arial.ttf", 64)
-        except Exception:
-            font = ImageFont.load_default()
-
-        text = challenge.question
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        x = (width - text_width) / 2
-        y = (height - text_height) / 2
-        draw.text((x, y), text, font=font, fill=text_color)
-
-        # Add minimal noise so automated bots struggle while humans can read easily.
-        for _ in range(5):
-            x1 = random.randint(0, width)
-            y1 = random.randint(0, height)
-            x2 = random.randint(0, width)
-            y2 = random.randint(0, height)
-            draw.line((x1, y1, x2, y2), fill=(160, 160, 160), width=2)
-
-        for _ in range(80):
-            dot_x = random.randint(0, width - 1)
-            dot_y = random.randint(0, height - 1)
-            draw.point((dot_x, dot_y), fill=(200, 200, 200))
-
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        buffer.seek(0)
+        buffer = BytesIO(render_captcha_png(challenge.question))
         buffer.name = "captcha.png"
         return buffer
 
-
     @classmethod
+    def assign_captcha(cls, user_id: int, question: str, answer: str) -> VerificationChallenge:
+        """Attach a pre-rendered question/answer pair to the user's challenge."""
+
+        challenge = cls._user_challenges.setdefault(
+            user_id, lambda: VerificationChallenge(question=question, answer=answer)
+        )
+        cls._user_challenges.touch(user_id)
+        challenge.question = question
+        challenge.answer = answer
+        challenge.captcha_verified = False
+        return challenge
 
+    @classmethod
     def submit_captcha(cls, user_id: int, answer: str) -> bool:
         challenge = cls._user_challenges.get(user_id)
         if not challenge:
@@ -179,7 +199,7 @@ class SecurityManager:
             return False
         challenge.photo_verified = True
         challenge.attempts = 0
-        cls._verified_users.add(user_id)
+        cls._mark_verified(user_id)
         logger.info("User %s passed photo verification", user_id)
         return True
 
@@ -201,15 +221,34 @@ class SecurityManager:
     def clear_challenge(cls, user_id: int) -> None:
         cls._user_challenges.pop(user_id, None)
 
+    # The database layer is imported on use: renderer worker processes import
+    # this module for render_captcha_png and should not pull in SQLAlchemy.
+
+    @classmethod
+    def _mark_verified(cls, user_id: int) -> None:
+        from bot.database.methods import add_verified_user
+
+        if user_id not in cls._verified_users:
+            add_verified_user(user_id, int(time.time()))
+            cls._verified_users.set(user_id, True)
+
     @classmethod
     def is_verified(cls, user_id: int) -> bool:
+        from bot.database.methods import is_verified_user
+
         if cls.is_user_blocked(user_id):
             return False
+        if user_id in cls._verified_users:
+            return True
         challenge = cls._user_challenges.get(user_id)
         if challenge and challenge.captcha_verified:
             challenge.photo_verified = True
-            cls._verified_users.add(user_id)
-        return user_id in cls._verified_users
+            cls._mark_verified(user_id)
+            return True
+        if is_verified_user(user_id):
+            cls._verified_users.set(user_id, True)
+            return True
+        return False
 
     @classmethod
     def get_referral(cls, user_id: int) -> Optional[str]:
@@ -227,28 +266,22 @@ class SecurityManager:
 
     @classmethod
     def block_user(cls, user_id: int, reason: str, duration: Optional[float] = None) -> None:
-        expiry = time.time() + (duration or cls.block_duration)
-        cls._blocked_users[user_id] = expiry
+        duration = duration or cls.block_duration
+        cls._blocked_users.set(user_id, True, duration)
         logger.error(
             "Blocking user %s for %ss due to %s",
             user_id,
-            int(expiry - time.time()),
+            int(duration),
             reason,
         )
 
     @classmethod
     def is_user_blocked(cls, user_id: int) -> bool:
-        expiry = cls._blocked_users.get(user_id)
-        if not expiry:
-            return False
-        if expiry <= time.time():
-            cls._blocked_users.pop(user_id, None)
-            return False
-        return True
+        return user_id in cls._blocked_users
 
     @classmethod
     def user_block_message(cls, user_id: int) -> str:
-        expiry = cls._blocked_users.get(user_id)
+        expiry = cls._blocked_users.expires_at(user_id)
         if not expiry:
             return "🚫 Access denied."
         remaining = max(int(expiry - time.time()), 0)
@@ -262,7 +295,8 @@ class SecurityManager:
     @classmethod
     def record_ip_request(cls, ip: str) -> tuple[bool, Optional[str]]:
         now = time.time()
-        queue = cls._ip_requests[ip]
+        queue = cls._ip_requests.setdefault(ip, lambda: deque(maxlen=200))
+        cls._ip_requests.touch(ip)
         queue.append(now)
         while queue and now - queue[0] > cls.ip_rate_window:
             queue.popleft()
@@ -275,24 +309,19 @@ class SecurityManager:
 
     @classmethod
     def block_ip(cls, ip: str, reason: str, duration: Optional[float] = None) -> None:
-        expiry = time.time() + (duration or cls.block_duration)
-        cls._blocked_ips[ip] = expiry
-        logger.error("Blocked IP %s for %ss due to %s", ip, int(expiry - time.time()), reason)
+        duration = duration or cls.block_duration
+        cls._blocked_ips.set(ip, True, duration)
+        logger.error("Blocked IP %s for %ss due to %s", ip, int(duration), reason)
 
     @classmethod
     def is_ip_blocked(cls, ip: str) -> bool:
-        expiry = cls._blocked_ips.get(ip)
-        if not expiry:
-            return False
-        if expiry <= time.time():
-            cls._blocked_ips.pop(ip, None)
-            return False
-        return True
+        return ip in cls._blocked_ips
 
     @classmethod
     def record_ip_failure(cls, ip: str, reason: str) -> None:
         now = time.time()
-        failure_log = cls._ip_failures[ip]
+        failure_log = cls._ip_failures.setdefault(ip, lambda: deque(maxlen=50))
+        cls._ip_failures.touch(ip)
         failure_log.append(now)
         while failure_log and now - failure_log[0] > cls.ip_failure_window:
             failure_log.popleft()
@@ -305,15 +334,27 @@ class SecurityManager:
         if len(failure_log) >= cls.ip_failure_limit:
             cls.block_ip(ip, reason=f"repeated_failures:{reason}")
 
+    @classmethod
+    def _tables(cls) -> Dict[str, ExpiringDict]:
+        return {
+            "challenges": cls._user_challenges,
+            "verified_cache": cls._verified_users,
+            "blocked_users": cls._blocked_users,
+            "ip_requests": cls._ip_requests,
+            "ip_failures": cls._ip_failures,
+            "blocked_ips": cls._blocked_ips,
+        }
+
     @classmethod
     def cleanup(cls) -> None:
-        now = time.time()
-        for user_id, expiry in list(cls._blocked_users.items()):
-            if expiry <= now:
-                cls._blocked_users.pop(user_id, None)
-        for ip, expiry in list(cls._blocked_ips.items()):
-            if expiry <= now:
-                cls._blocked_ips.pop(ip, None)
+        """Drop expired entries; only touches entries whose expiry has passed."""
+
+        for table in cls._tables().values():
+            table.cleanup()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, int]]:
+        return {name: table.stats() for name, table in cls._tables().items()}
 
 
-__all__ = ["SecurityManager", "VerificationChallenge"]
+__all__ = ["SecurityManager", "VerificationChallenge", "render_captcha_png"]
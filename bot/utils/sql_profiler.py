@@ -0,0 +1,200 @@
+"""SQL profiling mode with N+1 detection.
+
+Enabled with ``SQL_PROFILE=1``.  Every statement is recorded against the update
+being processed (the :class:`~bot.utils.metrics.UpdateContext` bound by the
+metrics middleware) under its *shape*: the SQL text with whitespace collapsed
+and ``IN (?, ?, ...)`` lists folded, so the same query issued for different
+rows counts as one shape.  When an update finishes, a shape executed at least
+``SQL_PROFILE_N_PLUS_ONE`` times is logged as a likely N+1 pattern.  Queries
+slower than ``SQL_SLOW_QUERY_MS`` are logged with their parameters.
+
+:meth:`SQLProfiler.report` aggregates everything per handler; the report is
+logged and written to ``SQL_PROFILE_REPORT`` on shutdown.  Statements run
+outside an update (IPN threads, background workers) are grouped under
+``<background>``.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from bot.logger_mesh import logger
+from bot.misc import EnvKeys
+from bot.utils.metrics import UpdateContext, current_update
+
+__all__ = ["SQLProfiler", "statement_shape"]
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN \((?:\?|%\(\w+\)s|:\w+)(?:, (?:\?|%\(\w+\)s|:\w+))*\)", re.IGNORECASE)
+_BACKGROUND = "<background>"
+
+
+def statement_shape(statement: str) -> str:
+    """Normalise ``statement`` so executions that differ only in parameters compare equal."""
+
+    return _IN_LIST.sub("IN (?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@dataclass(slots=True)
+class _ShapeStats:
+    count: int = 0
+    seconds: float = 0.0
+    max_per_update: int = 0
+    n_plus_one: int = 0
+
+
+@dataclass(slots=True)
+class _HandlerStats:
+    updates: int = 0
+    queries: int = 0
+    seconds: float = 0.0
+    max_queries: int = 0
+    n_plus_one: int = 0
+    shapes: Dict[str, _ShapeStats] = field(default_factory=dict)
+
+
+class SQLProfiler:
+    """Collects SQL statements per update and handler."""
+
+    enabled: bool = EnvKeys.SQL_PROFILE
+    n_plus_one_threshold: int = EnvKeys.SQL_PROFILE_N_PLUS_ONE
+    slow_query_ms: float = EnvKeys.SQL_SLOW_QUERY_MS
+    report_path: str = EnvKeys.SQL_PROFILE_REPORT
+    top_shapes: int = 5
+
+    _handlers: Dict[str, _HandlerStats] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def install(cls, engine) -> None:
+        """Attach the profiler to ``engine`` if profiling is enabled."""
+
+        if not cls.enabled:
+            return
+        from sqlalchemy import event
+
+        event.listen(engine, "before_cursor_execute", cls._before)
+        event.listen(engine, "after_cursor_execute", cls._after)
+        logger.info(
+            "SQL profiling enabled: N+1 threshold %s, slow query threshold %.0fms",
+            cls.n_plus_one_threshold, cls.slow_query_ms,
+        )
+
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        # One statement runs at a time per connection; a statement that raised
+        # never reaches _after and is simply overwritten by the next one.
+        conn.info["profiler_started"] = time.perf_counter()
+
+    @classmethod
+    def _after(cls, conn, cursor, statement, parameters, context, executemany) -> None:
+        started = conn.info.pop("profiler_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        shape = statement_shape(statement)
+        update = current_update()
+        if elapsed * 1000 >= cls.slow_query_ms:
+            handler = (update.handler if update is not None else None) or _BACKGROUND
+            logger.warning(
+                "Slow query (%.1fms) in %s: %s; parameters=%r", elapsed * 1000, handler, shape, parameters
+            )
+        if update is not None:
+            if update.sql_shapes is None:
+                update.sql_shapes = {}
+            shape_stats = update.sql_shapes.get(shape)
+            if shape_stats is None:
+                shape_stats = update.sql_shapes[shape] = _ShapeStats()
+            shape_stats.count += 1
+            shape_stats.seconds += elapsed
+            return
+        with cls._lock:
+            stats = cls._handler(_BACKGROUND)
+            shape_stats = stats.shapes.setdefault(shape, _ShapeStats())
+            shape_stats.count += 1
+            shape_stats.seconds += elapsed
+            shape_stats.max_per_update = 1
+            stats.queries += 1
+            stats.seconds += elapsed
+
+    @classmethod
+    def _handler(cls, name: str) -> _HandlerStats:
+        stats = cls._handlers.get(name)
+        if stats is None:
+            stats = cls._handlers[name] = _HandlerStats()
+        return stats
+
+    @classmethod
+    def finish_update(cls, update: UpdateContext) -> None:
+        """Add the statements of ``update`` to its handler and flag N+1 patterns."""
+
+        shapes = update.sql_shapes
+        if not shapes:
+            return
+        handler = update.handler or "unhandled"
+        suspects = [(shape, seen.count) for shape, seen in shapes.items() if seen.count >= cls.n_plus_one_threshold]
+        with cls._lock:
+            stats = cls._handler(handler)
+            stats.updates += 1
+            stats.max_queries = max(stats.max_queries, sum(seen.count for seen in shapes.values()))
+            for shape, seen in shapes.items():
+                shape_stats = stats.shapes.setdefault(shape, _ShapeStats())
+                shape_stats.count += seen.count
+                shape_stats.seconds += seen.seconds
+                shape_stats.max_per_update = max(shape_stats.max_per_update, seen.count)
+                stats.queries += seen.count
+                stats.seconds += seen.seconds
+            for shape, _ in suspects:
+                stats.shapes[shape].n_plus_one += 1
+                stats.n_plus_one += 1
+        for shape, count in suspects:
+            logger.warning("Possible N+1 in %s: %d executions of %s", handler, count, shape)
+
+    @classmethod
+    def report(cls) -> str:
+        """Per-handler summary, handlers with the most queries first."""
+
+        with cls._lock:
+            handlers = sorted(cls._handlers.items(), key=lambda item: item[1].queries, reverse=True)
+            lines = [f"SQL profile: {sum(stats.queries for _, stats in handlers)} queries in {len(handlers)} handlers"]
+            for name, stats in handlers:
+                if stats.updates:
+                    lines.append(
+                        f"{name}: {stats.updates} updates, {stats.queries} queries "
+                        f"({stats.queries / stats.updates:.1f}/update, max {stats.max_queries}), "
+                        f"{stats.seconds * 1000:.1f}ms, {stats.n_plus_one} N+1 flags"
+                    )
+                else:
+                    lines.append(f"{name}: {stats.queries} queries, {stats.seconds * 1000:.1f}ms")
+                top = sorted(stats.shapes.items(), key=lambda item: item[1].count, reverse=True)[:cls.top_shapes]
+                for shape, shape_stats in top:
+                    flag = " [N+1]" if shape_stats.n_plus_one else ""
+                    lines.append(
+                        f"    {shape_stats.count:>6}x max {shape_stats.max_per_update:>4}/update "
+                        f"{shape_stats.seconds * 1000:>8.1f}ms{flag}  {shape}"
+                    )
+        return "\n".join(lines)
+
+    @classmethod
+    def dump(cls, path: Optional[str] = None) -> None:
+        """Log the report and write it to ``path`` (``SQL_PROFILE_REPORT`` by default)."""
+
+        if not cls.enabled:
+            return
+        report = cls.report()
+        logger.info("%s", report)
+        path = path or cls.report_path
+        try:
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(report + "\n")
+        except OSError as exc:
+            logger.error("Failed to write SQL profile to %s: %s", path, exc)
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._handlers.clear()
@@ -0,0 +1,232 @@
+"""Persistent backends for conversation state and aiogram FSM storage.
+
+``STATE_BACKEND`` selects where :class:`~bot.misc.session_store.SessionStore`
+persists sessions: ``sqlite`` (default, the bot database), ``redis`` (any
+Redis-protocol server at ``REDIS_URL``) or ``memory`` (nothing is persisted).
+Several bot processes pointing at the same backend share user state, and a
+restart no longer drops users in the middle of a checkout.  Cached sessions
+are only revalidated per update when the backend is shared: by default the
+Redis backend is and the SQLite one is not; ``STATE_SHARED=1`` (or ``0``)
+overrides that, e.g. for several processes on one database file.
+
+Sessions changed outside their user's own update are saved by
+:class:`SessionFlusher` every ``STATE_FLUSH_INTERVAL`` seconds and on
+shutdown.
+
+:class:`SessionFSMStorage` keeps aiogram FSM state and data inside the same
+user sessions, so one backend covers both.  Throttling buckets stay in
+process memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import time
+import typing
+from typing import Optional, Tuple
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+from bot.database.methods import (
+    delete_stored_state_key,
+    get_stored_session,
+    get_stored_session_version,
+    get_stored_state_key,
+    purge_stored_state,
+    save_stored_session,
+    save_stored_state_key,
+)
+from bot.logger_mesh import logger
+from bot.misc import EnvKeys, TgConfig
+from bot.misc.session_store import SessionStore, StateBackend
+
+__all__ = [
+    "RedisStateBackend",
+    "SessionFSMStorage",
+    "SQLiteStateBackend",
+    "SessionFlusher",
+    "create_state_backend",
+]
+
+
+class SQLiteStateBackend:
+    """Stores sessions in the bot database (``stored_sessions``/``stored_state_keys``)."""
+
+    def __init__(self, ttl: float, shared: bool = False) -> None:
+        self.ttl = ttl
+        self.shared = shared
+
+    def load_session(self, user_id: int) -> Optional[Tuple[int, bytes]]:
+        return get_stored_session(user_id, int(time.time() - self.ttl))
+
+    def session_version(self, user_id: int) -> Optional[int]:
+        return get_stored_session_version(user_id)
+
+    def save_session(self, user_id: int, payload: bytes) -> int:
+        return save_stored_session(user_id, payload, int(time.time()))
+
+    def load_global(self, key: str) -> Optional[bytes]:
+        return get_stored_state_key(key, int(time.time() - self.ttl))
+
+    def save_global(self, key: str, payload: bytes) -> None:
+        save_stored_state_key(key, payload, int(time.time()))
+
+    def delete_global(self, key: str) -> bool:
+        return delete_stored_state_key(key)
+
+    def purge(self) -> None:
+        purge_stored_state(int(time.time() - self.ttl))
+
+
+class RedisStateBackend:
+    """Stores sessions on a Redis-protocol server; expiry is left to key TTLs."""
+
+    def __init__(self, url: str, ttl: float, prefix: str = "shopbot:", shared: bool = True) -> None:
+        try:
+            import redis
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("STATE_BACKEND=redis requires the 'redis' package") from exc
+        self.client = redis.Redis.from_url(url)
+        self.ttl = max(int(ttl), 1)
+        self.prefix = prefix
+        self.shared = shared
+
+    def _session_key(self, user_id: int) -> str:
+        return f"{self.prefix}session:{user_id}"
+
+    def _global_key(self, key: str) -> str:
+        return f"{self.prefix}state:{key}"
+
+    def load_session(self, user_id: int) -> Optional[Tuple[int, bytes]]:
+        version, payload = self.client.hmget(self._session_key(user_id), "v", "p")
+        if version is None or payload is None:
+            return None
+        return int(version), payload
+
+    def session_version(self, user_id: int) -> Optional[int]:
+        version = self.client.hget(self._session_key(user_id), "v")
+        return int(version) if version is not None else None
+
+    def save_session(self, user_id: int, payload: bytes) -> int:
+        key = self._session_key(user_id)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, "v", 1)
+        pipe.hset(key, "p", payload)
+        pipe.expire(key, self.ttl)
+        version, _, _ = pipe.execute()
+        return int(version)
+
+    def load_global(self, key: str) -> Optional[bytes]:
+        return self.client.get(self._global_key(key))
+
+    def save_global(self, key: str, payload: bytes) -> None:
+        self.client.set(self._global_key(key), payload, ex=self.ttl)
+
+    def delete_global(self, key: str) -> bool:
+        return bool(self.client.delete(self._global_key(key)))
+
+    def purge(self) -> None:
+        pass
+
+
+def create_state_backend() -> Optional[StateBackend]:
+    """Build the backend configured by ``STATE_BACKEND``; ``None`` keeps state in memory only."""
+
+    kind = (EnvKeys.STATE_BACKEND or "sqlite").lower()
+    ttl = TgConfig.SESSIONS.ttl
+    shared = None if not EnvKeys.STATE_SHARED else EnvKeys.STATE_SHARED in ("1", "true", "yes")
+    if kind == "memory":
+        return None
+    if kind == "redis":
+        return RedisStateBackend(EnvKeys.REDIS_URL, ttl, shared=True if shared is None else shared)
+    if kind != "sqlite":
+        logger.warning("Unknown STATE_BACKEND=%r, using sqlite", kind)
+    return SQLiteStateBackend(ttl, shared=bool(shared))
+
+
+class SessionFlusher:
+    """Saves dirty sessions of a :class:`SessionStore` every ``interval`` seconds."""
+
+    interval: float = EnvKeys.STATE_FLUSH_INTERVAL
+
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def start(cls, store: SessionStore) -> None:
+        """Start flushing ``store``; a no-op without a backend or when ``STATE_FLUSH_INTERVAL`` is 0."""
+
+        if store.backend is None or cls.interval <= 0 or (cls._task is not None and not cls._task.done()):
+            return
+        cls._task = asyncio.get_running_loop().create_task(cls._run(store))
+
+    @classmethod
+    def stop(cls, store: SessionStore) -> None:
+        """Stop the task and save what is still dirty."""
+
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
+        store.flush()
+
+    @classmethod
+    async def _run(cls, store: SessionStore) -> None:
+        while True:
+            await asyncio.sleep(cls.interval)
+            saved = store.flush()
+            if saved:
+                logger.debug("Flushed %s sessions changed outside their updates", saved)
+
+
+class SessionFSMStorage(MemoryStorage):
+    """aiogram FSM storage kept in the users' sessions; buckets stay in memory."""
+
+    def __init__(self, store: SessionStore) -> None:
+        super().__init__()
+        self.store = store
+
+    def _record(self, chat, user, create: bool = True) -> dict:
+        chat_id, user_id = map(int, self.check_address(chat=chat, user=user))
+        session = self.store.session(user_id)
+        if not create:
+            return session.fsm.get(chat_id) or {"state": None, "data": {}}
+        self.store.mark_dirty(user_id)
+        return session.fsm.setdefault(chat_id, {"state": None, "data": {}})
+
+    def _cleanup_record(self, chat, user) -> None:
+        chat_id, user_id = map(int, self.check_address(chat=chat, user=user))
+        session = self.store.session(user_id)
+        if session.fsm.get(chat_id) == {"state": None, "data": {}}:
+            del session.fsm[chat_id]
+
+    async def get_state(self, *, chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        state = self._record(chat, user, create=False)["state"]
+        return state if state is not None else self.resolve_state(default)
+
+    async def get_data(self, *, chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[str] = None) -> typing.Dict:
+        return copy.deepcopy(self._record(chat, user, create=False)["data"])
+
+    async def update_data(self, *, chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        self._record(chat, user)["data"].update(data or {}, **kwargs)
+
+    async def set_state(self, *, chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        self._record(chat, user)["state"] = self.resolve_state(state)
+        self._cleanup_record(chat, user)
+
+    async def set_data(self, *, chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        self._record(chat, user)["data"] = copy.deepcopy(data or {})
+        self._cleanup_record(chat, user)
+
+    async def close(self):
+        await super().close()
+        self.store.persist_all()
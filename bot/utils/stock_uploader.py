@@ -0,0 +1,108 @@
+"""Background pre-upload of stock media to a private storage chat.
+
+Stock values that point to photos or videos on disk are uploaded once to
+``STORAGE_CHAT_ID`` right after they are added.  The returned ``file_id`` is
+stored on the ``item_values`` row, so delivering the item to a buyer only sends
+the id.  Delivery still falls back to the file on disk if the id is missing or
+rejected.  A failing upload is skipped; unexpected errors (network, database)
+pause the worker with exponential backoff instead of ending it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Optional, Set
+
+from aiogram import Bot
+from aiogram.utils.exceptions import TelegramAPIError
+
+from bot.database.methods import select_values_pending_upload, set_item_value_file_id
+from bot.logger_mesh import logger
+from bot.misc import EnvKeys
+from bot.utils.media_cache import MediaCache, media_kind
+from bot.utils.rate_limiter import Priority, set_outbound_priority
+
+__all__ = ["StockUploader"]
+
+
+class StockUploader:
+    """Single background worker fed by :meth:`notify` after stock ingestion."""
+
+    extensions: tuple[str, ...] = (".jpg", ".jpeg", ".png", ".mp4")
+    batch_size: int = 50
+    retry_delay: float = 30.0
+    max_retry_delay: float = 600.0
+
+    _wakeup: Optional[asyncio.Event] = None
+    _task: Optional[asyncio.Task] = None
+    _skipped: Set[int] = set()
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(EnvKeys.STORAGE_CHAT_ID)
+
+    @classmethod
+    def start(cls, bot: Bot) -> None:
+        """Start the worker; pending stock from earlier runs is uploaded first."""
+
+        if not cls.enabled() or (cls._task is not None and not cls._task.done()):
+            return
+        cls._wakeup = asyncio.Event()
+        cls._wakeup.set()
+        cls._task = asyncio.create_task(cls._run(bot))
+
+    @classmethod
+    def notify(cls) -> None:
+        """Signal that new stock values were added."""
+
+        if cls._wakeup is not None:
+            cls._wakeup.set()
+
+    @classmethod
+    async def _upload(cls, bot: Bot, value_id: int, path: str) -> None:
+        if not os.path.isfile(path):
+            cls._skipped.add(value_id)
+            return
+        cached = MediaCache.lookup(path, media_kind(path))
+        if cached:
+            set_item_value_file_id(value_id, cached)
+            return
+        try:
+            message = await MediaCache.send(bot, EnvKeys.STORAGE_CHAT_ID, path, disable_notification=True)
+        except (TelegramAPIError, OSError) as exc:
+            logger.error("Failed to pre-upload stock value %s (%s): %s", value_id, path, exc)
+            cls._skipped.add(value_id)
+            return
+        media = message.video if message.video else (message.photo[-1] if message.photo else None)
+        if media is None:
+            cls._skipped.add(value_id)
+            return
+        set_item_value_file_id(value_id, media.file_id)
+
+    @classmethod
+    async def _drain(cls, bot: Bot) -> None:
+        while True:
+            pending = select_values_pending_upload(cls.extensions, cls.batch_size, cls._skipped)
+            if not pending:
+                return
+            for value_id, path in pending:
+                await cls._upload(bot, value_id, path)
+            logger.info("Pre-uploaded %s stock files to the storage chat", len(pending))
+
+    @classmethod
+    async def _run(cls, bot: Bot) -> None:
+        set_outbound_priority(Priority.BROADCAST)
+        delay = cls.retry_delay
+        while True:
+            await cls._wakeup.wait()
+            cls._wakeup.clear()
+            try:
+                await cls._drain(bot)
+            except Exception:
+                logger.exception("Stock pre-upload interrupted; retrying in %.0fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, cls.max_retry_delay)
+                cls._wakeup.set()
+            else:
+                delay = cls.retry_delay
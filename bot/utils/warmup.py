@@ -0,0 +1,72 @@
+"""Startup warmup.
+
+The first user after a restart used to pay for opening the database, SQLAlchemy
+compiling the catalog and role queries, and the first lookups of the
+localisation tables.  :func:`warm_up` runs those once during startup, before
+polling begins, and logs how long each step took.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict
+
+from bot.database.methods import (
+    get_all_categories,
+    get_all_category_names,
+    get_all_item_names,
+    get_all_subcategories,
+    get_item_info,
+    get_role_id_by_name,
+    select_max_role_id,
+)
+from bot.localization import LANGUAGES, t
+from bot.logger_mesh import logger
+
+__all__ = ["warm_up"]
+
+_ROLE_NAMES = ("USER", "ADMIN", "OWNER")
+
+
+def _roles() -> None:
+    for name in _ROLE_NAMES:
+        get_role_id_by_name(name)
+    select_max_role_id()
+
+
+def _catalog() -> None:
+    categories = get_all_category_names()
+    for category in categories:
+        for name in [category, *get_all_subcategories(category)]:
+            for item in get_all_item_names(name)[:1]:
+                get_item_info(item)
+    get_all_categories()
+
+
+def _localization() -> None:
+    for lang, strings in LANGUAGES.items():
+        for key in strings:
+            try:
+                t(lang, key)
+            except (KeyError, IndexError, ValueError):
+                pass  # templates that need arguments
+
+
+def warm_up() -> Dict[str, float]:
+    """Preload roles, the catalog and localisation; returns milliseconds per step."""
+
+    steps: Dict[str, Callable[[], None]] = {
+        "roles": _roles,
+        "catalog": _catalog,
+        "localization": _localization,
+    }
+    timings: Dict[str, float] = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warmup step %s failed", name)
+        timings[name] = (time.perf_counter() - started) * 1000
+    logger.info("Warmup finished: %s", ", ".join(f"{name} {ms:.1f}ms" for name, ms in timings.items()))
+    return timings
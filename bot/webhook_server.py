@@ -0,0 +1,123 @@
+"""Webhook transport for the Telegram bot served by aiohttp.
+
+Enabled by setting ``WEBHOOK_HOST``; otherwise :func:`bot.main.start_bot`
+keeps using long polling.  Requests must carry the configured secret token,
+at most ``WEBHOOK_MAX_CONCURRENCY`` updates are processed at once and the
+first answer to a callback query is returned in the webhook HTTP response
+instead of a separate ``answerCallbackQuery`` call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+from typing import Awaitable, Callable
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.webhook import WebhookRequestHandler
+from aiogram.utils.executor import Executor
+from aiohttp import web
+
+from bot.logger_mesh import logger
+from bot.misc import EnvKeys
+from bot.misc.bot import INLINE_CALLBACK_ANSWER, InlineCallbackAnswer
+
+__all__ = ["ConcurrentWebhookRequestHandler", "build_webhook_app", "start_webhook"]
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+WEBHOOK_SECRET_KEY = "WEBHOOK_SECRET"
+WEBHOOK_SEMAPHORE_KEY = "WEBHOOK_SEMAPHORE"
+
+
+class ConcurrentWebhookRequestHandler(WebhookRequestHandler):
+    """Webhook view with secret verification, bounded concurrency and inline answers.
+
+    ``post`` replaces the base implementation but keeps its Telegram IP check.
+    """
+
+    def verify_secret(self) -> None:
+        secret = self.request.app.get(WEBHOOK_SECRET_KEY)
+        if not secret:
+            return
+        provided = self.request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(provided, secret):
+            logger.warning("Rejected webhook request with invalid secret token from %s", self.request.remote)
+            raise web.HTTPUnauthorized()
+
+    async def post(self):
+        self.validate_ip()
+        self.verify_secret()
+        semaphore: asyncio.Semaphore = self.request.app[WEBHOOK_SEMAPHORE_KEY]
+        async with semaphore:
+            dispatcher = self.get_dispatcher()
+            update = await self.parse_update(dispatcher.bot)
+
+            slot = None
+            token = None
+            if update.callback_query:
+                slot = InlineCallbackAnswer(update.callback_query.id)
+                token = INLINE_CALLBACK_ANSWER.set(slot)
+            try:
+                results = await self.process_update(update)
+            finally:
+                if token is not None:
+                    INLINE_CALLBACK_ANSWER.reset(token)
+
+            response = self.get_response(results)
+            if slot is not None:
+                slot.closed = True
+                if slot.response is not None:
+                    if response is None:
+                        response = slot.response
+                    else:
+                        asyncio.ensure_future(slot.response.execute_response(dispatcher.bot))
+
+        web_response = response.get_web_response() if response else web.Response(text="ok")
+        if self.request.app.get("RETRY_AFTER", None):
+            web_response.headers["Retry-After"] = str(self.request.app["RETRY_AFTER"])
+        return web_response
+
+
+def _webhook_url() -> str:
+    return f"{EnvKeys.WEBHOOK_HOST.rstrip('/')}{EnvKeys.WEBHOOK_PATH}"
+
+
+async def _register_webhook(dp: Dispatcher) -> None:
+    await dp.bot.set_webhook(
+        _webhook_url(),
+        max_connections=EnvKeys.WEBHOOK_MAX_CONCURRENCY,
+        drop_pending_updates=True,
+        secret_token=EnvKeys.WEBHOOK_SECRET or None,
+    )
+    logger.info("Webhook registered at %s", _webhook_url())
+
+
+async def _remove_webhook(dp: Dispatcher) -> None:
+    await dp.bot.delete_webhook()
+
+
+def build_webhook_app(max_concurrency: int | None = None, secret: str | None = None) -> web.Application:
+    """Return an aiohttp application prepared for :class:`ConcurrentWebhookRequestHandler`."""
+
+    app = web.Application()
+    app[WEBHOOK_SECRET_KEY] = secret if secret is not None else EnvKeys.WEBHOOK_SECRET
+    app[WEBHOOK_SEMAPHORE_KEY] = asyncio.Semaphore(max(max_concurrency or EnvKeys.WEBHOOK_MAX_CONCURRENCY, 1))
+    return app
+
+
+def start_webhook(
+    dp: Dispatcher,
+    on_startup: Callable[[Dispatcher], Awaitable[None]],
+    on_shutdown: Callable[[Dispatcher], Awaitable[None]] | None = None,
+) -> None:
+    """Serve updates over a webhook until the process is stopped."""
+
+    executor = Executor(dp)
+    executor.on_startup([on_startup, _register_webhook], polling=False)
+    executor.on_shutdown([_remove_webhook] + ([on_shutdown] if on_shutdown else []), polling=False)
+    executor.set_webhook(
+        EnvKeys.WEBHOOK_PATH,
+        request_handler=ConcurrentWebhookRequestHandler,
+        web_app=build_webhook_app(),
+    )
+    executor.run_app(host=EnvKeys.WEBAPP_HOST, port=EnvKeys.WEBAPP_PORT)
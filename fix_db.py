@@ -13,6 +13,91 @@ def add_column_if_missing(cur, table, col, ddl):
     else:
         print(f"ℹ️ {table}.{col} already exists")
 
+def table_exists(cur, table):
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cur.fetchone() is not None
+
+def catalog_orphans(cur):
+    """Rows whose name key points at a missing parent; the id migration would lose them."""
+    checks = [
+        ("goods", "category", """
+            SELECT g.name, g.category_name FROM goods g
+            LEFT JOIN categories c ON c.name = g.category_name WHERE c.name IS NULL"""),
+        ("item_values", "item", """
+            SELECT v.id, v.item_name FROM item_values v
+            LEFT JOIN goods g ON g.name = v.item_name WHERE g.name IS NULL"""),
+    ]
+    if column_exists(cur, "categories", "parent_name"):
+        checks.append(("categories", "parent category", """
+            SELECT c.name, c.parent_name FROM categories c
+            LEFT JOIN categories p ON p.name = c.parent_name
+            WHERE c.parent_name IS NOT NULL AND p.name IS NULL"""))
+    orphans = []
+    for table, parent, query in checks:
+        cur.execute(query)
+        orphans.extend(f"{table} {key!r}: missing {parent} {missing!r}" for key, missing in cur.fetchall())
+    return orphans
+
+def migrate_catalog_ids(cur):
+    """Rebuild categories/goods/item_values with integer ids instead of name keys."""
+    if not table_exists(cur, "goods") or column_exists(cur, "goods", "id"):
+        print("ℹ️ catalog already uses integer ids")
+        return
+    orphans = catalog_orphans(cur)
+    if orphans:
+        for orphan in orphans:
+            print(f"❌ {orphan}")
+        raise SystemExit(
+            f"❌ {len(orphans)} catalog rows reference missing parents; "
+            "fix or delete them and run the migration again (the catalog was left unchanged)"
+        )
+    cur.execute("PRAGMA foreign_keys = OFF")
+    cur.execute("""
+        CREATE TABLE categories_new (
+            id INTEGER NOT NULL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL UNIQUE,
+            parent_id INTEGER NULL REFERENCES categories(id)
+        )""")
+    cur.execute("INSERT INTO categories_new (name) SELECT name FROM categories ORDER BY rowid")
+    cur.execute("""
+        UPDATE categories_new SET parent_id = (
+            SELECT p.id FROM categories c LEFT JOIN categories_new p ON p.name = c.parent_name
+            WHERE c.name = categories_new.name
+        )""")
+    cur.execute("""
+        CREATE TABLE goods_new (
+            id INTEGER NOT NULL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL UNIQUE,
+            price NUMERIC(10, 2) NOT NULL,
+            description TEXT NOT NULL,
+            delivery_description TEXT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories(id)
+        )""")
+    cur.execute("""
+        INSERT INTO goods_new (name, price, description, delivery_description, category_id)
+        SELECT g.name, g.price, g.description, g.delivery_description, c.id
+        FROM goods g LEFT JOIN categories_new c ON c.name = g.category_name ORDER BY g.rowid""")
+    cur.execute("""
+        CREATE TABLE item_values_new (
+            id INTEGER NOT NULL PRIMARY KEY,
+            item_id INTEGER NOT NULL REFERENCES goods(id),
+            value TEXT NULL,
+            is_infinity BOOLEAN NOT NULL,
+            file_id VARCHAR(255) NULL
+        )""")
+    cur.execute("""
+        INSERT INTO item_values_new (id, item_id, value, is_infinity, file_id)
+        SELECT v.id, g.id, v.value, v.is_infinity, v.file_id
+        FROM item_values v LEFT JOIN goods_new g ON g.name = v.item_name""")
+    for table in ("item_values", "goods", "categories"):
+        cur.execute(f"DROP TABLE {table}")
+        cur.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_categories_parent_id ON categories (parent_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_goods_category_id ON goods (category_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_values_item_id ON item_values (item_id)")
+    cur.execute("PRAGMA foreign_keys = ON")
+    print("✅ Rebuilt categories, goods and item_values with integer ids")
+
 def main():
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
@@ -27,6 +112,17 @@ def main():
     except Exception as e:
         print(f"Note: could not check unfinished_operations.message_id: {e}")
 
+    try:
+        add_column_if_missing(cur, "unfinished_operations", "provider", "provider VARCHAR(32) NULL")
+    except Exception as e:
+        print(f"Note: could not check unfinished_operations.provider: {e}")
+
+    add_column_if_missing(cur, "item_values", "file_id", "file_id VARCHAR(255) NULL")
+    add_column_if_missing(cur, "users", "bot_blocked", "bot_blocked BOOLEAN NOT NULL DEFAULT 0")
+
+    # Goods and categories are keyed by integer ids; names stay unique attributes
+    migrate_catalog_ids(cur)
+
     conn.commit()
     conn.close()
     print("✅ Migration complete.")
@@ -8,9 +8,11 @@ if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
     sys.stderr.reconfigure(encoding="utf-8")
 
-import importlib
+import importlib.util
 import subprocess
 
+# Import names of the packages in requirements.txt.  Checked with find_spec so
+# that the check itself does not import (and pay for) any of them.
 REQUIRED_MODULES = [
     "yoomoney",
     "aiogram",
@@ -22,16 +24,13 @@ REQUIRED_MODULES = [
     "web3",
     "bitcoinrpc",
     "flask",
+    "qrcode",
+    "dotenv",
 ]
 
 def ensure_requirements() -> None:
     """Install required packages if any are missing."""
-    missing = []
-    for module in REQUIRED_MODULES:
-        try:
-            importlib.import_module(module)
-        except Exception:
-            missing.append(module)
+    missing = [module for module in REQUIRED_MODULES if importlib.util.find_spec(module) is None]
 
     if missing:
         subprocess.check_call([
@@ -44,15 +43,16 @@ def ensure_requirements() -> None:
         ])
 
 from threading import Thread
-from bot.main import start_bot
-from bot.ipn_server import app as ipn_app
 
-def run_ipn() -> None:
+def run_ipn(ipn_app) -> None:
     ipn_app.run(host="0.0.0.0", port=5000)
 
 if __name__ == '__main__':
     ensure_requirements()
+    # Imported only after the check so that missing packages are installed first
+    from bot.main import start_bot
+    from bot.ipn_server import app as ipn_app
     # Start the IPN (HTTP) server in a daemon thread
-    Thread(target=run_ipn, daemon=True).start()
+    Thread(target=run_ipn, args=(ipn_app,), daemon=True).start()
     # Then start the Telegram bot (blocking)
     start_bot()